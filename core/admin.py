@@ -1,13 +1,21 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 
-from .models import User, ArtImage, BlogPost
+from .cache import bump_version
+from .models import User, ArtImage, BlogPost, BlogCategory, OutboundEmail
+from .signals import POST_CACHE_LABELS
 
 
 admin.site.site_header = "ArtFlght CMS"
 admin.site.site_title = "ArtFlght Admin"
 admin.site.index_title = "Welcome to the ArtFlght Admin Dashboard"
 
+@admin.action(description="Invalidate cached post responses")
+def invalidate_post_cache(modeladmin, request, queryset):
+    bump_version(*POST_CACHE_LABELS)
+    modeladmin.message_user(request, "Cached post responses invalidated.")
+
+
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
     model = User
@@ -42,4 +50,21 @@ class BlogPostAdmin(admin.ModelAdmin):
     search_fields = ("title", "author__username", "slug")
     prepopulated_fields = {"slug": ("title",)}
     ordering = ("-created_at",)
-    list_filter = ("created_at", "updated_at")
\ No newline at end of file
+    list_filter = ("created_at", "updated_at")
+    actions = [invalidate_post_cache]
+
+
+@admin.register(BlogCategory)
+class BlogCategoryAdmin(admin.ModelAdmin):
+    list_display = ("id", "name", "post_count", "latest_post_at")
+    readonly_fields = ("post_count", "latest_post_at")
+    search_fields = ("name",)
+    actions = [invalidate_post_cache]
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ("id", "kind", "to", "status", "attempts", "next_attempt_at", "sent_at")
+    list_filter = ("status", "kind")
+    search_fields = ("to", "dedupe_key")
+    readonly_fields = ("created_at", "sent_at", "last_error")
@@ -0,0 +1,219 @@
+"""
+Async fast path for the read-heavy public endpoints.
+
+Under ASGI (SERVER_MODE=asgi) the post list/detail and art image list URLs
+are served by `async_read_view`. Anonymous JSON GETs are answered with the
+async ORM on the event loop, with the same response cache, ETag validators,
+pagination and serializers as the DRF viewsets. Everything else (writes,
+authenticated or browsable-API requests, cursor pages, invalid pages, 404s)
+is handed to the DRF view on a worker thread, so behaviour is unchanged.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.paginator import InvalidPage
+from django.http import HttpResponse
+from django.urls import URLPattern
+from django.utils.cache import patch_vary_headers
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from . import cache, categories, search, trending
+from .conditional import list_validators, not_modified_response, object_validators, set_validators, validator_aggregates
+from .models import ArtImage, BlogPost
+from .pagination import ArtImagePagination, BlogPostPagination
+from .serializers import ArtImageSerializer, BlogPostDetailSerializer, BlogPostListSerializer
+
+
+CURSOR_PARAMS = ("cursor", "pagination")
+
+
+def is_async_read(request, kwargs):
+    return (
+        request.method == "GET"
+        and "HTTP_AUTHORIZATION" not in request.META
+        and "text/html" not in request.META.get("HTTP_ACCEPT", "")
+        and "format" not in kwargs
+        and "format" not in request.GET
+        and not any(param in request.GET for param in CURSOR_PARAMS)
+    )
+
+
+def render(data):
+    response = HttpResponse(JSONRenderer().render(data), content_type="application/json")
+    patch_vary_headers(response, ["Accept"])
+    return response
+
+
+async def cached(request, name, dependencies, handler):
+    """Async counterpart of cache.CachedResponseMixin.cached_response."""
+    if not getattr(settings, "RESPONSE_CACHE_ENABLED", True):
+        data = await handler()
+        return None if data is None else render(data)
+
+    backend = cache.get_cache()
+    cache_key = await sync_to_async(cache.make_cache_key)(name, request.path, request.GET, dependencies)
+    data = await backend.aget(cache_key)
+    if data is not None:
+        await sync_to_async(cache.record)("hits")
+        response = render(data)
+        response["X-Cache"] = "HIT"
+        return response
+
+    await sync_to_async(cache.record)("misses")
+    data = await handler()
+    if data is None:
+        return None
+    await backend.aset(cache_key, data, getattr(settings, "RESPONSE_CACHE_TIMEOUT", 300))
+    response = render(data)
+    response["X-Cache"] = "MISS"
+    return response
+
+
+async def conditional(request, queryset, handler, related=()):
+    aggregate = await queryset.order_by().aaggregate(**validator_aggregates(related=related))
+    etag, last_modified = list_validators(request.path, request.GET, aggregate)
+    not_modified = not_modified_response(request, etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+    response = await handler()
+    return response and set_validators(response, etag, last_modified)
+
+
+async def paginate_pages(drf_request, queryset):
+    """Page-number page as (paginator, rows), or None for invalid pages."""
+    paginator = BlogPostPagination()
+    page_size = paginator.get_page_size(drf_request)
+    django_paginator = paginator.django_paginator_class(queryset, page_size)
+    django_paginator.count = await queryset.acount()
+    try:
+        page = django_paginator.page(drf_request.query_params.get(paginator.page_query_param, 1))
+    except InvalidPage:
+        return None
+    page.object_list = [row async for row in page.object_list]
+    paginator.page, paginator.request = page, drf_request
+    return paginator, page.object_list
+
+
+async def post_list(request, **kwargs):
+    queryset = (
+        BlogPost.objects.select_related("author", "category")
+        .defer("search_vector", "content", "rendered_content")
+        .order_by("-created_at", "-id")
+    )
+    try:
+        queryset = categories.filter_posts(queryset, request.GET.get("category"))
+    except ValidationError:
+        return None
+    queryset = search.search_posts(queryset, request.GET.get("search"))
+    drf_request = Request(request)
+
+    async def handler():
+        paginated = await paginate_pages(drf_request, queryset)
+        if paginated is None:
+            return None
+        paginator, rows = paginated
+        data = BlogPostListSerializer(rows, many=True, context={"request": drf_request}).data
+        return {
+            "count": paginator.page.paginator.count,
+            "next": paginator.get_next_link(),
+            "previous": paginator.get_previous_link(),
+            "results": data,
+        }
+
+    return await conditional(
+        request, queryset, lambda: cached(request, "posts:list", ("core.blogpost",), handler), related=("author",)
+    )
+
+
+async def post_detail(request, slug, **kwargs):
+    post = await (
+        BlogPost.objects.select_related("author", "category")
+        .defer("search_vector", "content")
+        .filter(slug=slug)
+        .afirst()
+    )
+    if post is None:
+        return None
+    await trending.views.arecord(post.pk)
+
+    etag, last_modified = object_validators(post, related=("author",))
+    not_modified = not_modified_response(request, etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    async def handler():
+        return BlogPostDetailSerializer(post, context={"request": Request(request)}).data
+
+    response = await cached(request, "posts:retrieve", ("core.blogpost",), handler)
+    return set_validators(response, etag, last_modified)
+
+
+async def art_image_list(request, **kwargs):
+    queryset = ArtImage.objects.select_related("user").order_by("-uploaded_at", "-id")
+    drf_request = Request(request)
+
+    async def handler():
+        paginator = ArtImagePagination()
+        paginator.limit = paginator.get_limit(drf_request)
+        context = {"request": drf_request}
+        if paginator.limit is None:
+            rows = [row async for row in queryset]
+            return render(ArtImageSerializer(rows, many=True, context=context).data)
+
+        paginator.offset = paginator.get_offset(drf_request)
+        paginator.count = await queryset.acount()
+        paginator.request = drf_request
+        rows = [row async for row in queryset[paginator.offset:paginator.offset + paginator.limit]]
+        return render({
+            "count": paginator.count,
+            "next": paginator.get_next_link(),
+            "previous": paginator.get_previous_link(),
+            "results": ArtImageSerializer(rows, many=True, context=context).data,
+        })
+
+    return await conditional(request, queryset, handler, related=("user",))
+
+
+def async_read_view(sync_view, handler):
+    """
+    Serve anonymous JSON GETs with the async `handler`; a handler returning
+    None, and any other request, falls through to the DRF `sync_view`.
+    """
+    run_sync = sync_to_async(sync_view)
+
+    async def view(request, *args, **kwargs):
+        if is_async_read(request, kwargs):
+            response = await handler(request, *args, **kwargs)
+            if response is not None:
+                return response
+        return await run_sync(request, *args, **kwargs)
+
+    # what the query budget middleware and CSRF checks read off DRF views
+    view.cls = sync_view.cls
+    view.initkwargs = sync_view.initkwargs
+    view.actions = sync_view.actions
+    view.csrf_exempt = True
+    return view
+
+
+ASYNC_READS = {
+    "posts-list": post_list,
+    "posts-detail": post_detail,
+    "artimage-list": art_image_list,
+}
+
+
+def with_async_reads(urlpatterns):
+    """Swap the router's views listed in ASYNC_READS for async_read_view wrappers."""
+    return [
+        URLPattern(
+            pattern.pattern,
+            async_read_view(pattern.callback, ASYNC_READS[pattern.name]),
+            pattern.default_args,
+            pattern.name,
+        )
+        if getattr(pattern, "name", None) in ASYNC_READS
+        else pattern
+        for pattern in urlpatterns
+    ]
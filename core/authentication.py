@@ -0,0 +1,167 @@
+"""
+Stateless JWT authentication.
+
+Tokens issued by `RefreshToken.for_user` carry the claims a request needs
+about its user (id, username, staff flags and the user's token version), so
+StatelessJWTAuthentication builds `request.user` from them without loading
+the user row. The other fields are deferred and load together, in one query,
+the first time a view touches one of them.
+
+Revocation is checked against RevocationCache, an in-process copy of the
+token version of every user that has revoked tokens and of the blacklisted
+refresh tokens (simplejwt's token_blacklist tables). It is updated at once by
+writes made in this process and synced from the database every
+JWT_REVOCATION_SYNC_SECONDS, which bounds how long a token revoked in another
+worker keeps working there.
+"""
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, router
+from django.db.models import Max
+from django.utils import timezone
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken as SimpleJWTRefreshToken
+
+from . import query_budget
+
+
+VERSION_CLAIM = "ver"
+# jti of the refresh token an access token was minted from, so blacklisting
+# the refresh token (logout) also revokes its access tokens
+REFRESH_JTI_CLAIM = "rjti"
+# rows committed out of id order are picked up by re-reading this many
+BLACKLIST_OVERLAP = 100
+# and rows saved with a skewed clock by re-reading this far back
+VERSION_OVERLAP = timedelta(seconds=60)
+
+
+def sync_seconds():
+    return getattr(settings, "JWT_REVOCATION_SYNC_SECONDS", 5)
+
+
+class RevocationCache:
+    """Per-process view of revoked tokens, see the module docstring."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.versions = {}
+        self.blacklisted = {}
+        self.last_blacklist_id = None
+        self.versions_since = None
+        self.next_sync = 0.0
+
+    def note_version(self, user_id, version):
+        if version:
+            self.versions[user_id] = max(version, self.versions.get(user_id, 0))
+
+    def note_blacklisted(self, jti, expires_at):
+        self.blacklisted[jti] = expires_at
+
+    def sync(self):
+        if time.monotonic() < self.next_sync:
+            return
+        with self.lock:
+            if time.monotonic() < self.next_sync:
+                return
+            with query_budget.uncounted():
+                self.load_versions()
+                self.load_blacklist()
+            self.next_sync = time.monotonic() + sync_seconds()
+
+    def load_versions(self):
+        now = timezone.now()
+        users = get_user_model().objects.using(DEFAULT_DB_ALIAS).filter(token_version__gt=0)
+        if self.versions_since is not None:
+            users = users.filter(updated_at__gte=self.versions_since - VERSION_OVERLAP)
+        for user_id, version in users.values_list("id", "token_version"):
+            self.note_version(user_id, version)
+        self.versions_since = now
+
+    def load_blacklist(self):
+        now = timezone.now()
+        tokens = BlacklistedToken.objects.using(DEFAULT_DB_ALIAS)
+        if self.last_blacklist_id is None:
+            self.last_blacklist_id = tokens.aggregate(last=Max("id"))["last"] or 0
+            rows = tokens.filter(token__expires_at__gt=now)
+        else:
+            rows = tokens.filter(id__gt=self.last_blacklist_id - BLACKLIST_OVERLAP)
+        for pk, jti, expires_at in rows.values_list("id", "token__jti", "token__expires_at"):
+            self.note_blacklisted(jti, expires_at)
+            self.last_blacklist_id = max(self.last_blacklist_id, pk)
+        self.blacklisted = {jti: expires for jti, expires in self.blacklisted.items() if expires > now}
+
+    def is_revoked(self, token):
+        self.sync()
+        user_id = token.get(jwt_settings.USER_ID_CLAIM)
+        if token.get(VERSION_CLAIM, 0) < self.versions.get(user_id, 0):
+            return True
+        return token.get(REFRESH_JTI_CLAIM) in self.blacklisted
+
+
+revocations = RevocationCache()
+
+
+class RefreshToken(SimpleJWTRefreshToken):
+    """Refresh token whose access tokens can be authenticated without a user query."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        for name in ("username", "is_staff", "is_superuser"):
+            token[name] = getattr(user, name)
+        token[VERSION_CLAIM] = user.token_version
+        return token
+
+    def verify(self, *args, **kwargs):
+        super().verify(*args, **kwargs)
+        if VERSION_CLAIM in self and revocations.is_revoked(self):
+            raise TokenError("Token has been revoked")
+
+    @property
+    def access_token(self):
+        access = super().access_token
+        access[REFRESH_JTI_CLAIM] = self[jwt_settings.JTI_CLAIM]
+        return access
+
+
+def user_from_claims(token):
+    """A User for `token` whose fields beyond the claims are deferred."""
+    User = get_user_model()
+    claims = {
+        "id": token[jwt_settings.USER_ID_CLAIM],
+        "username": token.get("username", ""),
+        "is_staff": token.get("is_staff", False),
+        "is_superuser": token.get("is_superuser", False),
+    }
+    # from_db expects values in field order
+    names = [f.attname for f in User._meta.concrete_fields if f.attname in claims]
+    user = User.from_db(router.db_for_read(User), names, [claims[name] for name in names])
+    user.from_token = True
+    return user
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that trusts the user claims of unrevoked tokens instead
+    of fetching the user. Tokens issued before token versions existed still
+    go through the regular lookup.
+    """
+
+    def get_user(self, validated_token):
+        if VERSION_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+        if jwt_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken("Token contained no recognizable user identification")
+        if revocations.is_revoked(validated_token):
+            raise InvalidToken("Token has been revoked")
+        return user_from_claims(validated_token)
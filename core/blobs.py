@@ -0,0 +1,299 @@
+"""
+Content-addressed storage for uploaded images.
+
+Each distinct upload is stored once. `MediaBlob` maps the BLAKE2b digest of
+the bytes to the stored name and counts the rows referring to it
+(`ArtImage.image`, `User.avatar`). An upload whose digest is already known
+reuses that object instead of being written again: the streaming upload
+handlers hash the bytes as they arrive and skip the PUT, `BlobImageField`
+does the same for files saved through the model (e.g. from the admin).
+
+Counts follow the rows (see core/signals.py): saving a row that points at a
+new name acquires it and releases the old one, deleting a row releases its
+name. A blob nothing refers to any more is deleted, with its variants, once
+the transaction commits. Variants of a shared blob have the same names for
+every row using it, so they are only deleted with the blob. Names that are
+not blobs (files stored before blobs existed) are left alone.
+
+An upload holds a reference of its own from the moment it is given a blob
+(`claim`, `register`) until a row has one. The streaming upload handlers
+collect theirs in the request's `HeldReferences` (see `holding`): a row
+saved with the name takes the reference over instead of counting another,
+and whatever is left is released when the request ends, which also deletes
+the uploads of a failed request. `BlobFieldFile` hands its over to the row
+it's saved on.
+
+Direct uploads (core/uploads.py) never pass through Django, so their digest
+is unknown: `adopt` records them without one. They are counted and deleted
+like the others but never reused, and adopting an object twice fails.
+"""
+import hashlib
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import F
+from django.db.models.fields.files import ImageField, ImageFieldFile
+from django.db.models.functions import Greatest
+
+from . import storage_deletes
+
+
+DIGEST_SIZE = 32
+
+# the references the uploads of the current request hold, see holding()
+_held = ContextVar("held_blob_references", default=None)
+
+
+def blob_model():
+    return apps.get_model("core", "MediaBlob")
+
+
+def new_hasher():
+    return hashlib.blake2b(digest_size=DIGEST_SIZE)
+
+
+def digest_of(content):
+    hasher = new_hasher()
+    for chunk in content.chunks():
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def claim(digest):
+    """
+    The blob stored for `digest`, or None, with a reference held for the
+    caller. Counted before it's read, so a release or a failed upload can't
+    delete it between the lookup and the reference.
+    """
+    MediaBlob = blob_model()
+    if not MediaBlob.objects.filter(digest=digest).update(refcount=F("refcount") + 1):
+        return None
+    return MediaBlob.objects.filter(digest=digest).first()
+
+
+def register(storage, entries):
+    """
+    Record freshly stored uploads, `entries` being (digest, name, size), and
+    return {name: name to use}. When the same bytes were registered first by
+    another upload, the new copy is deleted in favour of the earlier one.
+    Like claim(), holds a reference to each name returned.
+    """
+    MediaBlob = blob_model()
+    MediaBlob.objects.bulk_create(
+        [MediaBlob(digest=digest, name=name, size=size, refcount=1) for digest, name, size in entries],
+        ignore_conflicts=True,
+    )
+    with transaction.atomic():
+        # locked, so a release can't delete an earlier copy before it's counted
+        winners = dict(
+            MediaBlob.objects.select_for_update()
+            .filter(digest__in={digest for digest, _, _ in entries})
+            .values_list("digest", "name")
+        )
+        names = {name: winners[digest] for digest, name, _ in entries if digest in winners}
+        # the earlier copies that kept ours out
+        adjust(winner for name, winner in names.items() if winner != name)
+    storage_deletes.delete_files(storage, [name for name, winner in names.items() if winner != name])
+    gone = [entry for entry in entries if entry[0] not in winners]
+    if gone:
+        # an earlier copy was deleted after it kept ours out: try again
+        names.update(register(storage, gone))
+    return names
+
+
+def adopt(name, size):
+    """
+    Record the direct upload `name` as a blob with no references yet; the
+    row saved with it takes the first. Raises IntegrityError if it was
+    adopted before.
+    """
+    with transaction.atomic():
+        blob_model().objects.create(name=name, size=size)
+
+
+def grouped(names):
+    """{count: [name, ...]} so repeated names cost one UPDATE per distinct count."""
+    groups = {}
+    for name, count in Counter(name for name in names if name).items():
+        groups.setdefault(count, []).append(name)
+    return groups
+
+
+def adjust(names, sign=1):
+    """Add one reference to each of `names` per occurrence, or remove one with `sign=-1`."""
+    for count, group in grouped(names).items():
+        blob_model().objects.filter(name__in=group).update(refcount=Greatest(F("refcount") + sign * count, 0))
+
+
+def acquire(names):
+    """
+    Count one more reference to each of `names` (repeats count again). Outside
+    a transaction the rows are saved by now, so references the request's
+    uploads hold (see holding()) are taken over instead of counted again.
+    """
+    names = [name for name in names if name]
+    held = _held.get()
+    if held is not None and not transaction.get_connection().in_atomic_block:
+        names = held.take(names)
+    adjust(names)
+
+
+def release(storage, names):
+    """
+    Count one reference less to each of `names` and delete, on commit, the
+    blobs that drop to zero. Returns the names still referenced elsewhere.
+    """
+    MediaBlob = blob_model()
+    released = Counter(name for name in names if name)
+    if not released:
+        return set()
+    with transaction.atomic(savepoint=False):
+        # locked, so an upload claiming one of them waits for the outcome
+        counts = dict(
+            MediaBlob.objects.select_for_update().filter(name__in=released).values_list("name", "refcount")
+        )
+        orphans = [name for name, refcount in counts.items() if refcount <= released[name]]
+        adjust((name for name in released.elements() if name in counts and name not in orphans), sign=-1)
+        if orphans:
+            MediaBlob.objects.filter(name__in=orphans).delete()
+            storage_deletes.delete_files_on_commit(storage, orphans)
+    return set(counts) - set(orphans)
+
+
+class HeldReferences:
+    """The references claimed for the uploads of one request, by name."""
+
+    def __init__(self):
+        self.counts = Counter()
+        self.storages = {}
+
+    def add(self, storage, name):
+        self.counts[name] += 1
+        self.storages[name] = storage
+
+    def take(self, names):
+        """Hand the held references to `names` over to the caller; returns the names not held."""
+        rest = []
+        for name in names:
+            if self.counts[name]:
+                self.counts[name] -= 1
+            else:
+                rest.append(name)
+        return rest
+
+    def release(self):
+        by_storage = {}
+        for name in self.counts.elements():
+            by_storage.setdefault(self.storages[name], []).append(name)
+        self.counts.clear()
+        for storage, names in by_storage.items():
+            release(storage, names)
+
+
+def held_references():
+    """The HeldReferences of the current holding() block, or a new one outside any."""
+    return _held.get() or HeldReferences()
+
+
+@contextmanager
+def holding():
+    """
+    Collect the references the uploads in the block claim (a request's, see
+    core/upload_handlers.py) and release those no row took over when it exits.
+    """
+    held = HeldReferences()
+    token = _held.set(held)
+    try:
+        yield held
+    finally:
+        _held.reset(token)
+        held.release()
+
+
+def delete_unreferenced(storage, names, fail_silently=True):
+    """
+    Delete the stored `names` (and their blobs) unless a row refers to them
+    by now, e.g. uploads of a failed request. Returns the names deleted.
+    """
+    MediaBlob = blob_model()
+    with transaction.atomic():
+        counts = dict(MediaBlob.objects.select_for_update().filter(name__in=names).values_list("name", "refcount"))
+        unreferenced = [name for name in names if not counts.get(name)]
+        MediaBlob.objects.filter(name__in=unreferenced).delete()
+        # still locked: a blob can't be reused while its object goes
+        storage_deletes.delete_files(storage, unreferenced, fail_silently)
+    return unreferenced
+
+
+def is_shared(name, references=0):
+    """Whether more than `references` rows refer to `name`."""
+    return bool(name) and blob_model().objects.filter(name=name, refcount__gt=references).exists()
+
+
+class ReleaseBatch:
+    def __init__(self):
+        self.entries = {}
+
+    def add(self, storage, name, variant_names):
+        self.entries.setdefault(storage, []).append((name, variant_names))
+
+    def flush(self):
+        entries, self.entries = self.entries, {}
+        for storage, released in entries.items():
+            with transaction.atomic():
+                shared = release(storage, [name for name, _ in released])
+                storage_deletes.delete_files_on_commit(
+                    storage, [v for name, variants in released if name not in shared for v in variants]
+                )
+
+
+def release_on_commit(storage, name, variant_names=()):
+    """
+    Release `name` once the current transaction commits, batched with every
+    other release in it, and delete `variant_names` unless the blob is still
+    shared. Nothing is released if the transaction rolls back.
+    """
+    if not name and not variant_names:
+        return
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        batch = ReleaseBatch()
+        batch.add(storage, name, variant_names)
+        batch.flush()
+        return
+
+    batch = getattr(connection, "blob_release_batch", None)
+    # a batch whose callback was dropped by a rollback can't be reused
+    if batch is None or not any(func == batch.flush for _, func, _ in connection.run_on_commit):
+        batch = connection.blob_release_batch = ReleaseBatch()
+        transaction.on_commit(batch.flush)
+    batch.add(storage, name, variant_names)
+
+
+class BlobFieldFile(ImageFieldFile):
+    def save(self, name, content, save=True):
+        digest = digest_of(content)
+        blob = claim(digest)
+        if blob is None:
+            super().save(name, content, save=False)
+            self.name = register(self.storage, [(digest, self.name, content.size)])[self.name]
+        else:
+            # same bytes already stored: no PUT
+            self.name = blob.name
+            self._committed = True
+        setattr(self.instance, self.field.attname, self.name)
+        # the reference claimed above is the row's once it's saved (see core/signals.py)
+        self.instance.__dict__.setdefault("_claimed_blobs", {})[self.field.attname] = self.name
+        if save:
+            self.instance.save()
+
+    save.alters_data = True
+
+
+class BlobImageField(ImageField):
+    """ImageField whose saved files are deduplicated by content."""
+
+    attr_class = BlobFieldFile
@@ -0,0 +1,135 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+VERSION_KEY = "version:{label}"
+STATS_KEY = "response-cache:{name}"
+
+
+def get_cache():
+    return caches[getattr(settings, "RESPONSE_CACHE_ALIAS", "default")]
+
+
+def _seed_version(cache, key):
+    # A missing counter (never set, or evicted) restarts from the clock rather
+    # than from 1, so it can't collide with keys cached under an old version.
+    cache.add(key, time.time_ns(), timeout=None)
+    return cache.get(key)
+
+
+def get_versions(labels):
+    """Current version counter for each model label, e.g. "core.blogpost"."""
+    cache = get_cache()
+    keys = [VERSION_KEY.format(label=label) for label in labels]
+    found = cache.get_many(keys)
+    return [found[key] if key in found else _seed_version(cache, key) for key in keys]
+
+
+def bump_version(*labels):
+    """
+    Invalidate every cached response that depends on `labels`.
+
+    Old entries are never deleted, they just stop being addressed and expire
+    on their own TTL.
+    """
+    cache = get_cache()
+    for label in labels:
+        key = VERSION_KEY.format(label=label)
+        try:
+            cache.incr(key)
+        except ValueError:
+            _seed_version(cache, key)
+
+
+def bump_version_on_commit(*labels):
+    """Bump once the current transaction commits, so readers can't re-cache stale rows."""
+    transaction.on_commit(lambda: bump_version(*labels))
+
+
+def make_cache_key(name, path, query_params, dependencies):
+    """Response cache key for `path` + params under the current dependency versions."""
+    query = urlencode(sorted(query_params.lists()), doseq=True)
+    versions = ".".join(str(v) for v in get_versions(dependencies))
+    digest = hashlib.md5(f"{path}?{query}".encode()).hexdigest()
+    return f"response:{name}:{versions}:{digest}"
+
+
+def record(name):
+    cache = get_cache()
+    key = STATS_KEY.format(name=name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def get_stats():
+    cache = get_cache()
+    hits = cache.get(STATS_KEY.format(name="hits"), 0)
+    misses = cache.get(STATS_KEY.format(name="misses"), 0)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / total, 4) if total else None,
+    }
+
+
+class CachedResponseMixin:
+    """
+    Caches anonymous GET responses of the listed actions.
+
+    The key includes the path, the sorted query params and the version
+    counters of `cache_dependencies`, so bumping any of those versions
+    (see core/signals.py) invalidates every cached page at once.
+
+        cache_actions = ("list", "retrieve")
+        cache_dependencies = ("core.blogpost",)
+    """
+
+    cache_actions = ("list", "retrieve")
+    cache_dependencies = ()
+
+    def get_cache_key(self, request):
+        return make_cache_key(
+            f"{self.basename}:{self.action}", request.path, request.query_params, self.cache_dependencies
+        )
+
+    def should_cache(self, request):
+        return (
+            getattr(settings, "RESPONSE_CACHE_ENABLED", True)
+            and request.method == "GET"
+            and self.action in self.cache_actions
+            and not request.user.is_authenticated
+        )
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not self.should_cache(request):
+            return handler(request, *args, **kwargs)
+
+        cache = get_cache()
+        cache_key = self.get_cache_key(request)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            record("hits")
+            return Response(cached, headers={"X-Cache": "HIT"})
+
+        record("misses")
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            timeout = getattr(settings, "RESPONSE_CACHE_TIMEOUT", 300)
+            cache.set(cache_key, response.data, timeout)
+        response["X-Cache"] = "MISS"
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,59 @@
+"""
+Per-category post counts, stored on BlogCategory so listing categories
+never runs a COUNT(*) per request.
+
+`post_count` and `latest_post_at` are adjusted with one UPDATE whenever a
+post is created, deleted or moved to another category (see core/signals.py).
+Adding a post bumps the count and keeps the later timestamp. Removing one
+drops the count and reads the newest remaining post off the
+(category, created_at) index. `QuerySet.update()` and raw SQL bypass the
+signals; run `manage.py recount_categories` after those.
+"""
+from django.db.models import Count, F, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from rest_framework.exceptions import ValidationError
+
+from .models import BlogCategory, BlogPost
+
+
+def post_added(category_id, created_at):
+    if category_id is None:
+        return
+    BlogCategory.objects.filter(pk=category_id).update(
+        post_count=F("post_count") + 1,
+        latest_post_at=Greatest(Coalesce("latest_post_at", Value(created_at)), Value(created_at)),
+    )
+
+
+def post_removed(category_id):
+    if category_id is None:
+        return
+    newest = BlogPost.objects.filter(category_id=category_id).order_by("-created_at").values("created_at")[:1]
+    BlogCategory.objects.filter(pk=category_id).update(
+        post_count=Greatest(F("post_count") - 1, 0),
+        latest_post_at=Subquery(newest),
+    )
+
+
+def recount():
+    """Recompute every category's counters from the posts; returns the number of categories."""
+    posts = BlogPost.objects.filter(category=OuterRef("pk")).order_by().values("category")
+    return BlogCategory.objects.update(
+        post_count=Coalesce(Subquery(posts.annotate(count=Count("pk")).values("count")), 0),
+        latest_post_at=Subquery(posts.annotate(latest=Max("created_at")).values("latest")),
+    )
+
+
+def category_id(value):
+    """The category id from a `?category=` param, or None when absent."""
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError({"category": "A valid integer is required."})
+
+
+def filter_posts(queryset, value):
+    pk = category_id(value)
+    return queryset if pk is None else queryset.filter(category_id=pk)
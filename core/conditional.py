@@ -0,0 +1,123 @@
+import hashlib
+from urllib.parse import urlencode
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+def make_etag(*parts):
+    digest = hashlib.md5(":".join(str(part) for part in parts).encode()).hexdigest()
+    # weak: the same rows can be rendered as JSON or the browsable API
+    return f'W/"{digest}"'
+
+
+def validator_aggregates(field="updated_at", related=()):
+    """
+    Aggregates for list_validators(). `related` names the relations the
+    serializer shows fields of (e.g. "user" for the uploader's username):
+    changing one of those rows changes the response too.
+    """
+    aggregates = {"last_modified": Max(field), "count": Count("pk")}
+    for relation in related:
+        aggregates[f"last_modified_{relation}"] = Max(f"{relation}__{field}")
+    return aggregates
+
+
+def latest(*timestamps):
+    return max((timestamp for timestamp in timestamps if timestamp is not None), default=None)
+
+
+def list_validators(path, query_params, aggregate):
+    """(etag, last_modified) for a list from its validator_aggregates() result."""
+    last_modified = latest(*(value for name, value in aggregate.items() if name.startswith("last_modified")))
+    query = urlencode(sorted(query_params.lists()), doseq=True)
+    etag = make_etag(
+        path,
+        query,
+        aggregate["count"],
+        last_modified.isoformat() if last_modified else "",
+    )
+    return etag, last_modified
+
+
+def object_validators(instance, field="updated_at", related=()):
+    """(etag, last_modified) for one object; `related` as for validator_aggregates()."""
+    last_modified = getattr(instance, field)
+    for relation in related:
+        related_object = getattr(instance, relation)
+        if related_object is not None:
+            last_modified = latest(last_modified, getattr(related_object, field))
+    etag = make_etag(type(instance).__name__, instance.pk, last_modified.isoformat())
+    return etag, last_modified
+
+
+def not_modified_response(request, etag, last_modified):
+    """A 304 (or 412) response if the request's preconditions match, else None."""
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    return get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+
+def set_validators(response, etag, last_modified):
+    if response.status_code == 200:
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(int(last_modified.timestamp()))
+    return response
+
+
+class ConditionalGetMixin:
+    """
+    ETag / Last-Modified support for list and detail actions.
+
+    Validators are computed before serialization: from the object itself
+    on detail views and from a single MAX(updated_at) + COUNT(*) aggregate
+    on lists. A matching If-None-Match / If-Modified-Since returns 304
+    without running the serializer. `related_last_modified` lists the
+    relations the serializer shows fields of; their updated_at counts too.
+    """
+
+    conditional_actions = ("list", "retrieve")
+    last_modified_field = "updated_at"
+    related_last_modified = ()
+
+    _object = None
+
+    def get_object(self):
+        # retrieve() needs the object for validators before the handler runs
+        if self._object is None:
+            self._object = super().get_object()
+        return self._object
+
+    def get_object_validators(self, instance, related=None):
+        related = self.related_last_modified if related is None else related
+        return object_validators(instance, self.last_modified_field, related)
+
+    def get_queryset_validators(self, request, queryset, related=None):
+        related = self.related_last_modified if related is None else related
+        aggregate = queryset.order_by().aggregate(**validator_aggregates(self.last_modified_field, related))
+        return list_validators(request.path, request.query_params, aggregate)
+
+    def conditional_response(self, request, etag, last_modified, handler, *args, **kwargs):
+        not_modified = not_modified_response(request._request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        response = handler(request, *args, **kwargs)
+        return set_validators(response, etag, last_modified)
+
+    def uses_conditional_get(self, request):
+        return request.method in ("GET", "HEAD") and self.action in self.conditional_actions
+
+    def list(self, request, *args, **kwargs):
+        if not self.uses_conditional_get(request):
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        etag, last_modified = self.get_queryset_validators(request, queryset)
+        return self.conditional_response(request, etag, last_modified, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.uses_conditional_get(request):
+            return super().retrieve(request, *args, **kwargs)
+        etag, last_modified = self.get_object_validators(self.get_object())
+        return self.conditional_response(request, etag, last_modified, super().retrieve, *args, **kwargs)
@@ -0,0 +1,41 @@
+"""
+Connection pool metrics.
+
+With DB_CONNECTIONS=pool every worker process keeps its own psycopg pool
+(Django's native pooling), so the numbers describe the process that served
+the request, identified by `pid`.
+"""
+import os
+
+from django.conf import settings
+from django.db import connections
+
+
+def pool_stats():
+    """Counters for every pooled database alias in this process."""
+    pools = {}
+    for alias in connections:
+        pool = getattr(connections[alias], "pool", None)
+        if pool is None:
+            continue
+        stats = pool.get_stats()
+        pools[alias] = {
+            "checked_out": stats.get("pool_size", 0) - stats.get("pool_available", 0),
+            "idle": stats.get("pool_available", 0),
+            "size": stats.get("pool_size", 0),
+            "min_size": stats.get("pool_min", 0),
+            "max_size": stats.get("pool_max", 0),
+            "waiting": stats.get("requests_waiting", 0),
+            "created": stats.get("connections_num", 0),
+            "requests": stats.get("requests_num", 0),
+            "queued": stats.get("requests_queued", 0),
+            "wait_ms": stats.get("requests_wait_ms", 0),
+            "timeouts": stats.get("requests_errors", 0),
+            "connection_errors": stats.get("connections_errors", 0),
+            "connections_lost": stats.get("connections_lost", 0),
+        }
+    return {
+        "mode": getattr(settings, "DB_CONNECTIONS", "none"),
+        "pid": os.getpid(),
+        "pools": pools,
+    }
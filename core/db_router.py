@@ -0,0 +1,141 @@
+"""
+Read-replica routing.
+
+ReplicaRoutingMiddleware decides per request whether reads may go to a
+replica: only for safe methods, and not for a client that wrote within the
+last REPLICA_STICKY_SECONDS (read-your-writes). A successful unsafe request
+pins its client to the primary for that window, keyed by user id (so it
+follows JWT clients) and by a cookie (for sessions, e.g. the admin).
+
+ReplicaRouter reads that decision from a context variable, so code outside
+a request (workers, management commands, on_commit jobs) always uses the
+primary. Writes, and reads inside a transaction on the primary, never leave
+it.
+"""
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from . import cache
+
+
+PIN_KEY = "replica-pin:{user_id}"
+
+# replica alias for reads in the current request, None for the primary
+_read_alias = ContextVar("read_alias", default=None)
+
+
+def replica_aliases():
+    return list(getattr(settings, "REPLICA_DATABASES", []))
+
+
+def sticky_seconds():
+    return getattr(settings, "REPLICA_STICKY_SECONDS", 5)
+
+
+def pin_cookie():
+    return getattr(settings, "REPLICA_PIN_COOKIE", "replica_pin")
+
+
+def token_user_id(request):
+    """User id claimed by a valid bearer token, without touching the database."""
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    if header is None:
+        return None
+    raw_token = authentication.get_raw_token(header)
+    if raw_token is None:
+        return None
+    try:
+        return authentication.get_validated_token(raw_token).get(jwt_settings.USER_ID_CLAIM)
+    except (InvalidToken, TokenError):
+        return None
+
+
+def is_pinned(request):
+    if pin_cookie() in request.COOKIES:
+        return True
+    user_id = token_user_id(request)
+    return user_id is not None and cache.get_cache().get(PIN_KEY.format(user_id=user_id)) is not None
+
+
+def pin(request, response):
+    """Keep this client on the primary until replicas have caught up with its write."""
+    seconds = sticky_seconds()
+    response.set_cookie(pin_cookie(), "1", max_age=seconds, httponly=True, samesite="Lax")
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        cache.get_cache().set(PIN_KEY.format(user_id=user.pk), 1, seconds)
+
+
+def choose_read_alias(request):
+    replicas = replica_aliases()
+    if not replicas or request.method not in SAFE_METHODS or is_pinned(request):
+        return None
+    # one replica per request, so its reads are consistent with each other
+    return random.choice(replicas)
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        token = _read_alias.set(choose_read_alias(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_alias.reset(token)
+        return self.finish(request, response)
+
+    async def __acall__(self, request):
+        token = _read_alias.set(await sync_to_async(choose_read_alias)(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            _read_alias.reset(token)
+        return await sync_to_async(self.finish)(request, response)
+
+    def finish(self, request, response):
+        if replica_aliases() and request.method not in SAFE_METHODS and response.status_code < 400:
+            pin(request, response)
+        return response
+
+
+class ReplicaRouter:
+    """Sends reads to the replica chosen for the current request, everything else to default."""
+
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas get the schema through replication
+        return db not in replica_aliases()
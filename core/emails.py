@@ -0,0 +1,199 @@
+"""
+Database-backed email outbox.
+
+Views call `enqueue()`, which is a single INSERT/UPDATE. The
+`send_queued_emails` worker claims due rows, renders them, and delivers
+each batch over one SMTP connection, retrying failures with exponential
+backoff.
+
+Templated kinds are rendered at send time by a function registered in
+RENDERERS, and deduplication against recently sent messages happens there
+too, so a request does the same work whether or not the recipient turns
+out to exist. A renderer returning None marks the row as skipped.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from django.core.mail import EmailMessage, get_connection
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from .models import OutboundEmail
+
+
+logger = logging.getLogger(__file__)
+
+MESSAGE = "message"
+PASSWORD_RESET = "password_reset"
+
+
+def outbox_setting(name, default):
+    return getattr(settings, "EMAIL_OUTBOX", {}).get(name, default)
+
+
+def enqueue(kind, to, subject="", body="", dedupe_key=""):
+    """
+    Queue an email. With a `dedupe_key`, a message that is still pending
+    is refreshed instead of queued twice, and the worker skips it if one
+    was sent within EMAIL_OUTBOX["DEDUPE_WINDOW"] seconds (see deliver()).
+    """
+    if dedupe_key:
+        updated = OutboundEmail.objects.filter(
+            dedupe_key=dedupe_key, status=OutboundEmail.PENDING
+        ).update(to=to, subject=subject, body=body)
+        if updated:
+            return None
+
+    try:
+        with transaction.atomic():
+            return OutboundEmail.objects.create(
+                kind=kind, to=to, subject=subject, body=body, dedupe_key=dedupe_key
+            )
+    except IntegrityError:
+        # a concurrent request queued the same dedupe_key first
+        return None
+
+
+def send_message(to, subject, body):
+    """Queue a plain-text notification."""
+    return enqueue(MESSAGE, to, subject=subject, body=body)
+
+
+def render_message(email):
+    return email.subject, email.body
+
+
+def render_password_reset(email):
+    User = get_user_model()
+    user = User.objects.filter(email__iexact=email.to, is_active=True).first()
+    if user is None:
+        return None
+
+    token = PasswordResetTokenGenerator().make_token(user)
+    uid = urlsafe_base64_encode(force_bytes(user.pk))
+    reset_link = f"{settings.FRONTEND_URL}/reset-password/{uid}/{token}"
+    return (
+        "Password Reset Request",
+        f"Click the link to reset your password: {reset_link}",
+    )
+
+
+RENDERERS = {
+    MESSAGE: render_message,
+    PASSWORD_RESET: render_password_reset,
+}
+
+
+def recently_sent(batch):
+    """Dedupe keys in `batch` of messages sent within EMAIL_OUTBOX["DEDUPE_WINDOW"] seconds."""
+    keys = {email.dedupe_key for email in batch if email.dedupe_key}
+    if not keys:
+        return set()
+    window = timedelta(seconds=outbox_setting("DEDUPE_WINDOW", 300))
+    return set(
+        OutboundEmail.objects.filter(
+            dedupe_key__in=keys,
+            status=OutboundEmail.SENT,
+            sent_at__gte=timezone.now() - window,
+        ).values_list("dedupe_key", flat=True)
+    )
+
+
+def claim_batch(size):
+    """
+    Lease up to `size` due messages. Leased rows stay pending with
+    next_attempt_at pushed out, so a crashed worker's batch comes back
+    on its own once the lease expires.
+    """
+    now = timezone.now()
+    lease = timedelta(seconds=outbox_setting("LEASE_SECONDS", 300))
+    with transaction.atomic():
+        batch = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutboundEmail.PENDING, next_attempt_at__lte=now)
+            .order_by("next_attempt_at", "id")[:size]
+        )
+        OutboundEmail.objects.filter(pk__in=[email.pk for email in batch]).update(
+            next_attempt_at=now + lease
+        )
+    return batch
+
+
+def mark_failed(email, error):
+    max_attempts = outbox_setting("MAX_ATTEMPTS", 5)
+    base_delay = outbox_setting("RETRY_BASE_DELAY", 30)
+    email.attempts += 1
+    email.last_error = str(error)[:2000]
+    if email.attempts >= max_attempts:
+        email.status = OutboundEmail.FAILED
+    else:
+        email.next_attempt_at = timezone.now() + timedelta(seconds=base_delay * 2 ** (email.attempts - 1))
+    email.save(update_fields=["attempts", "last_error", "status", "next_attempt_at"])
+
+
+def deliver(batch):
+    """Send `batch` over a single SMTP connection. Returns the number sent."""
+    sent = 0
+    connection = None
+    duplicates = recently_sent(batch)
+    try:
+        for email in batch:
+            if email.dedupe_key in duplicates:
+                email.status = OutboundEmail.SKIPPED
+                email.save(update_fields=["status"])
+                continue
+
+            try:
+                rendered = RENDERERS[email.kind](email)
+            except Exception as exc:
+                logger.exception("Could not render outbound email %s", email.pk)
+                mark_failed(email, exc)
+                continue
+
+            if rendered is None:
+                email.status = OutboundEmail.SKIPPED
+                email.save(update_fields=["status"])
+                continue
+
+            if connection is None:
+                try:
+                    connection = get_connection()
+                    connection.open()
+                except Exception as exc:
+                    logger.warning("Could not open email connection: %s", exc)
+                    mark_failed(email, exc)
+                    connection = None
+                    continue
+
+            subject, body = rendered
+            message = EmailMessage(
+                subject=subject,
+                body=body,
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                to=[email.to],
+                connection=connection,
+            )
+            try:
+                message.send()
+            except Exception as exc:
+                logger.warning("Sending outbound email %s failed: %s", email.pk, exc)
+                mark_failed(email, exc)
+                # the connection may be unusable after an SMTP error
+                connection.close()
+                connection = None
+                continue
+
+            email.status = OutboundEmail.SENT
+            email.sent_at = timezone.now()
+            email.attempts += 1
+            email.save(update_fields=["status", "sent_at", "attempts"])
+            sent += 1
+    finally:
+        if connection is not None:
+            connection.close()
+    return sent
@@ -0,0 +1,58 @@
+"""
+Password hashers with their cost parameters taken from settings.
+
+Django rehashes a password on the next successful login whenever it was
+hashed by a hasher other than the first in PASSWORD_HASHERS, or with
+different parameters, so switching PASSWORD_HASHER or changing a cost
+upgrades existing accounts as their owners sign in.
+"""
+import functools
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.utils.crypto import get_random_string
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    @property
+    def time_cost(self):
+        return getattr(settings, "ARGON2_TIME_COST", 2)
+
+    @property
+    def memory_cost(self):
+        # KiB
+        return getattr(settings, "ARGON2_MEMORY_COST", 19456)
+
+    @property
+    def parallelism(self):
+        return getattr(settings, "ARGON2_PARALLELISM", 1)
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    block_size = 8
+
+    @property
+    def work_factor(self):
+        return getattr(settings, "SCRYPT_WORK_FACTOR", 2**14)
+
+    @property
+    def parallelism(self):
+        return getattr(settings, "SCRYPT_PARALLELISM", 1)
+
+    @property
+    def maxmem(self):
+        # OpenSSL refuses more than 32 MiB unless told otherwise
+        return 2 * 128 * self.work_factor * self.block_size * self.parallelism
+
+
+@functools.cache
+def dummy_hash():
+    return hashers.make_password(get_random_string(32))
+
+
+def check_dummy_password(password):
+    """
+    Verify `password` against a throwaway hash from the preferred hasher, so
+    a login for an unknown email costs as much as one with a wrong password.
+    """
+    hashers.check_password(password, dummy_hash())
@@ -0,0 +1,198 @@
+"""
+Resized, re-encoded variants of uploaded images.
+
+For every configured width (never upscaling) each enabled format is
+written next to the original, e.g. `art_images/cat.jpg` gets
+`art_images/cat.300w.webp`. The storage names are recorded on the row:
+
+    {"source": "art_images/cat.jpg", "width": 2400, "height": 1600,
+     "files": {"webp": {"300w": "art_images/cat.300w.webp", ...}, ...}}
+
+Generation runs after commit on a small per-process thread pool, off the
+request path. `manage.py generate_image_variants` backfills rows that have
+no variants, including any whose job was lost to a restart.
+
+Rows sharing an upload (see core/blobs.py) share its variants: a row
+copies the map of another row with the same source instead of building it.
+"""
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image, ImageOps, features
+
+from . import blobs, storage_deletes
+
+
+logger = logging.getLogger(__file__)
+
+DEFAULTS = {
+    "WIDTHS": (300, 800, 1600),
+    "FORMATS": ("avif", "webp", "jpeg"),
+    "QUALITY": {"avif": 55, "webp": 75, "jpeg": 80},
+    "ASYNC": True,
+    "WORKERS": 2,
+}
+
+PIL_FORMATS = {"avif": "AVIF", "webp": "WEBP", "jpeg": "JPEG"}
+
+_executor = None
+
+
+def variant_setting(name):
+    return getattr(settings, "IMAGE_VARIANTS", {}).get(name, DEFAULTS[name])
+
+
+def enabled_formats():
+    # AVIF needs a Pillow build with libavif
+    return [fmt for fmt in variant_setting("FORMATS") if fmt != "avif" or features.check("avif")]
+
+
+def variant_name(source_name, width, fmt):
+    root, _ = os.path.splitext(source_name)
+    return f"{root}.{width}w.{fmt}"
+
+
+def encode(image, fmt):
+    buffer = io.BytesIO()
+    if fmt == "jpeg" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    image.save(buffer, PIL_FORMATS[fmt], quality=variant_setting("QUALITY").get(fmt, 80), optimize=fmt == "jpeg")
+    return buffer.getvalue()
+
+
+def build_variants(field_file):
+    """Write every variant of `field_file` to its storage, return the variants map."""
+    storage = field_file.storage
+    with field_file.open("rb") as handle:
+        original = ImageOps.exif_transpose(Image.open(handle))
+        original.load()
+
+    if original.mode not in ("RGB", "RGBA", "L"):
+        original = original.convert("RGBA" if "A" in original.getbands() else "RGB")
+
+    width, height = original.size
+    widths = [w for w in variant_setting("WIDTHS") if w < width] or [width]
+    files = {}
+    for target in widths:
+        resized = original
+        if target < width:
+            resized = original.resize((target, round(height * target / width)), Image.LANCZOS)
+        for fmt in enabled_formats():
+            name = storage.save(variant_name(field_file.name, target, fmt), ContentFile(encode(resized, fmt)))
+            files.setdefault(fmt, {})[f"{target}w"] = name
+
+    return {"source": field_file.name, "width": width, "height": height, "files": files}
+
+
+def variant_names(variants):
+    return [name for names in (variants or {}).get("files", {}).values() for name in names.values()]
+
+
+def delete_variants(storage, variants, keep=None, references=0):
+    """
+    Delete the files of `variants` except those also in `keep`, unless
+    rows besides the `references` that were just given new ones still show
+    them.
+    """
+    if blobs.is_shared((variants or {}).get("source"), references):
+        # other rows still show them
+        return
+    kept = set(variant_names(keep))
+    storage_deletes.delete_files(storage, [name for name in variant_names(variants) if name not in kept])
+
+
+def variant_urls(field_file, variants):
+    """{"webp": {"300w": url, ...}, ...} for serializers; empty until generated."""
+    if not field_file or not variants or variants.get("source") != field_file.name:
+        return {}
+    storage = field_file.storage
+    return {
+        fmt: {size: storage.url(name) for size, name in names.items()}
+        for fmt, names in variants.get("files", {}).items()
+    }
+
+
+def needs_variants(field_file, variants):
+    if not field_file:
+        # image cleared, stale variants still need removing
+        return bool(variants)
+    return (variants or {}).get("source") != field_file.name
+
+
+def shared_variants(model, pk, field, variants_field, name):
+    """Variants another row already built for the same stored file, if any."""
+    return (
+        model._default_manager.filter(**{field: name, f"{variants_field}__source": name})
+        .exclude(pk=pk)
+        .values_list(variants_field, flat=True)
+        .first()
+    )
+
+
+def generate(model, pk, field, variants_field, force=False):
+    """
+    Build variants for one row and store them, replacing stale ones. With
+    `force` they're rebuilt even if current (e.g. after changing
+    IMAGE_VARIANTS), for every row of `model` showing the same file.
+    """
+    instance = model._default_manager.filter(pk=pk).first()
+    if instance is None:
+        return
+    field_file = getattr(instance, field)
+    old = getattr(instance, variants_field)
+    if not force and not needs_variants(field_file, old):
+        return
+
+    if field_file:
+        shared = None if force else shared_variants(model, pk, field, variants_field, field_file.name)
+        variants = shared or build_variants(field_file)
+        unchanged = Q(**{field: field_file.name})
+    else:
+        variants = {}
+        unchanged = Q(**{field: ""}) | Q(**{f"{field}__isnull": True})
+    rows = model._default_manager.filter(unchanged)
+    if not (force and field_file):
+        rows = rows.filter(pk=pk)
+    # skip the save (and signals) and only touch the variants column, and
+    # updated_at so conditional GETs (core/conditional.py) see the change
+    updated = rows.update(**{variants_field: variants, "updated_at": timezone.now()})
+    if updated:
+        # rebuilt variants of the same file may keep some names (they're content-hashed)
+        rebuilt = force and (old or {}).get("source") == field_file.name
+        delete_variants(field_file.storage, old, keep=variants, references=updated if rebuilt else 0)
+    else:
+        # the image was replaced while we were working
+        delete_variants(field_file.storage, variants)
+
+
+def _run(model, pk, field, variants_field):
+    close_old_connections()
+    try:
+        generate(model, pk, field, variants_field)
+    except Exception:
+        logger.exception("Generating %s variants for %s %s failed", field, model.__name__, pk)
+    finally:
+        close_old_connections()
+
+
+def schedule(instance, field, variants_field):
+    """Generate variants for `instance` once the current transaction commits."""
+    args = (type(instance), instance.pk, field, variants_field)
+
+    def submit():
+        global _executor
+        if not variant_setting("ASYNC"):
+            generate(*args)
+            return
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=variant_setting("WORKERS"), thread_name_prefix="image-variants")
+        _executor.submit(_run, *args)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from core.models import BlogPost
+
+
+class Command(BaseCommand):
+    help = "Recompute stored excerpt, word count, reading time and rendered HTML for blog posts"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--only-missing",
+            action="store_true",
+            help="Only process posts that have no excerpt or rendered HTML yet",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        queryset = BlogPost.objects.order_by("pk")
+        if options["only_missing"]:
+            queryset = queryset.filter(Q(excerpt="") | Q(rendered_content=""))
+
+        batch, total = [], 0
+        for post in queryset.only("pk", "content").iterator(chunk_size=batch_size):
+            post.update_text_fields()
+            batch.append(post)
+            if len(batch) >= batch_size:
+                total += BlogPost.objects.bulk_update(batch, BlogPost.TEXT_FIELDS)
+                batch = []
+        if batch:
+            total += BlogPost.objects.bulk_update(batch, BlogPost.TEXT_FIELDS)
+
+        self.stdout.write(self.style.SUCCESS(f"Updated {total} post(s)"))
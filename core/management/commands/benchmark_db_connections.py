@@ -0,0 +1,111 @@
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+
+from core.db_pool import pool_stats
+
+
+MODES = ("none", "persistent", "pool")
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay request-shaped bursts against the default (Postgres) database "
+        "with each connection mode and report per-request latency. Every "
+        "simulated request fires request_started/request_finished like a real "
+        "one, so connections are opened, kept or returned exactly as in a worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+        parser.add_argument("--concurrency", type=int, default=8, help="Threads, i.e. concurrent requests")
+        parser.add_argument("--requests", type=int, default=500, help="Requests per thread")
+        parser.add_argument("--queries", type=int, default=3, help="Queries per request")
+        parser.add_argument("--pool-size", type=int, default=4, help="max_size in pool mode")
+
+    def handle(self, *args, **options):
+        if connections[DEFAULT_DB_ALIAS].vendor != "postgresql":
+            raise CommandError("Connection modes only apply to the PostgreSQL backend")
+
+        self.db_settings = connections.settings[DEFAULT_DB_ALIAS]
+        self.original = {
+            key: self.db_settings[key] for key in ("OPTIONS", "CONN_MAX_AGE", "CONN_HEALTH_CHECKS")
+        }
+        try:
+            for mode in options["modes"]:
+                self.configure(mode, options["pool_size"])
+                self.report(mode, *self.run(options))
+        finally:
+            self.reset()
+            self.db_settings.update(self.original)
+
+    def reset(self):
+        connection = connections[DEFAULT_DB_ALIAS]
+        connection.close()
+        if hasattr(connection, "close_pool"):
+            connection.close_pool()
+
+    def configure(self, mode, pool_size):
+        self.reset()
+        options = dict(self.original["OPTIONS"])
+        options.pop("pool", None)
+        self.db_settings["CONN_MAX_AGE"] = 0
+        self.db_settings["CONN_HEALTH_CHECKS"] = mode != "none"
+        if mode == "persistent":
+            self.db_settings["CONN_MAX_AGE"] = 60
+        elif mode == "pool":
+            options["pool"] = {"min_size": 1, "max_size": pool_size, "timeout": 30}
+        self.db_settings["OPTIONS"] = options
+
+    def run(self, options):
+        latencies, created, lock = [], [0], threading.Lock()
+
+        def on_created(sender, **kwargs):
+            with lock:
+                created[0] += 1
+
+        def worker():
+            mine = []
+            for _ in range(options["requests"]):
+                started = time.perf_counter()
+                request_started.send(sender=self.__class__)
+                with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+                    for _ in range(options["queries"]):
+                        cursor.execute("SELECT 1")
+                        cursor.fetchone()
+                request_finished.send(sender=self.__class__)
+                mine.append(time.perf_counter() - started)
+            connections[DEFAULT_DB_ALIAS].close()
+            with lock:
+                latencies.extend(mine)
+
+        connection_created.connect(on_created)
+        try:
+            threads = [threading.Thread(target=worker) for _ in range(options["concurrency"])]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+        finally:
+            connection_created.disconnect(on_created)
+        return sorted(latencies), elapsed, created[0]
+
+    def report(self, mode, latencies, elapsed, created):
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+        if mode == "pool":
+            # connection_created fires on every checkout from the pool
+            created = pool_stats()["pools"][DEFAULT_DB_ALIAS]["created"]
+        self.stdout.write(
+            f"{mode:>10}: {len(latencies) / elapsed:8.1f} req/s  "
+            f"p50 {percentile(0.5):6.2f} ms  p99 {percentile(0.99):7.2f} ms  "
+            f"mean {statistics.mean(latencies) * 1000:6.2f} ms  connections opened {created}"
+        )
@@ -0,0 +1,40 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher, get_hashers
+from django.core.management.base import BaseCommand
+
+from core.hashers import check_dummy_password
+
+
+class Command(BaseCommand):
+    help = (
+        "Time one password check with every hasher in PASSWORD_HASHERS at the "
+        "configured costs, and the dummy check unknown emails get. Use it to "
+        "size ARGON2_* / SCRYPT_* against login throughput per worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rounds", type=int, default=10)
+
+    def handle(self, *args, **options):
+        rounds = options["rounds"]
+        preferred = get_hasher().algorithm
+        for hasher in get_hashers():
+            encoded = hasher.encode("correct horse battery staple", hasher.salt())
+            elapsed = self.time(lambda: hasher.verify("correct horse battery staple", encoded), rounds)
+            marker = " (preferred)" if hasher.algorithm == preferred else ""
+            self.report(f"{hasher.algorithm}{marker}", elapsed)
+
+        check_dummy_password("warm up")
+        self.report("dummy check", self.time(lambda: check_dummy_password("wrong"), rounds))
+        self.stdout.write(f"PASSWORD_HASHER={getattr(settings, 'PASSWORD_HASHER', '-')}")
+
+    def time(self, check, rounds):
+        started = time.perf_counter()
+        for _ in range(rounds):
+            check()
+        return (time.perf_counter() - started) / rounds
+
+    def report(self, name, seconds):
+        self.stdout.write(f"{name:>28}: {seconds * 1000:8.1f} ms/check  {1 / seconds:7.1f} checks/s per core")
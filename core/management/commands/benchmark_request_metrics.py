@@ -0,0 +1,76 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from rest_framework.serializers import BaseSerializer
+
+from core import metrics
+
+
+MIDDLEWARE = "core.metrics.MetricsMiddleware"
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure what MetricsMiddleware adds to a request: the same GETs go "
+        "through the full middleware stack with metrics off and on, in "
+        "alternating rounds, and the per-request latencies are compared. "
+        "Also times rendering /metrics."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="*", default=["/api/posts/", "/api/categories/"])
+        parser.add_argument("--requests", type=int, default=500, help="Requests per path per round")
+        parser.add_argument("--rounds", type=int, default=4)
+        parser.add_argument("--host", help="Host header, default the first ALLOWED_HOSTS entry")
+
+    def handle(self, *args, **options):
+        host = options["host"] or next((h.lstrip(".") for h in settings.ALLOWED_HOSTS if h != "*"), "localhost")
+        without = [m for m in settings.MIDDLEWARE if m != MIDDLEWARE]
+        timed = BaseSerializer.data
+        untimed = property(getattr(timed.fget, "__wrapped__", timed.fget))
+
+        latencies = {"off": [], "on": []}
+        try:
+            for _ in range(options["rounds"]):
+                for mode in ("off", "on"):
+                    middleware = without if mode == "off" else [MIDDLEWARE] + without
+                    BaseSerializer.data = untimed if mode == "off" else timed
+                    with override_settings(MIDDLEWARE=middleware, METRICS={**settings.METRICS, "ENABLED": True}):
+                        latencies[mode].extend(self.run(Client(HTTP_HOST=host), options))
+        finally:
+            BaseSerializer.data = timed
+
+        for mode in ("off", "on"):
+            self.report(mode, sorted(latencies[mode]))
+        overhead = statistics.mean(latencies["on"]) - statistics.mean(latencies["off"])
+        base = statistics.mean(latencies["off"])
+        self.stdout.write(f"overhead: {overhead * 1e6:+.1f} us per request ({overhead / base:+.2%})")
+
+        started = time.perf_counter()
+        body = metrics.render(metrics.collect())
+        self.stdout.write(
+            f"/metrics: {len(body.splitlines())} lines rendered in {(time.perf_counter() - started) * 1000:.2f} ms"
+        )
+
+    def run(self, client, options):
+        for path in options["paths"]:
+            client.get(path)  # warm up caches and connections
+        latencies = []
+        for _ in range(options["requests"]):
+            for path in options["paths"]:
+                started = time.perf_counter()
+                client.get(path)
+                latencies.append(time.perf_counter() - started)
+        return latencies
+
+    def report(self, mode, latencies):
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+        self.stdout.write(
+            f"{mode:>4}: {len(latencies)} requests  mean {statistics.mean(latencies) * 1000:6.3f} ms  "
+            f"p50 {percentile(0.5):6.3f} ms  p99 {percentile(0.99):6.3f} ms"
+        )
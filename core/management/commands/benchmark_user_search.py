@@ -0,0 +1,92 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+
+from core import user_search
+from core.utils import normalize_search_text
+
+
+User = get_user_model()
+
+FIRST_NAMES = [
+    "Ada", "Bola", "Chidi", "Dami", "Emeka", "Funke", "Grace", "Hassan", "Ife", "Jide",
+    "Kemi", "Lola", "Musa", "Ngozi", "Ola", "Peter", "Queen", "Rasheed", "Sade", "Tunde",
+    "Uche", "Victor", "Wale", "Yemi", "Zainab", "José", "Chloé", "Zoë", "Renée", "Søren",
+]
+LAST_NAMES = [
+    "Adebayo", "Balogun", "Chukwu", "Danjuma", "Eze", "Fashola", "Gbadamosi", "Hamza",
+    "Ibrahim", "Johnson", "Kalu", "Lawal", "Mohammed", "Nwosu", "Okafor", "Popoola",
+    "Quadri", "Ransome", "Suleiman", "Taiwo", "Usman", "Vaughan", "Williams", "Yusuf",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Time legacy icontains user search against the normalized/trigram path "
+        "over synthetic users. Data is rolled back unless --keep is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1_000_000)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--keep", action="store_true", help="Commit the synthetic users")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.populate(options["users"], options["batch_size"])
+            self.report(options["repeat"])
+            if not options["keep"]:
+                transaction.set_rollback(True)
+
+    def populate(self, count, batch_size):
+        rng = random.Random(42)
+        started = time.perf_counter()
+        for offset in range(0, count, batch_size):
+            batch = []
+            for i in range(offset, min(offset + batch_size, count)):
+                first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+                username = f"bench-{first.lower()}{i}"
+                batch.append(
+                    User(
+                        email=f"{username}@bench.invalid",
+                        username=username,
+                        first_name=first,
+                        last_name=last,
+                        password="!",
+                        search_name=normalize_search_text(first, last, username),
+                    )
+                )
+            User.objects.bulk_create(batch)
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE core_user")
+        self.stdout.write(f"Created {count} users in {time.perf_counter() - started:.1f}s ({connection.vendor})")
+
+    def time_query(self, build, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            list(build()[:30])
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+    def report(self, repeat):
+        base = User.objects.filter(is_superuser=False)
+        cases = {
+            "icontains (legacy)": lambda q: base.filter(
+                Q(first_name__icontains=q) | Q(last_name__icontains=q) | Q(username__icontains=q)
+            ).order_by("id"),
+            "search_users": lambda q: user_search.search_users(base, q),
+            "autocomplete_users": lambda q: user_search.autocomplete_users(base, q, limit=30),
+        }
+        for term in ("okafor", "renee", "zai", "xyzzy"):
+            for name, build in cases.items():
+                median, p95 = self.time_query(lambda: build(term), repeat)
+                self.stdout.write(f"{term:>8}  {name:<20} median {median:8.2f} ms   p95 {p95:8.2f} ms")
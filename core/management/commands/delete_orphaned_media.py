@@ -0,0 +1,73 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import blobs, media_gc
+
+
+DELETE_BATCH = 1000  # S3 DeleteObjects limit
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete files under the art image, avatar and CKEditor upload "
+        "directories that no row or post refers to any more. Files younger "
+        "than --min-age-hours are kept. --dry-run only reports."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report orphans without deleting them")
+        parser.add_argument("--min-age-hours", type=float, default=24)
+        parser.add_argument("--batch-size", type=int, default=DELETE_BATCH)
+        parser.add_argument(
+            "--run-size",
+            type=int,
+            default=media_gc.RUN_SIZE,
+            help="Referenced names sorted in memory at once; more are spilled to temporary files",
+        )
+
+    def handle(self, *args, **options):
+        if not 0 < options["batch_size"] <= DELETE_BATCH:
+            raise CommandError(f"--batch-size must be between 1 and {DELETE_BATCH}")
+        dry_run = options["dry_run"]
+        storage = media_gc.media_storage()
+        prefixes = media_gc.managed_prefixes()
+        referenced = media_gc.sorted_unique(media_gc.referenced_names(storage), options["run_size"])
+        stored = media_gc.stored_files(storage, prefixes)
+
+        files, sizes, recent = Counter(), Counter(), 0
+        self.deleted = self.failed = 0
+        batch = []
+        for stored_file, is_recent in media_gc.orphans(stored, referenced, timedelta(hours=options["min_age_hours"])):
+            if is_recent:
+                recent += 1
+                continue
+            directory = stored_file.name.split("/", 1)[0]
+            files[directory] += 1
+            sizes[directory] += stored_file.size
+            if options["verbosity"] >= 2:
+                self.stdout.write(f"  {stored_file.name} ({stored_file.size} bytes)")
+            if not dry_run:
+                batch.append(stored_file.name)
+                if len(batch) >= options["batch_size"]:
+                    self.delete(storage, batch)
+                    batch = []
+        if batch:
+            self.delete(storage, batch)
+
+        for directory in sorted(files):
+            self.stdout.write(f"{directory}/: {files[directory]} orphaned file(s), {sizes[directory]} bytes")
+        self.stdout.write(f"{recent} unreferenced file(s) younger than {options['min_age_hours']:g}h kept")
+        if dry_run:
+            self.stdout.write(self.style.WARNING(f"Dry run: {sum(files.values())} file(s) would be deleted"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Deleted {self.deleted} file(s), {self.failed} failed"))
+
+    def delete(self, storage, names):
+        try:
+            # files that became referenced since the scan (e.g. a reused blob) are kept
+            self.deleted += len(blobs.delete_unreferenced(storage, names, fail_silently=False))
+        except Exception as exc:
+            self.failed += len(names)
+            self.stderr.write(f"Deleting {len(names)} file(s) from {names[0]} failed: {exc}")
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from core import images
+from core.models import ArtImage, User
+
+
+class Command(BaseCommand):
+    help = "Generate resized image variants for art images and avatars that lack them"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Regenerate variants for every image")
+
+    def handle(self, *args, **options):
+        targets = [
+            (ArtImage, "image", "variants"),
+            (User, "avatar", "avatar_variants"),
+        ]
+        for model, field, variants_field in targets:
+            queryset = model.objects.exclude(**{field: ""}).exclude(**{f"{field}__isnull": True})
+            if not options["all"]:
+                queryset = queryset.filter(**{variants_field: {}})
+
+            done = failed = 0
+            # rows sharing a file get its rebuilt variants together
+            rebuilt = set()
+            for pk, name in queryset.values_list("pk", field).iterator():
+                if name in rebuilt:
+                    continue
+                try:
+                    # replaces the old variants, deleting their files
+                    images.generate(model, pk, field, variants_field, force=options["all"])
+                    if options["all"]:
+                        rebuilt.add(name)
+                    done += 1
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f"{model.__name__} {pk}: {exc}")
+
+            self.stdout.write(self.style.SUCCESS(f"{model.__name__}: {done} processed, {failed} failed"))
@@ -0,0 +1,115 @@
+import http.client
+import os
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+def process_tree_rss(pid):
+    """Resident memory in bytes of `pid` and all its descendants (Linux /proc)."""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as handle:
+                ppid = int(handle.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    total, pending = 0, [pid]
+    while pending:
+        current = pending.pop()
+        pending.extend(children.get(current, []))
+        try:
+            with open(f"/proc/{current}/status") as handle:
+                for line in handle:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+        except OSError:
+            continue
+    return total
+
+
+class Command(BaseCommand):
+    help = (
+        "Hit a running server with concurrent keep-alive GETs and report "
+        "throughput, latency percentiles and (with --pid) the server's peak RSS. "
+        "Used to compare SERVER_MODE=wsgi and SERVER_MODE=asgi at equal memory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("urls", nargs="+", help="e.g. http://localhost:8000/api/posts/")
+        parser.add_argument("--concurrency", type=int, default=32)
+        parser.add_argument("--duration", type=float, default=20.0, help="Seconds")
+        parser.add_argument("--pid", type=int, help="Server master pid, to sample RSS")
+        parser.add_argument("--header", action="append", default=[], help="'Name: value', repeatable")
+
+    def handle(self, *args, **options):
+        headers = dict(h.split(":", 1) for h in options["header"])
+        headers = {name.strip(): value.strip() for name, value in headers.items()}
+        targets = [urlsplit(url) for url in options["urls"]]
+        if any(t.scheme != "http" for t in targets):
+            raise CommandError("Only http:// URLs are supported")
+
+        deadline = time.monotonic() + options["duration"]
+        latencies, errors, lock = [], [0], threading.Lock()
+
+        def worker(offset):
+            connections = {}
+            mine, failed, i = [], 0, offset
+            while time.monotonic() < deadline:
+                target = targets[i % len(targets)]
+                i += 1
+                conn = connections.get(target.netloc) or http.client.HTTPConnection(target.netloc, timeout=30)
+                connections[target.netloc] = conn
+                path = target.path + (f"?{target.query}" if target.query else "")
+                started = time.perf_counter()
+                try:
+                    conn.request("GET", path, headers=headers)
+                    response = conn.getresponse()
+                    response.read()
+                except (OSError, http.client.HTTPException):
+                    failed += 1
+                    conn.close()
+                    connections.pop(target.netloc, None)
+                    continue
+                if response.status >= 400:
+                    failed += 1
+                    continue
+                mine.append(time.perf_counter() - started)
+            with lock:
+                latencies.extend(mine)
+                errors[0] += failed
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(options["concurrency"])]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+
+        peak_rss = 0
+        while any(thread.is_alive() for thread in threads):
+            if options["pid"]:
+                peak_rss = max(peak_rss, process_tree_rss(options["pid"]))
+            time.sleep(0.5)
+        elapsed = time.monotonic() - started
+
+        if not latencies:
+            raise CommandError("No successful requests")
+        latencies.sort()
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+        self.stdout.write(f"requests:   {len(latencies)} ok, {errors[0]} failed in {elapsed:.1f}s")
+        self.stdout.write(f"throughput: {len(latencies) / elapsed:.1f} req/s")
+        self.stdout.write(
+            f"latency:    p50 {percentile(0.5):.1f} ms, p95 {percentile(0.95):.1f} ms, "
+            f"p99 {percentile(0.99):.1f} ms, mean {statistics.mean(latencies) * 1000:.1f} ms"
+        )
+        if options["pid"]:
+            self.stdout.write(f"server rss: {peak_rss / 1024 / 1024:.1f} MB peak")
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from core import search
+from core.models import BlogPost
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index for all blog posts"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=200)
+
+    def handle(self, *args, **options):
+        backend = search.get_backend()
+        total = 0
+        queryset = BlogPost.objects.order_by("pk").only("pk", "title", "excerpt", "content")
+        for post in queryset.iterator(chunk_size=options["batch_size"]):
+            backend.index(post)
+            total += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} post(s)"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core import categories
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute each category's post count and latest post time from the "
+        "posts, e.g. after bulk updates that bypassed the model signals"
+    )
+
+    def handle(self, *args, **options):
+        total = categories.recount()
+        self.stdout.write(self.style.SUCCESS(f"Recounted {total} categor{'y' if total == 1 else 'ies'}"))
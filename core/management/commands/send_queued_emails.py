@@ -0,0 +1,50 @@
+import logging
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core import emails
+
+
+logger = logging.getLogger(__file__)
+
+
+class Command(BaseCommand):
+    help = "Deliver queued outbound emails (runs until stopped unless --once)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Drain the queue once and exit")
+        parser.add_argument("--batch-size", type=int, default=emails.outbox_setting("BATCH_SIZE", 50))
+        parser.add_argument("--interval", type=float, default=emails.outbox_setting("POLL_INTERVAL", 5))
+
+    def handle(self, *args, **options):
+        self.running = True
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        while self.running:
+            close_old_connections()
+            sent = self.drain(options["batch_size"])
+            if sent:
+                self.stdout.write(f"Sent {sent} email(s)")
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
+
+    def drain(self, batch_size):
+        sent = 0
+        while self.running:
+            batch = emails.claim_batch(batch_size)
+            if not batch:
+                break
+            try:
+                sent += emails.deliver(batch)
+            except Exception:
+                logger.exception("Email batch failed")
+                break
+        return sent
+
+    def stop(self, *args):
+        self.running = False
@@ -0,0 +1,158 @@
+"""
+Finding stored media nothing refers to any more, for
+`manage.py delete_orphaned_media`.
+
+Both sides are streamed in key order and merge-joined, so memory stays flat
+however large the bucket or the tables get:
+
+- `stored_files` pages through the bucket listing, which S3 returns sorted
+  by key (UTF-8 byte order, which is also Python's string order)
+- `referenced_names` yields every name the database refers to: art images,
+  avatars, their variants, shared blobs, and the images embedded in post
+  HTML (with the thumbnails CKEditor made of them). That stream is
+  unordered, so `sorted_unique` sorts it externally: runs of RUN_SIZE names
+  are sorted in memory and spilled to temporary files, then heap-merged.
+- `orphans` walks the two sorted streams side by side
+
+Files newer than the grace period are never reported: uploads in flight,
+direct uploads not yet confirmed and images in posts still being written
+are about to be referenced.
+"""
+import heapq
+import json
+import tempfile
+from collections import namedtuple
+from datetime import timedelta
+from urllib.parse import unquote, urlsplit
+
+from ckeditor_uploader.utils import get_thumb_filename
+from django.conf import settings
+from django.utils import timezone
+
+from . import images
+from .models import ArtImage, BlogPost, MediaBlob, User
+from .utils import image_sources
+
+
+RUN_SIZE = 100_000
+CHUNK_SIZE = 2000
+
+StoredFile = namedtuple("StoredFile", "name size last_modified")
+
+
+def media_storage():
+    return ArtImage._meta.get_field("image").storage
+
+
+def managed_prefixes():
+    """Directories the collector may delete from; anything else in the bucket is left alone."""
+    prefixes = {
+        ArtImage._meta.get_field("image").upload_to,
+        "avatars/",
+        getattr(settings, "CKEDITOR_UPLOAD_PATH", "uploads/"),
+    }
+    prefixes = sorted(prefix.rstrip("/") + "/" for prefix in prefixes if prefix)
+    # a prefix nested in another is listed with it
+    return [p for p in prefixes if not any(p != q and p.startswith(q) for q in prefixes)]
+
+
+def stored_files(storage, prefixes):
+    """Every file under `prefixes`, in key order."""
+    paginator = storage.connection.meta.client.get_paginator("list_objects_v2")
+    location = storage._normalize_name("")
+    for prefix in prefixes:
+        for page in paginator.paginate(Bucket=storage.bucket_name, Prefix=storage._normalize_name(prefix)):
+            for obj in page.get("Contents", []):
+                yield StoredFile(obj["Key"][len(location):], obj["Size"], obj["LastModified"])
+
+
+def url_prefixes(storage):
+    """URL paths the storage's files are served under, e.g. "/bucket/media/"."""
+    paths = {urlsplit(storage.url("x")).path[:-1]}
+    if getattr(settings, "MEDIA_URL", None):
+        paths.add(urlsplit(settings.MEDIA_URL).path)
+    # most specific first: MEDIA_URL may be just "/"
+    return sorted((path for path in paths if path), key=len, reverse=True)
+
+
+def storage_name(url, prefixes):
+    path = unquote(urlsplit(url).path)
+    for prefix in prefixes:
+        if path.startswith(prefix):
+            return path[len(prefix):]
+    return None
+
+
+def referenced_names(storage):
+    """Every stored name the database refers to, unordered, with repeats."""
+    for model, field, variants_field in ((ArtImage, "image", "variants"), (User, "avatar", "avatar_variants")):
+        rows = model._base_manager.values_list(field, variants_field).iterator(chunk_size=CHUNK_SIZE)
+        for name, variants in rows:
+            if name:
+                yield name
+            yield from images.variant_names(variants)
+
+    yield from MediaBlob.objects.filter(refcount__gt=0).values_list("name", flat=True).iterator(chunk_size=CHUNK_SIZE)
+
+    prefixes = url_prefixes(storage)
+    upload_path = getattr(settings, "CKEDITOR_UPLOAD_PATH", "uploads/")
+    for content in BlogPost._base_manager.values_list("content", flat=True).iterator(chunk_size=CHUNK_SIZE // 4):
+        for url in image_sources(content):
+            name = storage_name(url, prefixes)
+            if name:
+                yield name
+                if name.startswith(upload_path):
+                    yield get_thumb_filename(name)
+
+
+def spill(names):
+    run = tempfile.TemporaryFile("w+", encoding="utf-8")
+    for name in sorted(set(names)):
+        # JSON keeps names with newlines on one line
+        run.write(json.dumps(name) + "\n")
+    run.seek(0)
+    return run
+
+
+def read_run(run):
+    for line in run:
+        yield json.loads(line)
+
+
+def sorted_unique(names, run_size=RUN_SIZE):
+    """`names` sorted and deduplicated, holding at most `run_size` of them in memory."""
+    runs, chunk = [], []
+    try:
+        for name in names:
+            chunk.append(name)
+            if len(chunk) >= run_size:
+                runs.append(spill(chunk))
+                chunk = []
+        if runs:
+            runs.append(spill(chunk))
+            merged = heapq.merge(*(read_run(run) for run in runs))
+        else:
+            merged = iter(sorted(chunk))
+        previous = None
+        for name in merged:
+            if name != previous:
+                yield name
+                previous = name
+    finally:
+        for run in runs:
+            run.close()
+
+
+def orphans(stored, referenced, min_age=timedelta(days=1)):
+    """
+    Files from `stored` whose name is not in `referenced`, both sorted by
+    name. Yields (file, recent): recent files are inside the grace period.
+    """
+    cutoff = timezone.now() - min_age
+    referenced = iter(referenced)
+    current = next(referenced, None)
+    for stored_file in stored:
+        while current is not None and current < stored_file.name:
+            current = next(referenced, None)
+        if current != stored_file.name:
+            yield stored_file, stored_file.last_modified > cutoff
@@ -0,0 +1,343 @@
+"""
+Request metrics in the Prometheus text format, served at /metrics.
+
+`MetricsMiddleware` records for every request, labelled by view (e.g.
+"BlogPostViewSet.list", named as in the query budgets):
+
+- http_request_duration_seconds: latency histogram, also by method and status
+- http_response_size_bytes: response body size histogram
+- db_queries_total / db_query_duration_seconds_total: SQL statements and
+  the time spent in them (read off the query budget's counter)
+- serializer_duration_seconds_total: time spent building serializer data
+
+Values are kept in process memory under a lock: recording a request costs a
+few dictionary updates. With METRICS["DIR"] set, every worker also writes
+its totals to its own file there, at most every FLUSH_SECONDS, and /metrics
+adds up all the files, so a scrape covers every gunicorn worker whichever
+one answers it. Files of workers that exited are kept so counters never go
+backwards; the directory is emptied when the server starts
+(entrypoint.prod.sh).
+"""
+import bisect
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+
+
+logger = logging.getLogger(__file__)
+
+DEFAULTS = {
+    "ENABLED": True,
+    "DIR": "",
+    "FLUSH_SECONDS": 5,
+    "TOKEN": "",
+    "LATENCY_BUCKETS": (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    "SIZE_BUCKETS": (256, 1024, 4096, 16384, 65536, 262144, 1048576),
+}
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# anything else is labelled "other", so clients can't add label values
+METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+# name: (type, help, labels, buckets setting or None)
+FAMILIES = {
+    "http_request_duration_seconds": (
+        "histogram", "Time to answer a request.", ("view", "method", "status"), "LATENCY_BUCKETS",
+    ),
+    "http_response_size_bytes": ("histogram", "Size of the response body.", ("view",), "SIZE_BUCKETS"),
+    "db_queries_total": ("counter", "SQL statements run by requests.", ("view",), None),
+    "db_query_duration_seconds_total": ("counter", "Time requests spent in SQL statements.", ("view",), None),
+    "serializer_duration_seconds_total": ("counter", "Time requests spent building serializer data.", ("view",), None),
+}
+
+# the current request's serializer time, see timed_serializer_data()
+_request = ContextVar("metrics_request", default=None)
+
+
+def metrics_setting(name):
+    return getattr(settings, "METRICS", {}).get(name, DEFAULTS[name])
+
+
+class RequestStats:
+    __slots__ = ("serializer_seconds", "serializing")
+
+    def __init__(self):
+        self.serializer_seconds = 0.0
+        self.serializing = False
+
+
+class Registry:
+    """Totals of this process; histograms as per-bucket counts plus sum and count."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flushing = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.path = None
+        self.flushed_at = time.monotonic()
+        self.values = {name: {} for name in FAMILIES}
+
+    def buckets(self, name):
+        setting = FAMILIES[name][3]
+        return metrics_setting(setting) if setting else None
+
+    def record(self, view, method, status, duration, size, queries, query_seconds, serializer_seconds):
+        latency_buckets = self.buckets("http_request_duration_seconds")
+        size_buckets = self.buckets("http_response_size_bytes")
+        with self.lock:
+            if self.pid != os.getpid():
+                # forked after recording: the parent's totals are not ours
+                self.reset()
+            values = self.values
+            self.observe(values["http_request_duration_seconds"], (view, method, status), latency_buckets, duration)
+            if size is not None:
+                self.observe(values["http_response_size_bytes"], (view,), size_buckets, size)
+            for name, amount in (
+                ("db_queries_total", queries),
+                ("db_query_duration_seconds_total", query_seconds),
+                ("serializer_duration_seconds_total", serializer_seconds),
+            ):
+                counters = values[name]
+                counters[(view,)] = counters.get((view,), 0) + amount
+            due = time.monotonic() - self.flushed_at >= metrics_setting("FLUSH_SECONDS")
+        if due and metrics_setting("DIR"):
+            self.flush()
+
+    @staticmethod
+    def observe(histogram, labels, buckets, value):
+        series = histogram.get(labels)
+        if series is None:
+            # a count per bucket and +Inf, then sum and count
+            series = histogram[labels] = [0] * (len(buckets) + 1) + [0.0, 0]
+        series[bisect.bisect_left(buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                name: [[list(labels), list(value) if isinstance(value, list) else value]
+                       for labels, value in series.items()]
+                for name, series in self.values.items()
+            }
+
+    def flush(self):
+        """Write this process's totals to its file in METRICS["DIR"]."""
+        directory = metrics_setting("DIR")
+        if not self.flushing.acquire(blocking=False):
+            # another thread is writing the same file right now
+            return
+        try:
+            with self.lock:
+                self.flushed_at = time.monotonic()
+                if self.path is None:
+                    # pids are reused by later workers, so make the name unique
+                    self.path = os.path.join(directory, f"{os.getpid()}-{uuid.uuid4().hex[:8]}.json")
+            os.makedirs(directory, exist_ok=True)
+            temporary = f"{self.path}.tmp"
+            with open(temporary, "w") as handle:
+                json.dump(self.snapshot(), handle)
+            os.replace(temporary, self.path)
+        except OSError:
+            logger.exception("Writing metrics to %s failed", directory)
+        finally:
+            self.flushing.release()
+
+
+registry = Registry()
+
+
+def merge(snapshots):
+    """Sum snapshots into {name: {labels: value}}."""
+    merged = {name: {} for name in FAMILIES}
+    for snapshot in snapshots:
+        for name, series in snapshot.items():
+            if name not in merged:
+                continue
+            target = merged[name]
+            for labels, value in series:
+                labels = tuple(labels)
+                if isinstance(value, list):
+                    current = target.get(labels)
+                    if current is None:
+                        target[labels] = list(value)
+                    elif len(current) == len(value):
+                        target[labels] = [a + b for a, b in zip(current, value)]
+                    # else bucket settings differ between workers (mid-deploy): skip
+                else:
+                    target[labels] = target.get(labels, 0) + value
+    return merged
+
+
+def collect():
+    """Totals of every worker writing to METRICS["DIR"], or of this process alone."""
+    directory = metrics_setting("DIR")
+    if not directory:
+        return merge([registry.snapshot()])
+    registry.flush()
+    snapshots = []
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        try:
+            with open(path) as handle:
+                snapshots.append(json.load(handle))
+        except (OSError, ValueError):
+            # a worker's file being replaced, or a torn one left by a crash
+            continue
+    return merge(snapshots)
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def label_set(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in pairs) + "}"
+
+
+def format_number(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def render(values):
+    """The Prometheus text exposition of merged values."""
+    lines = []
+    for name, (kind, help_text, label_names, bucket_setting) in FAMILIES.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in sorted(values[name].items()):
+            if kind == "counter":
+                lines.append(f"{name}{label_set(label_names, labels)} {format_number(value)}")
+                continue
+            bounds = [format_number(float(b)) for b in metrics_setting(bucket_setting)] + ["+Inf"]
+            cumulative = 0
+            for bound, count in zip(bounds, value[:-2]):
+                cumulative += count
+                lines.append(f"{name}_bucket{label_set(label_names, labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_sum{label_set(label_names, labels)} {format_number(value[-2])}")
+            lines.append(f"{name}_count{label_set(label_names, labels)} {value[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request):
+    """GET /metrics, for Prometheus; needs `Authorization: Bearer <METRICS["TOKEN"]>` when one is set."""
+    if not metrics_setting("ENABLED"):
+        raise Http404
+    token = metrics_setting("TOKEN")
+    if token and not constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return HttpResponse("Unauthorized\n", status=401, content_type="text/plain")
+    return HttpResponse(render(collect()), content_type=CONTENT_TYPE)
+
+
+def view_label(request):
+    """e.g. "BlogPostViewSet.list" or "admin:index.get"; "unmatched" when no URL matched."""
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched"
+    method = request.method.lower() if request.method in METHODS else "other"
+    view_cls = getattr(match.func, "cls", None)
+    action = (getattr(match.func, "actions", None) or {}).get(method)
+    return f"{getattr(view_cls, '__name__', match.view_name)}.{action or method}"
+
+
+def timed_serializer_data(data):
+    """Wrap a serializer `data` getter to add its time to the current request."""
+
+    def wrapper(serializer):
+        stats = _request.get()
+        if stats is None or stats.serializing:
+            # nested serializers are part of the outer one's time
+            return data(serializer)
+        stats.serializing = True
+        started = time.perf_counter()
+        try:
+            return data(serializer)
+        finally:
+            stats.serializer_seconds += time.perf_counter() - started
+            stats.serializing = False
+
+    wrapper.timed = True
+    wrapper.__wrapped__ = data
+    return wrapper
+
+
+def install():
+    """Time serializer data for MetricsMiddleware; called from CoreConfig.ready()."""
+    from rest_framework.serializers import BaseSerializer
+
+    getter = BaseSerializer.data.fget
+    if metrics_setting("ENABLED") and not getattr(getter, "timed", False):
+        BaseSerializer.data = property(timed_serializer_data(getter))
+
+
+class MetricsMiddleware:
+    """Records every request in `registry`; first in MIDDLEWARE so its time covers the others."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not metrics_setting("ENABLED"):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _request.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request.reset(token)
+        self.record(request, response, time.perf_counter() - started, stats)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _request.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request.reset(token)
+        self.record(request, response, time.perf_counter() - started, stats)
+        return response
+
+    def record(self, request, response, duration, stats):
+        try:
+            view = view_label(request)
+            counter = getattr(request, "query_counter", None)
+            size = None if response.streaming else len(response.content)
+            registry.record(
+                view,
+                request.method if request.method in METHODS else "other",
+                response.status_code,
+                duration,
+                size,
+                len(counter) if counter is not None else 0,
+                counter.duration if counter is not None else 0.0,
+                stats.serializer_seconds,
+            )
+        except Exception:
+            # metrics must never fail a request
+            logger.exception("Recording metrics for %s failed", request.path)
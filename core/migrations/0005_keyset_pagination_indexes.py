@@ -0,0 +1,21 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_blogcategory_profile_fields_post_text_fields'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='artimage',
+            index=models.Index(fields=['-uploaded_at', '-id'], name='artimage_uploaded_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='blogpost',
+            index=models.Index(fields=['-created_at', '-id'], name='blogpost_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:35
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+from core import search
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE INDEX blogpost_search_vector_idx ON core_blogpost USING gin (search_vector)"
+        )
+    elif schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE core_blogpost_fts USING fts5(title, excerpt, body, tokenize = 'porter unicode61')"
+        )
+    else:
+        return
+
+    # index the posts that already exist, like `manage.py rebuild_search_index`
+    BlogPost = apps.get_model("core", "BlogPost")
+    backend = search.get_backend()
+    for post in BlogPost.objects.order_by("pk").only("pk", "title", "excerpt", "content").iterator(chunk_size=200):
+        backend.index(post)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS blogpost_search_vector_idx")
+    elif schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS core_blogpost_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_user_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogpost',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        # GIN on Postgres, FTS5 on SQLite, filled with the existing posts
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
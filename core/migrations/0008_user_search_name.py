@@ -0,0 +1,50 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:36
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+from core.utils import normalize_search_text
+
+
+def backfill_search_name(apps, schema_editor):
+    User = apps.get_model("core", "User")
+    batch = []
+    for user in User.objects.only("pk", "first_name", "last_name", "username").iterator(chunk_size=2000):
+        user.search_name = normalize_search_text(user.first_name, user.last_name, user.username)
+        batch.append(user)
+        if len(batch) >= 2000:
+            User.objects.bulk_update(batch, ["search_name"])
+            batch = []
+    if batch:
+        User.objects.bulk_update(batch, ["search_name"])
+
+
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE INDEX user_search_name_trgm_idx ON core_user USING gin (search_name gin_trgm_ops)"
+        )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS user_search_name_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_blogpost_search_vector'),
+    ]
+
+    operations = [
+        # no-op outside Postgres
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='user',
+            name='search_name',
+            field=models.CharField(blank=True, default='', editable=False, max_length=500),
+        ),
+        migrations.RunPython(backfill_search_name, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
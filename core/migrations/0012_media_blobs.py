@@ -0,0 +1,37 @@
+# Generated by Django 5.2.1 on 2026-10-18 20:28
+
+import core.blobs
+import core.models
+import drf_starter.storage_backends
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_user_token_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(help_text='BLAKE2b-256, hex', max_length=64, unique=True)),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.PositiveBigIntegerField()),
+                ('refcount', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='artimage',
+            name='image',
+            field=core.blobs.BlobImageField(storage=drf_starter.storage_backends.PublicMediaStorage(), upload_to='art_images/'),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='avatar',
+            field=core.blobs.BlobImageField(blank=True, null=True, storage=drf_starter.storage_backends.PublicMediaStorage(), upload_to=core.models.upload_to),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-18 20:49
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_media_blobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostStats',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='core.blogpost')),
+                ('view_count', models.PositiveBigIntegerField(default=0)),
+                ('trend', models.FloatField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-trend', '-post'], name='poststats_trend_idx'), models.Index(fields=['-view_count', '-post'], name='poststats_views_idx')],
+            },
+        ),
+    ]
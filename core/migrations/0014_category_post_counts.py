@@ -0,0 +1,40 @@
+# Generated by Django 5.2.1 on 2026-10-18 20:51
+
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_post_counts(apps, schema_editor):
+    BlogCategory = apps.get_model("core", "BlogCategory")
+    BlogPost = apps.get_model("core", "BlogPost")
+    posts = BlogPost.objects.filter(category=OuterRef("pk")).order_by().values("category")
+    BlogCategory.objects.update(
+        post_count=Coalesce(Subquery(posts.annotate(count=Count("pk")).values("count")), 0),
+        latest_post_at=Subquery(posts.annotate(latest=Max("created_at")).values("latest")),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_post_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogcategory',
+            name='latest_post_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='blogcategory',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='blogpost',
+            index=models.Index(fields=['category', '-created_at', '-id'], name='blogpost_category_created_idx'),
+        ),
+        migrations.RunPython(backfill_post_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 20:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_category_post_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogpost',
+            name='rendered_content',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 20:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_blogpost_rendered_content'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostSlugRedirect',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('old_slug', models.SlugField(unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slug_redirects', to='core.blogpost')),
+            ],
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations
+
+from core import search
+from core.utils import html_to_text, make_excerpt, reading_time
+
+
+def recompute_post_text(apps, schema_editor):
+    """Excerpts, word counts and search text without the contents of <script>, <style> etc."""
+    BlogPost = apps.get_model("core", "BlogPost")
+    backend = search.get_backend()
+    batch = []
+    for post in BlogPost.objects.order_by("pk").only("pk", "title", "content").iterator(chunk_size=500):
+        text = html_to_text(post.content)
+        post.word_count = len(text.split())
+        post.excerpt = make_excerpt(text)
+        post.reading_time = reading_time(post.word_count)
+        backend.index(post)
+        batch.append(post)
+        if len(batch) >= 500:
+            BlogPost.objects.bulk_update(batch, ["excerpt", "word_count", "reading_time"])
+            batch = []
+    BlogPost.objects.bulk_update(batch, ["excerpt", "word_count", "reading_time"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_post_slug_redirects'),
+    ]
+
+    operations = [
+        migrations.RunPython(recompute_post_text, migrations.RunPython.noop),
+    ]
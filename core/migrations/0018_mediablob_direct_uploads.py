@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 21:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_recompute_post_text'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mediablob',
+            name='digest',
+            field=models.CharField(blank=True, help_text='BLAKE2b-256, hex', max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -1,15 +1,62 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.search import SearchVectorField
 from ckeditor_uploader.fields import RichTextUploadingField
 from drf_starter.storage_backends import PublicMediaStorage
 
+from .blobs import BlobImageField
 from .manager import CustomUserManager
+from .utils import html_to_text, make_excerpt, normalize_search_text, reading_time
 
 def upload_to(instance, filename):
     return 'avatars/{filename}'.format(filename=filename)
 
 
-class User(AbstractUser):
+class MediaBlob(models.Model):
+    """One stored upload, shared by every row with the same bytes. See core/blobs.py."""
+
+    # null for direct uploads, whose bytes are never seen by Django
+    digest = models.CharField(max_length=64, unique=True, null=True, blank=True, help_text="BLAKE2b-256, hex")
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField()
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} refs)"
+
+
+class BlobReferences:
+    """
+    Remembers the names a row's BLOB_FIELDS were loaded with, so saving it
+    can tell which blob references changed (see core/signals.py).
+    """
+
+    BLOB_FIELDS = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_blobs(cls.BLOB_FIELDS)
+        return instance
+
+    def remember_blobs(self, fields):
+        loaded = self.__dict__.setdefault("_loaded_blobs", {})
+        deferred = self.get_deferred_fields()
+        for name in fields:
+            if name not in deferred:
+                loaded[name] = getattr(self, name).name or None
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        deferred = self.get_deferred_fields()
+        super().refresh_from_db(using, fields, from_queryset)
+        reloaded = set(fields) if fields is not None else set(self.BLOB_FIELDS) - deferred
+        self.remember_blobs([name for name in self.BLOB_FIELDS if name in reloaded])
+
+
+class User(BlobReferences, AbstractUser):
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["username"]
@@ -17,21 +64,114 @@ class User(AbstractUser):
     objects = CustomUserManager()
     email = models.EmailField(unique=True)
     bio = models.TextField(blank=True, null=True)
-    avatar = models.ImageField(storage=PublicMediaStorage(), upload_to=upload_to, blank=True, null=True)
+    avatar = BlobImageField(storage=PublicMediaStorage(), upload_to=upload_to, blank=True, null=True)
+    # Resized copies, see core/images.py
+    avatar_variants = models.JSONField(default=dict, blank=True, editable=False)
     dob = models.DateField(blank=True, null=True)
     city = models.CharField(max_length=100, blank=True, null=True)
     country = models.CharField(max_length=100, blank=True, null=True)
     school_attended = models.CharField(max_length=255, blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Normalized "first last username" for user search, see core/user_search.py
+    search_name = models.CharField(max_length=500, blank=True, default="", editable=False)
+    # Carried in JWTs; bumping it revokes every token issued before, see core/authentication.py
+    token_version = models.PositiveIntegerField(default=0, editable=False)
+
+    NAME_FIELDS = ("first_name", "last_name", "username")
+    BLOB_FIELDS = ("avatar",)
+    # Copied into tokens, so changing any of them revokes outstanding tokens
+    TOKEN_CLAIM_FIELDS = ("username", "is_staff", "is_superuser", "is_active")
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # token version sync (see core/authentication.py)
+            models.Index(fields=["updated_at"], name="user_updated_at_idx"),
+        ]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_claims = instance.current_claims()
+        return instance
 
-class ArtImage(models.Model):
+    def current_claims(self):
+        deferred = self.get_deferred_fields()
+        return {name: getattr(self, name) for name in self.TOKEN_CLAIM_FIELDS if name not in deferred}
+
+    def update_search_name(self):
+        self.search_name = normalize_search_text(*(getattr(self, f) for f in self.NAME_FIELDS))
+
+    def revoke_tokens(self):
+        """Invalidate every access and refresh token issued to this user so far."""
+        # incremented in the database: the version this instance holds may be stale
+        self.token_version = F("token_version") + 1
+        self.save(update_fields=["token_version"])
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        # A user built from token claims has every other field deferred: load
+        # them all on first access instead of one query per field.
+        if fields is not None and getattr(self, "from_token", False):
+            fields = set(fields) | self.get_deferred_fields()
+        super().refresh_from_db(using, fields, from_queryset)
+        if hasattr(self, "_loaded_claims"):
+            # claims loaded just now count as unchanged from here on
+            self._loaded_claims = {**self.current_claims(), **self._loaded_claims}
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if getattr(self, "from_token", False) and update_fields is None:
+            # Claims can lag behind the row: only write what this request loaded
+            # or changed. The token version is never written back, it only
+            # changes by incrementing the row's (see revoke_tokens()).
+            loaded = {f.attname for f in self._meta.concrete_fields if not f.primary_key}
+            loaded -= self.get_deferred_fields() | {"token_version"}
+            unchanged = {name for name, value in self._loaded_claims.items() if getattr(self, name) == value}
+            update_fields = kwargs["update_fields"] = (loaded - unchanged) | {"updated_at"}
+
+        loaded_claims = getattr(self, "_loaded_claims", None)
+        if loaded_claims is not None and "token_version" not in (update_fields or ()):
+            changed = {name for name, value in loaded_claims.items() if getattr(self, name) != value}
+            if changed and (update_fields is None or changed & set(update_fields)):
+                self.token_version = F("token_version") + 1
+                if update_fields is not None:
+                    update_fields = kwargs["update_fields"] = set(update_fields) | {"token_version"}
+
+        if update_fields is None or set(self.NAME_FIELDS) & set(update_fields):
+            self.update_search_name()
+            if update_fields is not None:
+                kwargs["update_fields"] = set(update_fields) | {"search_name"}
+        if update_fields is not None and "token_version" in kwargs["update_fields"]:
+            # keeps the row visible to the token version sync
+            kwargs["update_fields"] = set(kwargs["update_fields"]) | {"updated_at"}
+        if hasattr(self.token_version, "resolve_expression"):
+            # read the new version back before on_commit hooks see it (see
+            # core/signals.py), so tokens minted from this instance carry it
+            with transaction.atomic(savepoint=False):
+                super().save(*args, **kwargs)
+                self.refresh_from_db(fields=["token_version"])
+        else:
+            super().save(*args, **kwargs)
+        self._loaded_claims = self.current_claims()
+
+
+class ArtImage(BlobReferences, models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="art_images")
-    image = models.ImageField(storage=PublicMediaStorage(), upload_to="art_images/")
+    image = BlobImageField(storage=PublicMediaStorage(), upload_to="art_images/")
+    # Resized copies, see core/images.py
+    variants = models.JSONField(default=dict, blank=True, editable=False)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     caption = models.CharField(max_length=255, blank=True)
     title = models.CharField(max_length=255, blank=True, null=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    BLOB_FIELDS = ("image",)
+
+    class Meta:
+        indexes = [
+            # keyset pagination (see core/pagination.py)
+            models.Index(fields=["-uploaded_at", "-id"], name="artimage_uploaded_id_idx"),
+        ]
+
     def __str__(self):
         return f"Image {self.id} by {self.user.username}"
     
@@ -39,6 +179,9 @@ class ArtImage(models.Model):
 class BlogCategory(models.Model):
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True, null=True)
+    # Maintained from the posts by core/categories.py
+    post_count = models.PositiveIntegerField(default=0, editable=False)
+    latest_post_at = models.DateTimeField(blank=True, null=True, editable=False)
 
     def __str__(self):
         return self.name
@@ -53,10 +196,172 @@ class BlogPost(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     category = models.ForeignKey(BlogCategory, on_delete=models.SET_NULL, null=True, related_name="blog_posts")
 
-    def save(self, *args, **kwargs):
+    # Derived from `content` on save so list views never need to load it
+    excerpt = models.TextField(blank=True, default="", editable=False)
+    word_count = models.PositiveIntegerField(default=0, editable=False)
+    reading_time = models.PositiveIntegerField(default=0, editable=False, help_text="Minutes")
+    # Sanitized HTML served to readers, see core/rendering.py
+    rendered_content = models.TextField(blank=True, default="", editable=False)
+    # Postgres only, maintained by core/search.py
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    TEXT_FIELDS = ("excerpt", "word_count", "reading_time", "rendered_content")
+    # compared with their saved values to follow renames and category moves
+    TRACKED_FIELDS = ("title", "slug", "category_id")
+
+    class Meta:
+        indexes = [
+            # keyset pagination (see core/pagination.py)
+            models.Index(fields=["-created_at", "-id"], name="blogpost_created_id_idx"),
+            # ?category= lists, and the newest post per category
+            models.Index(fields=["category", "-created_at", "-id"], name="blogpost_category_created_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_loaded(cls.TRACKED_FIELDS)
+        return instance
+
+    def remember_loaded(self, fields):
+        """Note the values the row has in the database, see core/signals.py."""
+        loaded = self.__dict__.setdefault("_loaded", {})
+        deferred = self.get_deferred_fields()
+        for name in fields:
+            if name not in deferred:
+                loaded[name] = getattr(self, name)
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        deferred = self.get_deferred_fields()
+        super().refresh_from_db(using, fields, from_queryset)
+        if fields is None:
+            reloaded = set(self.TRACKED_FIELDS) - deferred
+        else:
+            reloaded = {self._meta.get_field(name).attname for name in fields}
+        self.remember_loaded([name for name in self.TRACKED_FIELDS if name in reloaded])
+
+    def update_text_fields(self):
+        """Recompute excerpt, word count, reading time and rendered HTML from `content`."""
+        from .rendering import render_html
+
+        text = html_to_text(self.content)
+        self.word_count = len(text.split())
+        self.excerpt = make_excerpt(text)
+        self.reading_time = reading_time(self.word_count)
+        self.rendered_content = render_html(self.content)
+
+    def needs_slug(self, update_fields=None):
+        """No slug yet, or the title changed and the slug still follows the old one."""
         if not self.slug:
-            self.slug = self.title.lower().replace(" ", "-")
-        super().save(*args, **kwargs)
+            return True
+        if update_fields is not None and "title" not in update_fields:
+            return False
+        loaded = getattr(self, "_loaded", {})
+        return "title" in loaded and self.title != loaded["title"] and self.slug == loaded.get("slug")
+
+    def save(self, *args, **kwargs):
+        from . import slugs
+
+        update_fields = kwargs.get("update_fields")
+        allocate = self.needs_slug(update_fields)
+        if allocate:
+            self.slug = slugs.allocate(self.title, self.pk)
+            if update_fields is not None:
+                update_fields = kwargs["update_fields"] = set(update_fields) | {"slug"}
+
+        if update_fields is None or "content" in update_fields:
+            self.update_text_fields()
+            if update_fields is not None:
+                kwargs["update_fields"] = set(update_fields) | set(self.TEXT_FIELDS)
+
+        if not allocate:
+            super().save(*args, **kwargs)
+            return
+        try:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+        except IntegrityError:
+            if not slugs.is_taken(self.slug, self.pk):
+                raise
+            # another post took the same slug since it was allocated
+            self.slug = slugs.allocate(self.title, self.pk)
+            super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.title
+
+
+class PostSlugRedirect(models.Model):
+    """A slug a post had before, answered with a redirect to its current one. See core/slugs.py."""
+
+    old_slug = models.SlugField(unique=True)
+    post = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name="slug_redirects")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.old_slug} -> post {self.post_id}"
+
+
+class PostStats(models.Model):
+    """View counters for a post, written in batches by core/trending.py."""
+
+    post = models.OneToOneField(BlogPost, on_delete=models.CASCADE, primary_key=True, related_name="stats")
+    view_count = models.PositiveBigIntegerField(default=0)
+    # log2 of the time-decayed view count, see core/trending.py
+    trend = models.FloatField(blank=True, null=True)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-trend", "-post"], name="poststats_trend_idx"),
+            models.Index(fields=["-view_count", "-post"], name="poststats_views_idx"),
+        ]
+
+    def __str__(self):
+        return f"Stats for post {self.post_id}"
+
+
+class OutboundEmail(models.Model):
+    """
+    Outbox row for an email that is delivered by `manage.py send_queued_emails`.
+    See core/emails.py.
+    """
+
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+    SKIPPED = "skipped"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (SENT, "Sent"),
+        (FAILED, "Failed"),
+        (SKIPPED, "Skipped"),
+    ]
+
+    kind = models.CharField(max_length=50)
+    to = models.EmailField()
+    subject = models.CharField(max_length=255, blank=True)
+    body = models.TextField(blank=True)
+    dedupe_key = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="outbox_due_idx"),
+        ]
+        constraints = [
+            # at most one queued message per dedupe key
+            models.UniqueConstraint(
+                fields=["dedupe_key"],
+                condition=models.Q(status="pending") & ~models.Q(dedupe_key=""),
+                name="outbox_pending_dedupe_key_uniq",
+            ),
+        ]
 
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return f"{self.kind} to {self.to} ({self.status})"
@@ -0,0 +1,97 @@
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import (
+    CursorPagination,
+    LimitOffsetPagination,
+    PageNumberPagination,
+)
+
+
+class OptInCursorMixin:
+    """
+    Lets a paginator switch to keyset (cursor) pagination per request.
+
+    Clients opt in with `?pagination=cursor`; the `next`/`previous` links
+    carry a `cursor` param from then on. Without either param the base
+    paginator runs unchanged, so existing clients keep working.
+
+    Cursor pages never run COUNT(*) and their cost does not grow with depth.
+    The ordering should be backed by a matching composite index. A queryset
+    ordered some other way, e.g. by search rank, can't be paged by cursor and
+    is answered with a 400 rather than silently reordered.
+    """
+
+    cursor_pagination_class = None
+    cursor_query_param = "cursor"
+    mode_query_param = "pagination"
+
+    _cursor_paginator = None
+
+    def use_cursor(self, request):
+        params = request.query_params
+        return params.get(self.mode_query_param) == "cursor" or self.cursor_query_param in params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request):
+            self._cursor_paginator = self.cursor_pagination_class()
+            ordering = self._cursor_paginator.ordering
+            ordering = (ordering,) if isinstance(ordering, str) else tuple(ordering)
+            if queryset.query.order_by and tuple(queryset.query.order_by) != ordering:
+                raise ValidationError(
+                    {self.mode_query_param: ["Cursor pagination can't be combined with ?search=, use page numbers."]}
+                )
+            return self._cursor_paginator.paginate_queryset(queryset, request, view)
+        self._cursor_paginator = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self._cursor_paginator is not None:
+            return self._cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def to_html(self):
+        if self._cursor_paginator is not None:
+            return self._cursor_paginator.to_html()
+        return super().to_html()
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        return parameters + [
+            {
+                "name": self.mode_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Set to `cursor` to use keyset pagination.",
+                "schema": {"type": "string", "enum": ["cursor"]},
+            },
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value.",
+                "schema": {"type": "string"},
+            },
+        ]
+
+
+class BlogPostCursorPagination(CursorPagination):
+    page_size = 10
+    page_size_query_param = "page_size"
+    max_page_size = 50
+    ordering = ("-created_at", "-id")
+
+
+class BlogPostPagination(OptInCursorMixin, PageNumberPagination):
+    page_size = 10
+    page_size_query_param = "page_size"
+    max_page_size = 50
+    cursor_pagination_class = BlogPostCursorPagination
+
+
+class ArtImageCursorPagination(CursorPagination):
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering = ("-uploaded_at", "-id")
+
+
+class ArtImagePagination(OptInCursorMixin, LimitOffsetPagination):
+    cursor_pagination_class = ArtImageCursorPagination
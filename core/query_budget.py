@@ -0,0 +1,161 @@
+import logging
+import time
+from contextlib import contextmanager, ExitStack
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger(__file__)
+
+# set while running per-process housekeeping queries that a request only
+# happens to trigger (see uncounted())
+_uncounted = ContextVar("query_budget_uncounted", default=False)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryCounter:
+    """
+    Counts the SQL statements executed on every configured database
+    while active. Works with DEBUG=False since it relies on execute wrappers
+    rather than `connection.queries`.
+    """
+
+    def __init__(self):
+        self.queries = []
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        if _uncounted.get():
+            return execute(sql, params, many, context)
+        self.queries.append(sql)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+
+    def __len__(self):
+        return len(self.queries)
+
+    @contextmanager
+    def capture(self):
+        with ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(self))
+            yield self
+
+
+@contextmanager
+def uncounted():
+    """
+    Leave the queries run inside the block out of the request's count, for
+    periodic work such as refreshing an in-process cache.
+    """
+    token = _uncounted.set(True)
+    try:
+        yield
+    finally:
+        _uncounted.reset(token)
+
+
+def get_view_budget(request):
+    """
+    Resolve the query budget declared for the view that handled `request`.
+
+    ViewSets declare budgets per action:
+
+        query_budget = {"list": 3, "retrieve": 2}
+
+    Falls back to settings.QUERY_BUDGET_DEFAULT (None disables the check).
+    """
+    default = getattr(settings, "QUERY_BUDGET_DEFAULT", None)
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return None, default
+
+    view_cls = getattr(match.func, "cls", None)
+    actions = getattr(match.func, "actions", None) or {}
+    action = actions.get(request.method.lower())
+    budgets = getattr(view_cls, "query_budget", None) or {}
+    name = f"{getattr(view_cls, '__name__', match.view_name)}.{action or request.method.lower()}"
+    return name, budgets.get(action, default)
+
+
+class QueryBudgetMiddleware:
+    """
+    Counts queries per request and reports endpoints that go over the budget
+    they declare. Logs a warning by default; set QUERY_BUDGET_RAISE=True
+    (e.g. in test settings) to turn overruns into errors.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        counter = QueryCounter()
+        with counter.capture():
+            response = self.get_response(request)
+        return self.check(request, response, counter)
+
+    async def __acall__(self, request):
+        counter = QueryCounter()
+        capture = counter.capture()
+        # connections are per thread, and async ORM calls run on the request's
+        # thread-sensitive executor, so the wrappers are installed there
+        await sync_to_async(capture.__enter__)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(capture.__exit__)(None, None, None)
+        return self.check(request, response, counter)
+
+    def check(self, request, response, counter):
+        # read by core/metrics.py
+        request.query_counter = counter
+        name, budget = get_view_budget(request)
+        if settings.DEBUG:
+            response["X-Query-Count"] = str(len(counter))
+
+        if budget is not None and len(counter) > budget:
+            message = (
+                f"{name} ran {len(counter)} queries, budget is {budget} "
+                f"({request.method} {request.path})"
+            )
+            if getattr(settings, "QUERY_BUDGET_RAISE", False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+        return response
+
+
+@contextmanager
+def assert_max_queries(limit):
+    """
+    Test helper: fail if the block runs more than `limit` queries.
+
+        with assert_max_queries(3):
+            client.get("/api/posts/?page_size=50")
+    """
+    counter = QueryCounter()
+    with counter.capture():
+        yield counter
+
+    if len(counter) > limit:
+        executed = "\n".join(f"{i}. {sql}" for i, sql in enumerate(counter.queries, start=1))
+        raise AssertionError(
+            f"{len(counter)} queries executed, budget is {limit}:\n{executed}"
+        )
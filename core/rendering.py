@@ -0,0 +1,231 @@
+"""
+Rendering post HTML for readers, once when the post is saved.
+
+`render_html` turns CKEditor's `BlogPost.content` into what the detail
+endpoints serve as `content_html` (stored in `BlogPost.rendered_content`):
+
+- sanitized against an allowlist: unknown tags are unwrapped, scripts,
+  styles and embeds dropped with their contents, attributes filtered per
+  tag, URLs limited to http(s), mailto, tel and relative ones, inline
+  styles limited to layout and text properties, and the markup re-balanced
+- every <img> gets loading="lazy" and decoding="async"
+- images with variants (art images, see core/images.py) become a <picture>
+  with an AVIF/WebP <source> and a JPEG srcset, plus width/height so the
+  layout doesn't shift while they load
+
+Run `manage.py backfill_post_excerpts` after changing the rules here, or to
+pick up variants generated after a post was saved.
+"""
+import re
+from html import escape
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+from django.apps import apps
+
+from . import media_gc
+from .images import variant_names
+from .utils import DROPPED_TAGS, image_sources
+
+
+ALLOWED_TAGS = {
+    "a", "abbr", "b", "blockquote", "br", "caption", "cite", "code", "col", "colgroup", "dd", "del",
+    "div", "dl", "dt", "em", "figcaption", "figure", "h1", "h2", "h3", "h4", "h5", "h6", "hr", "i",
+    "img", "ins", "kbd", "li", "mark", "ol", "p", "pre", "q", "s", "small", "span", "strike",
+    "strong", "sub", "sup", "table", "tbody", "td", "tfoot", "th", "thead", "tr", "u", "ul",
+}
+VOID_TAGS = {"br", "col", "hr", "img", "source"}
+
+GLOBAL_ATTRIBUTES = {"title", "lang", "dir", "style"}
+ALLOWED_ATTRIBUTES = {
+    "a": {"href", "name", "target", "rel"},
+    "img": {"src", "alt", "width", "height"},
+    "td": {"colspan", "rowspan"},
+    "th": {"colspan", "rowspan", "scope"},
+    "ol": {"start", "type"},
+    "col": {"span"},
+    "colgroup": {"span"},
+    "table": {"border", "cellpadding", "cellspacing", "summary"},
+    "blockquote": {"cite"},
+    "q": {"cite"},
+}
+URL_ATTRIBUTES = {"href", "src", "cite"}
+URL_SCHEMES = {"", "http", "https", "mailto", "tel"}
+
+STYLE_PROPERTIES = {
+    "text-align", "float", "width", "height", "max-width", "margin", "margin-left", "margin-right",
+    "margin-top", "margin-bottom", "padding", "color", "background-color", "font-weight",
+    "font-style", "text-decoration", "vertical-align", "border", "border-width", "border-style",
+    "border-color", "list-style-type",
+}
+_unsafe_style_re = re.compile(r"url\s*\(|expression|javascript:|[\\<>]|/\*", re.IGNORECASE)
+_control_re = re.compile(r"[\x00-\x20\x7f]+")
+
+# block elements a browser closes an open <p> at
+CLOSES_P = {
+    "blockquote", "div", "dl", "figure", "h1", "h2", "h3", "h4", "h5", "h6", "hr", "ol", "p", "pre",
+    "table", "ul",
+}
+
+SOURCE_TYPES = (("avif", "image/avif"), ("webp", "image/webp"))
+
+
+def safe_url(value):
+    url = _control_re.sub("", value or "")
+    try:
+        scheme = urlsplit(url).scheme.lower()
+    except ValueError:
+        return None
+    return url if scheme in URL_SCHEMES else None
+
+
+def safe_style(value):
+    declarations = []
+    for declaration in (value or "").split(";"):
+        prop, _, val = declaration.partition(":")
+        prop, val = prop.strip().lower(), val.strip()
+        if prop in STYLE_PROPERTIES and val and not _unsafe_style_re.search(val):
+            declarations.append(f"{prop}: {val}")
+    return "; ".join(declarations)
+
+
+def clean_attributes(tag, attrs):
+    allowed = GLOBAL_ATTRIBUTES | ALLOWED_ATTRIBUTES.get(tag, set())
+    cleaned = {}
+    for name, value in attrs:
+        name = name.lower()
+        if name not in allowed or name in cleaned or value is None:
+            continue
+        if name in URL_ATTRIBUTES:
+            value = safe_url(value)
+        elif name == "style":
+            value = safe_style(value)
+        if value:
+            cleaned[name] = value
+    if tag == "a" and cleaned.get("target") == "_blank":
+        cleaned["rel"] = "noopener noreferrer"
+    return cleaned
+
+
+def start_tag(tag, attrs):
+    rendered = "".join(f' {name}="{escape(str(value))}"' for name, value in attrs.items())
+    return f"<{tag}{rendered}>"
+
+
+def srcset(url, names):
+    return ", ".join(f"{url(name)} {size}" for size, name in names.items())
+
+
+def picture(attrs, variants, url):
+    """An <img> with variants as a <picture>, JPEG srcset and AVIF/WebP sources."""
+    files = variants.get("files", {})
+    attrs.setdefault("width", variants.get("width"))
+    attrs.setdefault("height", variants.get("height"))
+    width = str(attrs.get("width") or "")
+    sizes = f"(max-width: {width}px) 100vw, {width}px" if width.isdigit() else "100vw"
+    if "jpeg" in files:
+        jpeg = dict(files["jpeg"])
+        # wider screens still get the original rather than an upscaled variant
+        original = f"{variants.get('width')}w"
+        jpeg.setdefault(original, variants["source"])
+        attrs["srcset"] = srcset(url, jpeg)
+        attrs["sizes"] = sizes
+    sources = "".join(
+        start_tag("source", {"type": mime, "srcset": srcset(url, files[fmt]), "sizes": sizes})
+        for fmt, mime in SOURCE_TYPES
+        if fmt in files
+    )
+    return f"<picture>{sources}{start_tag('img', attrs)}</picture>"
+
+
+class _Renderer(HTMLParser):
+    def __init__(self, image_variants, storage):
+        super().__init__(convert_charrefs=True)
+        self.image_variants = image_variants
+        self.storage = storage
+        self.prefixes = media_gc.url_prefixes(storage) if image_variants else []
+        self.urls = {}
+        self.out = []
+        self.open = []
+        self.dropping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROPPED_TAGS:
+            self.dropping += 1
+            return
+        if self.dropping or tag not in ALLOWED_TAGS:
+            return
+        if tag in CLOSES_P and "p" in self.open:
+            self.handle_endtag("p")
+        attrs = clean_attributes(tag, attrs)
+        if tag == "img":
+            self.out.append(self.image(attrs))
+            return
+        self.out.append(start_tag(tag, attrs))
+        if tag not in VOID_TAGS:
+            self.open.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROPPED_TAGS:
+            self.dropping = max(self.dropping - 1, 0)
+            return
+        if self.dropping or tag not in self.open:
+            return
+        # close anything left open inside it
+        while self.open:
+            current = self.open.pop()
+            self.out.append(f"</{current}>")
+            if current == tag:
+                break
+
+    def handle_data(self, data):
+        if not self.dropping:
+            self.out.append(escape(data, quote=False))
+
+    def image(self, attrs):
+        if "src" not in attrs:
+            return ""
+        attrs["loading"] = "lazy"
+        attrs["decoding"] = "async"
+        variants = self.image_variants.get(media_gc.storage_name(attrs["src"], self.prefixes))
+        if variants:
+            return picture(attrs, variants, self.url)
+        return start_tag("img", attrs)
+
+    def url(self, name):
+        # building an S3 URL costs about a millisecond
+        if name not in self.urls:
+            self.urls[name] = self.storage.url(name)
+        return self.urls[name]
+
+    def render(self, value):
+        self.feed(value)
+        self.close()
+        self.out.extend(f"</{tag}>" for tag in reversed(self.open))
+        return "".join(self.out)
+
+
+def image_variants(value, art_image_model=None):
+    """({storage name: variants map}, storage) for the art images `value` shows."""
+    ArtImage = art_image_model or apps.get_model("core", "ArtImage")
+    storage = ArtImage._meta.get_field("image").storage
+    prefixes = media_gc.url_prefixes(storage)
+    names = {media_gc.storage_name(url, prefixes) for url in image_sources(value)} - {None, ""}
+    if not names:
+        return {}, storage
+    rows = ArtImage._default_manager.filter(image__in=names).exclude(variants={}).values_list("image", "variants")
+    found = {name: variants for name, variants in rows if variants.get("source") == name and variant_names(variants)}
+    return found, storage
+
+
+def render_html(value, art_image_model=None):
+    """Sanitized, lazy-loading HTML for the post body `value`."""
+    if not value:
+        return ""
+    variants, storage = image_variants(value, art_image_model)
+    return _Renderer(variants, storage).render(value)
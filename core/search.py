@@ -0,0 +1,119 @@
+"""
+Full-text search over blog posts.
+
+Postgres keeps a weighted `tsvector` in BlogPost.search_vector (GIN indexed)
+and ranks with ts_rank. SQLite, used for local development, mirrors the same
+text into an FTS5 table and ranks with bm25. Both backends expose the same
+API: `search_posts(queryset, query)` returns the matching posts annotated
+with `rank` (higher is better), best match first.
+
+The index is refreshed per post from core/signals.py; run
+`manage.py rebuild_search_index` after bulk imports.
+"""
+from django.db import connection
+from django.db.models import F, FloatField, Value
+from django.db.models.expressions import RawSQL
+
+from .utils import html_to_text
+
+
+FTS_TABLE = "core_blogpost_fts"
+
+# title, excerpt, body
+WEIGHTS = ("A", "B", "C")
+BM25_WEIGHTS = (10.0, 4.0, 1.0)
+
+
+def document(post):
+    return post.title, post.excerpt, html_to_text(post.content)
+
+
+class PostgresSearchBackend:
+    config = "english"
+
+    def index(self, post):
+        from django.contrib.postgres.search import SearchVector
+
+        from .models import BlogPost
+
+        title, excerpt, body = document(post)
+        vector = None
+        for text, weight in zip((title, excerpt, body), WEIGHTS):
+            part = SearchVector(Value(text), weight=weight, config=self.config)
+            vector = part if vector is None else vector + part
+        BlogPost.objects.filter(pk=post.pk).update(search_vector=vector)
+
+    def remove(self, pk):
+        # the vector lives on the row itself
+        pass
+
+    def search(self, queryset, query):
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        search_query = SearchQuery(query, search_type="websearch", config=self.config)
+        return (
+            queryset.filter(search_vector=search_query)
+            .annotate(rank=SearchRank(F("search_vector"), search_query))
+            .order_by("-rank", "-created_at", "-id")
+        )
+
+
+class SQLiteSearchBackend:
+
+    def index(self, post):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [post.pk])
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, excerpt, body) VALUES (%s, %s, %s, %s)",
+                [post.pk, *document(post)],
+            )
+
+    def remove(self, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [pk])
+
+    @staticmethod
+    def to_match_expression(query):
+        # quote every term so user input can't inject FTS5 query syntax
+        terms = ['"{}"'.format(term.replace('"', '""')) for term in query.split()]
+        return " ".join(terms)
+
+    def search(self, queryset, query):
+        match = self.to_match_expression(query)
+        if not match:
+            return queryset.none()
+        weights = ", ".join(str(w) for w in BM25_WEIGHTS)
+        table = queryset.model._meta.db_table
+        rank = RawSQL(
+            f"SELECT -bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid = {table}.id",
+            [match],
+            output_field=FloatField(),
+        )
+        matching_ids = RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+        return (
+            queryset.filter(id__in=matching_ids)
+            .annotate(rank=rank)
+            .order_by("-rank", "-created_at", "-id")
+        )
+
+
+def get_backend():
+    if connection.vendor == "postgresql":
+        return PostgresSearchBackend()
+    return SQLiteSearchBackend()
+
+
+def index_post(post):
+    get_backend().index(post)
+
+
+def remove_post(pk):
+    get_backend().remove(pk)
+
+
+def search_posts(queryset, query):
+    query = (query or "").strip()
+    if not query:
+        return queryset
+    return get_backend().search(queryset, query)
@@ -2,8 +2,11 @@ import logging
 from typing import Dict, Any
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.db import models
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer as SimpleJWTTokenObtainPairSerializer
-from .models import BlogPost, ArtImage
+from . import images, uploads
+from .upload_handlers import StreamedImageField
+from .models import BlogPost, BlogCategory, ArtImage
 
 
 User = get_user_model()
@@ -78,9 +81,16 @@ class TokenObtainSerializer(SimpleJWTTokenObtainPairSerializer):
          return data
 
 
+class BlogCategorySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BlogCategory
+        fields = ["id", "name", "description", "post_count", "latest_post_at"]
+        read_only_fields = ["id", "post_count", "latest_post_at"]
+
+
 class BlogPostListSerializer(serializers.ModelSerializer):
     author_name = serializers.CharField(source="author.username", read_only=True)
-    excerpt = serializers.SerializerMethodField()
+
     class Meta:
         model = BlogPost
         fields = [
@@ -88,17 +98,19 @@ class BlogPostListSerializer(serializers.ModelSerializer):
             "title",
             "slug",
             "author_name",
+            "category",
             "excerpt",
+            "word_count",
+            "reading_time",
             "created_at",
         ]
 
-    def get_excerpt(self, obj):
-        # Take first 200 characters of content as preview
-        return obj.content[:200] + ("..." if len(obj.content) > 200 else "")
-
 
 class BlogPostDetailSerializer(serializers.ModelSerializer):
     author_name = serializers.CharField(source="author.username", read_only=True)
+    # sanitized and pre-rendered on save (core/rendering.py) and served as the
+    # body; `content` is the editor source, accepted on writes but never returned
+    content_html = serializers.CharField(source="rendered_content", read_only=True)
 
     class Meta:
         model = BlogPost
@@ -107,25 +119,49 @@ class BlogPostDetailSerializer(serializers.ModelSerializer):
             "title",
             "slug",
             "content",
+            "content_html",
             "author",
             "author_name",
             "category",
+            "word_count",
+            "reading_time",
             "created_at",
             "updated_at",
         ]
-        read_only_fields = ["id", "slug", "author_name", "created_at", "updated_at"]
+        read_only_fields = [
+            "id", "slug", "author_name", "content_html", "word_count", "reading_time", "created_at", "updated_at",
+        ]
+        extra_kwargs = {"content": {"write_only": True}}
 
 
 class UserSerializer(serializers.ModelSerializer):
+    serializer_field_mapping = {
+        **serializers.ModelSerializer.serializer_field_mapping,
+        models.ImageField: StreamedImageField,
+    }
+    avatar_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = User
-        fields = ["id", "username", "email", "bio", "avatar", "dob", "city", "country", "school_attended"]
+        fields = ["id", "username", "email", "bio", "avatar", "avatar_variants", "dob", "city", "country", "school_attended"]
         read_only_fields = ["id", "email", "username"]  # email & username fixed after registration
 
+    def get_avatar_variants(self, obj):
+        # {"webp": {"300w": url, ...}, ...}, empty until generated
+        return images.variant_urls(obj.avatar, obj.avatar_variants)
+
+
+class UserSuggestionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ["id", "username", "first_name", "last_name", "avatar"]
+
 
 class ArtImageSerializer(serializers.ModelSerializer):
+    serializer_field_mapping = UserSerializer.serializer_field_mapping
     username = serializers.CharField(source="user.username", read_only=True)
     bio = serializers.CharField(source="user.bio", read_only=True)
+    variants = serializers.SerializerMethodField()
 
     class Meta:
         model = ArtImage
@@ -136,12 +172,70 @@ class ArtImageSerializer(serializers.ModelSerializer):
             "bio",
             "title",
             "image",
+            "variants",
             "caption",
             "uploaded_at",
             "updated_at",
         ]
         read_only_fields = ["id", "user", "uploaded_at", "updated_at"]
 
+    def get_variants(self, obj):
+        # {"webp": {"300w": url, ...}, ...}, empty until generated
+        return images.variant_urls(obj.image, obj.variants)
+
     def create(self, validated_data):
         validated_data["user"] = self.context["request"].user
         return super().create(validated_data)
+
+
+class ArtImageBulkSerializer:
+    class ItemSerializer(serializers.Serializer):
+        title = serializers.CharField(max_length=255, required=False, allow_blank=True, allow_null=True)
+        caption = serializers.CharField(max_length=255, required=False, allow_blank=True)
+
+    class CreateSerializer(serializers.Serializer):
+        # the files themselves arrive as repeated `image` parts, see ArtImageViewSet.bulk
+        items = serializers.JSONField(
+            binary=True, required=False, help_text="JSON list of {title, caption}, in the order of the files"
+        )
+
+        def validate_items(self, value):
+            if not isinstance(value, list):
+                raise serializers.ValidationError("Expected a list.")
+            items = ArtImageBulkSerializer.ItemSerializer(data=value, many=True)
+            items.is_valid(raise_exception=True)
+            return items.validated_data
+
+    class EditSerializer(ItemSerializer):
+        id = serializers.IntegerField()
+
+    class DeleteSerializer(serializers.Serializer):
+        ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+
+        def validate_ids(self, value):
+            limit = uploads.upload_setting("BULK_MAX_FILES")
+            if len(value) > limit:
+                raise serializers.ValidationError(f"At most {limit} ids per request.")
+            return value
+
+
+class ArtImageUploadSerializer:
+    class PresignSerializer(serializers.Serializer):
+        filename = serializers.CharField(max_length=255)
+        content_type = serializers.CharField()
+        size = serializers.IntegerField(min_value=1)
+
+        def validate_content_type(self, value):
+            if value not in uploads.allowed_content_types():
+                raise serializers.ValidationError("Unsupported content type.")
+            return value
+
+        def validate_size(self, value):
+            if value > uploads.upload_setting("MAX_BYTES"):
+                raise serializers.ValidationError("File too large.")
+            return value
+
+    class ConfirmSerializer(serializers.Serializer):
+        upload_token = serializers.CharField()
+        title = serializers.CharField(max_length=255, required=False, allow_blank=True, allow_null=True)
+        caption = serializers.CharField(max_length=255, required=False, allow_blank=True)
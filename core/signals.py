@@ -0,0 +1,173 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from . import blobs, categories, images, search, slugs
+from .authentication import revocations
+from .cache import bump_version_on_commit
+from .models import ArtImage, BlogPost, BlogCategory, User
+
+
+# Cached post responses embed category and author data, so changes to either
+# invalidate them too.
+POST_CACHE_LABELS = ("core.blogpost",)
+
+
+@receiver(post_save, sender=BlogPost)
+@receiver(post_delete, sender=BlogPost)
+@receiver(post_save, sender=BlogCategory)
+@receiver(post_delete, sender=BlogCategory)
+def invalidate_post_cache(sender, **kwargs):
+    bump_version_on_commit(*POST_CACHE_LABELS)
+
+
+@receiver(post_save, sender=User)
+def invalidate_post_cache_for_author(sender, instance, created=False, update_fields=None, **kwargs):
+    # cached posts only show the author's username: compare it with the value
+    # loaded (see User.save()), so logins and profile edits cost no query
+    if created or (update_fields is not None and "username" not in update_fields):
+        return
+    loaded = getattr(instance, "_loaded_claims", {})
+    if "username" in loaded and instance.username == loaded["username"]:
+        return
+    if instance.blog_posts.exists():
+        bump_version_on_commit(*POST_CACHE_LABELS)
+
+
+@receiver(post_save, sender=User)
+def note_token_version(sender, instance, **kwargs):
+    if "token_version" in instance.get_deferred_fields():
+        return
+    # other workers pick the new version up on their next revocation sync;
+    # read on commit, as an incremented version is only read back by then
+    transaction.on_commit(lambda: revocations.note_version(instance.pk, instance.token_version))
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def note_blacklisted_token(sender, instance, **kwargs):
+    jti, expires_at = instance.token.jti, instance.token.expires_at
+    transaction.on_commit(lambda: revocations.note_blacklisted(jti, expires_at))
+
+
+@receiver(post_save, sender=BlogPost)
+def update_search_index(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not {"title", "content"} & set(update_fields):
+        return
+    search.index_post(instance)
+
+
+@receiver(post_delete, sender=BlogPost)
+def remove_from_search_index(sender, instance, **kwargs):
+    search.remove_post(instance.pk)
+
+
+@receiver(pre_save, sender=BlogPost)
+def load_post_fields(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance._state.adding:
+        return
+    loaded = instance.__dict__.setdefault("_loaded", {})
+    missing = [f for f in ("slug", "category_id") if f not in loaded]
+    if update_fields is not None:
+        saved = {sender._meta.get_field(name).attname for name in update_fields}
+        missing = [f for f in missing if f in saved]
+    if missing:
+        # assigned without ever being loaded: the row still has the old values
+        row = sender._base_manager.filter(pk=instance.pk).values(*missing).first() or {}
+        loaded.update({f: row.get(f) for f in missing})
+
+
+@receiver(post_save, sender=BlogPost)
+def update_category_counts(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and not {"category", "category_id"} & set(update_fields)):
+        return
+    old = None if created else instance._loaded.get("category_id")
+    if instance.category_id != old:
+        categories.post_removed(old)
+        categories.post_added(instance.category_id, instance.created_at)
+
+
+@receiver(post_save, sender=BlogPost)
+def follow_slug_change(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and "slug" not in update_fields):
+        return
+    old = None if created else instance._loaded.get("slug")
+    if instance.slug != old:
+        slugs.renamed(instance, old)
+
+
+@receiver(post_save, sender=BlogPost)
+def remember_saved_post_fields(sender, instance, raw=False, update_fields=None, **kwargs):
+    # registered last: the receivers above compare with the old values
+    if update_fields is None:
+        fields = sender.TRACKED_FIELDS
+    else:
+        saved = {sender._meta.get_field(name).attname for name in update_fields}
+        fields = [f for f in sender.TRACKED_FIELDS if f in saved]
+    instance.remember_loaded(fields)
+
+
+@receiver(post_delete, sender=BlogPost)
+def remove_from_category_counts(sender, instance, **kwargs):
+    categories.post_removed(instance.category_id)
+
+
+@receiver(pre_save, sender=ArtImage)
+@receiver(pre_save, sender=User)
+def load_blob_references(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    loaded = instance.__dict__.setdefault("_loaded_blobs", {})
+    missing = [f for f in sender.BLOB_FIELDS if f not in loaded and f not in instance.get_deferred_fields()]
+    if missing:
+        # assigned without ever being loaded: the row still has the old names
+        row = sender._base_manager.filter(pk=instance.pk).values(*missing).first() or {}
+        loaded.update({f: row.get(f) or None for f in missing})
+
+
+@receiver(post_save, sender=ArtImage)
+@receiver(post_save, sender=User)
+def update_blob_references(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    loaded = instance.__dict__.setdefault("_loaded_blobs", {})
+    claimed = instance.__dict__.get("_claimed_blobs", {})
+    deferred = instance.get_deferred_fields()
+    for field in sender.BLOB_FIELDS:
+        if field in deferred or (update_fields is not None and field not in update_fields):
+            continue
+        field_file = getattr(instance, field)
+        old, new = loaded.get(field), field_file.name or None
+        # a reference BlobFieldFile.save() claimed for this row
+        claim = claimed.pop(field, None)
+        if new != old:
+            if claim != new:
+                blobs.acquire([new])
+            # the old name's variants go when new ones are generated
+            blobs.release_on_commit(field_file.storage, old)
+        elif claim is not None:
+            # the row had it already
+            blobs.release_on_commit(field_file.storage, claim)
+        loaded[field] = new
+
+
+@receiver(post_save, sender=ArtImage)
+def generate_art_image_variants(sender, instance, **kwargs):
+    if images.needs_variants(instance.image, instance.variants):
+        images.schedule(instance, "image", "variants")
+
+
+@receiver(post_save, sender=User)
+def generate_avatar_variants(sender, instance, **kwargs):
+    if images.needs_variants(instance.avatar, instance.avatar_variants):
+        images.schedule(instance, "avatar", "avatar_variants")
+
+
+@receiver(post_delete, sender=User)
+def release_avatar(sender, instance, **kwargs):
+    blobs.release_on_commit(instance.avatar.storage, instance.avatar.name, images.variant_names(instance.avatar_variants))
+
+
+@receiver(post_delete, sender=ArtImage)
+def release_art_image(sender, instance, **kwargs):
+    blobs.release_on_commit(instance.image.storage, instance.image.name, images.variant_names(instance.variants))
@@ -0,0 +1,97 @@
+"""
+Post slugs: allocation, renames and lookups.
+
+`allocate` turns a title into an ASCII slug (NFKD-folded, so "Café Déjà
+Vu" becomes "cafe-deja-vu") and picks the first free suffix from a single
+prefix query over current and former slugs, so a duplicate title gets
+"title-2", "title-3"... without trial INSERTs. Former slugs stay reserved
+so old links keep pointing at the post that had them.
+
+When a post's title changes, its slug follows and the old one is kept in
+`PostSlugRedirect` (see core/signals.py). Detail lookups resolve a slug to
+a post id through the cache, and a slug that is no longer current is
+answered with a 301 to the current one.
+"""
+import re
+
+from django.apps import apps
+from django.db import transaction
+from django.utils.text import slugify
+
+from . import cache
+
+
+FALLBACK = "post"
+SUFFIX_ROOM = 8  # "-" and up to 7 digits
+CACHE_KEY = "post-slug:{slug}"
+CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def post_model():
+    return apps.get_model("core", "BlogPost")
+
+
+def redirect_model():
+    return apps.get_model("core", "PostSlugRedirect")
+
+
+def base_slug(title):
+    max_length = post_model()._meta.get_field("slug").max_length
+    return slugify(title)[: max_length - SUFFIX_ROOM].strip("-") or FALLBACK
+
+
+def allocate(title, pk=None):
+    """A free slug for a post titled `title`; `pk` is the post itself, whose own slugs don't count."""
+    base = base_slug(title)
+    current = post_model()._base_manager.filter(slug__startswith=base).values_list("slug", flat=True)
+    former = redirect_model().objects.filter(old_slug__startswith=base).values_list("old_slug", flat=True)
+    if pk is not None:
+        current, former = current.exclude(pk=pk), former.exclude(post_id=pk)
+
+    pattern = re.compile(rf"{re.escape(base)}(?:-(\d+))?")
+    # 0 for the bare base, n for "base-n"
+    taken = set()
+    for slug in current.union(former, all=True):
+        match = pattern.fullmatch(slug)
+        if match:
+            taken.add(int(match.group(1) or 0))
+    if 0 not in taken:
+        return base
+    return f"{base}-{max(taken | {1}) + 1}"
+
+
+def is_taken(slug, pk=None):
+    return post_model()._base_manager.filter(slug=slug).exclude(pk=pk).exists()
+
+
+def cache_key(slug):
+    return CACHE_KEY.format(slug=slug)
+
+
+def resolve(slug):
+    """Id of the post `slug` belongs to, now or formerly; None if none does."""
+    store = cache.get_cache()
+    post_id = store.get(cache_key(slug))
+    if post_id is None:
+        post_id = post_model()._base_manager.filter(slug=slug).values_list("pk", flat=True).first()
+        if post_id is None:
+            post_id = redirect_model().objects.filter(old_slug=slug).values_list("post_id", flat=True).first()
+        if post_id is None:
+            return None
+        store.set(cache_key(slug), post_id, CACHE_TIMEOUT)
+    return post_id
+
+
+def forget(slug):
+    cache.get_cache().delete(cache_key(slug))
+
+
+def renamed(post, old_slug):
+    """Keep `old_slug` (None for a new post) as a redirect to `post`, which now has `post.slug`."""
+    if old_slug:
+        Redirect = redirect_model()
+        # a slug becoming current again (or taken over by another post) stops redirecting
+        Redirect.objects.filter(old_slug=post.slug).delete()
+        Redirect.objects.update_or_create(old_slug=old_slug, defaults={"post": post})
+    slug, post_id = post.slug, post.pk
+    transaction.on_commit(lambda: cache.get_cache().set(cache_key(slug), post_id, CACHE_TIMEOUT))
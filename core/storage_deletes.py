@@ -0,0 +1,58 @@
+"""
+Batched deletes of stored files.
+
+`delete_files_on_commit` collects every name deleted during a transaction
+and removes them once it commits, with one `delete_many` call per storage
+(a DeleteObjects request per 1000 keys on S3) instead of a request per file.
+"""
+import logging
+
+from django.db import transaction
+
+
+logger = logging.getLogger(__file__)
+
+
+def delete_files(storage, names, fail_silently=True):
+    names = [name for name in names if name]
+    if not names:
+        return
+    try:
+        if hasattr(storage, "delete_many"):
+            storage.delete_many(names)
+        else:
+            for name in names:
+                storage.delete(name)
+    except Exception:
+        if not fail_silently:
+            raise
+        logger.warning("Could not delete %d stored files, e.g. %s", len(names), names[0])
+
+
+class DeleteBatch:
+    def __init__(self):
+        self.names = {}
+
+    def add(self, storage, names):
+        self.names.setdefault(storage, []).extend(names)
+
+    def flush(self):
+        for storage, names in self.names.items():
+            delete_files(storage, names)
+        self.names = {}
+
+
+def delete_files_on_commit(storage, names):
+    if not names:
+        return
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        delete_files(storage, names)
+        return
+
+    batch = getattr(connection, "storage_delete_batch", None)
+    # a batch whose callback was dropped by a rollback can't be reused
+    if batch is None or not any(func == batch.flush for _, func, _ in connection.run_on_commit):
+        batch = connection.storage_delete_batch = DeleteBatch()
+        transaction.on_commit(batch.flush)
+    batch.add(storage, names)
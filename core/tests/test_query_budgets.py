@@ -0,0 +1,121 @@
+import io
+
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core import trending
+from core.models import ArtImage, BlogPost, User
+from core.query_budget import assert_max_queries
+from core.views import ArtImageViewSet, BlogPostViewSet, UserViewSet
+
+
+def image_file(color, name="image.jpg"):
+    content = io.BytesIO()
+    Image.new("RGB", (64, 48), color).save(content, "JPEG")
+    content.seek(0)
+    content.name = name
+    return content
+
+
+def authenticated_client(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(user).access_token}")
+    return client
+
+
+@override_settings(QUERY_BUDGET_RAISE=True, TRENDING={"FLUSH_SECONDS": 3600})
+class QueryBudgetTestCase(TestCase):
+    """
+    The read endpoints stay within the budget they declare, however many rows
+    they return. The middleware raises QueryBudgetExceeded on an overrun; the
+    assertions here also list the queries run.
+    """
+
+    rows = 25
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email="reader@example.com", username="reader", password="pw")
+        cls.author = User.objects.create_superuser(email="author@example.com", username="author", password="pw")
+        cls.posts = [
+            BlogPost.objects.create(author=cls.author, title=f"Post {i}", content=f"<p>Post number {i}</p>")
+            for i in range(cls.rows)
+        ]
+        cls.images = ArtImage.objects.bulk_create(
+            ArtImage(user=cls.user, title=f"Image {i}", image=f"art_images/image{i}.jpg") for i in range(cls.rows)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = authenticated_client(self.user)
+
+    def tearDown(self):
+        # views counted by the post requests are not written
+        trending.views.pending.clear()
+
+    def get(self, path, budget):
+        with assert_max_queries(budget):
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response
+
+    def test_post_list(self):
+        response = self.get("/api/posts/?page_size=50", BlogPostViewSet.query_budget["list"])
+        self.assertEqual(len(response.data["results"]), self.rows)
+
+    def test_post_retrieve(self):
+        response = self.get(f"/api/posts/{self.posts[0].slug}/", BlogPostViewSet.query_budget["retrieve"])
+        self.assertEqual(response.data["content_html"], "<p>Post number 0</p>")
+
+    def test_art_image_list(self):
+        response = self.get("/api/art-images/?limit=50", ArtImageViewSet.query_budget["list"])
+        self.assertEqual(len(response.data["results"]), self.rows)
+
+    def test_art_image_retrieve(self):
+        self.get(f"/api/art-images/{self.images[0].pk}/", ArtImageViewSet.query_budget["retrieve"])
+
+    def test_my_artworks(self):
+        response = self.get("/api/users/my_artworks/", UserViewSet.query_budget["my_artworks"])
+        self.assertEqual(len(response.data), self.rows)
+
+    def test_me(self):
+        response = self.get("/api/users/me/", UserViewSet.query_budget["me"])
+        self.assertEqual(response.data["username"], "reader")
+
+
+@override_settings(QUERY_BUDGET_RAISE=True, IMAGE_VARIANTS={"ASYNC": False})
+class MeUpdateQueryBudgetTestCase(TransactionTestCase):
+    """
+    PUT /api/users/me/ within its budget on the costliest path: an uploaded
+    avatar replacing another, with the variants generated inline. Runs
+    outside a test transaction, as blob references are counted differently
+    inside one (see core/blobs.py), and stores the avatars in media storage.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="me@example.com", username="me", password="pw")
+        self.client = authenticated_client(self.user)
+
+    def tearDown(self):
+        self.user.delete()
+
+    def put(self, data):
+        return self.client.put("/api/users/me/", encode_multipart(BOUNDARY, data), content_type=MULTIPART_CONTENT)
+
+    def test_bio(self):
+        with assert_max_queries(2):
+            response = self.put({"bio": "Painter"})
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def test_avatar_replaced(self):
+        self.assertEqual(self.put({"avatar": image_file((1, 2, 3))}).status_code, 200)
+        with assert_max_queries(UserViewSet.query_budget["me"]):
+            response = self.put({"avatar": image_file((200, 0, 0))})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.avatar_variants["files"])
@@ -0,0 +1,103 @@
+import io
+import tracemalloc
+
+from django.core.files.uploadhandler import load_handler
+from django.http.multipartparser import MultiPartParser
+from django.test import RequestFactory, TransactionTestCase
+from PIL import Image
+
+from core import blobs
+from core.models import ArtImage, MediaBlob
+from core.upload_handlers import StreamedImage, StreamingImageUploadHandler
+
+
+BOUNDARY = "measureuploadmemory"
+MB = 1024 * 1024
+
+
+class MultipartStream:
+    """A multipart body with one image field, generated as it is read."""
+
+    def __init__(self, image_bytes, padding):
+        self.parts = [
+            (
+                f"--{BOUNDARY}\r\n"
+                'Content-Disposition: form-data; name="image"; filename="measure.jpg"\r\n'
+                "Content-Type: image/jpeg\r\n\r\n"
+            ).encode(),
+            image_bytes,
+        ]
+        self.padding = padding
+        self.tail = f"\r\n--{BOUNDARY}--\r\n".encode()
+        self.length = sum(len(p) for p in self.parts) + padding + len(self.tail)
+        self.buffer = b""
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            if self.parts:
+                self.buffer += self.parts.pop(0)
+            elif self.padding:
+                # bytes after the JPEG end marker are ignored by decoders
+                chunk = min(self.padding, 256 * 1024)
+                self.buffer += b"\0" * chunk
+                self.padding -= chunk
+            elif self.tail:
+                self.buffer += self.tail
+                self.tail = b""
+            else:
+                break
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+class UploadMemoryTestCase(TransactionTestCase):
+    """
+    Streams synthetic multipart image uploads through the streaming upload
+    handler into media storage: peak Python memory stays bounded by a part
+    (PART_SIZE) whatever the size of the upload. Needs media storage; the
+    stored objects are deleted afterwards.
+    """
+
+    sizes_mb = (1, 8, 18)
+    max_peak_mb = 16.0
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        source = io.BytesIO()
+        Image.new("RGB", (1200, 800), (120, 80, 200)).save(source, "JPEG")
+        cls.image_bytes = source.getvalue()
+        # load boto3 and open the client outside the measured window
+        ArtImage._meta.get_field("image").storage.connection.meta.client
+
+    def test_peak_memory(self):
+        for size in self.sizes_mb:
+            with self.subTest(size_mb=size):
+                peak = self.measure(max(size * MB - len(self.image_bytes), 0))
+                self.assertLessEqual(peak / MB, self.max_peak_mb, f"{size} MB upload peaked at {peak / MB:.2f} MB")
+        self.assertFalse(MediaBlob.objects.exists())
+
+    def measure(self, padding):
+        body = MultipartStream(self.image_bytes, padding)
+        request = RequestFactory().post("/")
+        request.META["CONTENT_TYPE"] = f"multipart/form-data; boundary={BOUNDARY}"
+        request.META["CONTENT_LENGTH"] = str(body.length)
+        targets = {"image": ArtImage._meta.get_field("image")}
+
+        # no row takes the upload over: it is deleted when the block ends
+        with blobs.holding():
+            handlers = [StreamingImageUploadHandler(request, targets)] + [
+                load_handler(path, request)
+                for path in ("django.core.files.uploadhandler.MemoryFileUploadHandler",
+                             "django.core.files.uploadhandler.TemporaryFileUploadHandler")
+            ]
+            tracemalloc.start()
+            try:
+                _, files = MultiPartParser(request.META, body, handlers).parse()
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            self.assertIsInstance(files.get("image"), StreamedImage)
+        return peak
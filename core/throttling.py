@@ -0,0 +1,82 @@
+"""
+Token-bucket throttles for the login endpoint.
+
+DRF checks throttles before the view runs, so a throttled login costs no
+database query and no password hash. Buckets live in process memory, which
+keeps the check free of network round trips; with several workers a client
+can get up to one bucket's worth per worker.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class TokenBuckets:
+    """Bounded LRU of (tokens, last refill) per key."""
+
+    def __init__(self, max_size=100_000):
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.buckets = OrderedDict()
+
+    def take(self, key, capacity, refill_per_second):
+        """Take a token for `key`; returns 0 on success, else seconds until one is available."""
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill_per_second)
+            if tokens >= 1:
+                tokens, wait = tokens - 1, 0.0
+            else:
+                wait = (1 - tokens) / refill_per_second
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > self.max_size:
+                self.buckets.popitem(last=False)
+        return wait
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+buckets = TokenBuckets()
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """
+    A rate of "N/period" allows bursts of N requests and refills at N per
+    period. Rates come from REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"][scope].
+    """
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        self.wait_seconds = buckets.take(self.key, self.num_requests, self.num_requests / self.duration)
+        return self.wait_seconds == 0
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class LoginIPThrottle(TokenBucketThrottle):
+    scope = "login_ip"
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {"scope": self.scope, "ident": self.get_ident(request)}
+
+
+class LoginAccountThrottle(TokenBucketThrottle):
+    """Per email address, whatever IPs the attempts come from."""
+
+    scope = "login_account"
+
+    def get_cache_key(self, request, view):
+        email = request.data.get("email") if hasattr(request.data, "get") else None
+        if not isinstance(email, str) or not email:
+            return None
+        return self.cache_format % {"scope": self.scope, "ident": email.strip().lower()}
@@ -0,0 +1,186 @@
+"""
+Post view counters and the "trending" / "most read" rankings.
+
+Views are counted in process memory, by post id so a post renamed in the
+meantime keeps them, and written in batches: FLUSH_SECONDS after the first
+pending view (or once MAX_PENDING posts have views waiting) the pending
+counts go to `PostStats` in a handful of queries, however many views there
+were. A timer does the write when no later request comes along to do it,
+and a worker writes what is pending when it exits; one killed outright
+loses at most one interval of its views.
+
+Trending uses forward decay: a view at time t is worth 2 ** (t / half-life),
+so newer views count more and the order of two posts never needs
+recomputing as time passes. `PostStats.trend` holds the log2 of that sum,
+which keeps the numbers small, and sorting by it ranks posts by their
+views with each halving in weight every HALF_LIFE_HOURS.
+
+Rankings are computed every REFRESH_SECONDS with one indexed query and
+kept in the shared cache, so the endpoints only load the ranked posts.
+"""
+import atexit
+import logging
+import math
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import cache, query_budget
+from .models import BlogPost, PostStats
+
+
+logger = logging.getLogger(__file__)
+
+DEFAULTS = {
+    "FLUSH_SECONDS": 10,
+    "MAX_PENDING": 10_000,
+    "HALF_LIFE_HOURS": 24,
+    "REFRESH_SECONDS": 60,
+    "SIZE": 50,
+}
+
+# scores are relative to this instant; any fixed point works
+EPOCH = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+
+RANKINGS = {
+    "trending": "-trend",
+    "most_read": "-view_count",
+}
+RANKING_KEY = "ranking:{name}"
+
+
+def trending_setting(name):
+    return getattr(settings, "TRENDING", {}).get(name, DEFAULTS[name])
+
+
+def decay_clock(now):
+    """Half-lives elapsed since EPOCH."""
+    return (now - EPOCH).total_seconds() / (trending_setting("HALF_LIFE_HOURS") * 3600)
+
+
+def log2_add(a, b):
+    """log2(2 ** a + 2 ** b) without overflowing."""
+    if a is None:
+        return b
+    high, low = max(a, b), min(a, b)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def write_views(counts, now=None):
+    """Add {post id: views} to the posts' counters and trend scores."""
+    now = now or timezone.now()
+    # posts deleted since their views were counted drop out; asked of the
+    # primary, as a flush during a GET would otherwise read the replica and
+    # drop the views of posts it doesn't have yet
+    post_ids = list(BlogPost.objects.using(DEFAULT_DB_ALIAS).filter(pk__in=counts).values_list("id", flat=True))
+    if not post_ids:
+        return
+    clock = decay_clock(now)
+    with transaction.atomic():
+        PostStats.objects.bulk_create([PostStats(post_id=pk) for pk in post_ids], ignore_conflicts=True)
+        # locked so concurrent flushes from other workers add up
+        stats = list(PostStats.objects.select_for_update().filter(post_id__in=post_ids).only("post_id", "trend"))
+        for row in stats:
+            views = counts[row.post_id]
+            row.view_count = F("view_count") + views
+            row.trend = log2_add(row.trend, math.log2(views) + clock)
+            row.updated_at = now
+        PostStats.objects.bulk_update(stats, ["view_count", "trend", "updated_at"], batch_size=500)
+
+
+class ViewCounter:
+    """Per-process buffer of post views, keyed by post id."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = Counter()
+        self.flushed_at = time.monotonic()
+        self.timer = None
+
+    def add(self, post_id):
+        """Count a view; True when the buffer is due to be written."""
+        with self.lock:
+            self.pending[post_id] += 1
+            if self.timer is None:
+                # written even if no later view comes to trigger it
+                self.timer = threading.Timer(trending_setting("FLUSH_SECONDS"), self.flush_idle)
+                self.timer.daemon = True
+                self.timer.start()
+            return (
+                len(self.pending) >= trending_setting("MAX_PENDING")
+                or time.monotonic() - self.flushed_at >= trending_setting("FLUSH_SECONDS")
+            )
+
+    def record(self, post_id):
+        if self.add(post_id):
+            self.flush()
+
+    async def arecord(self, post_id):
+        if self.add(post_id):
+            await sync_to_async(self.flush)()
+
+    def flush_idle(self):
+        with self.lock:
+            self.timer = None
+        try:
+            self.flush()
+        finally:
+            # the timer's thread ends here, and its connection with it
+            connections.close_all()
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, Counter()
+            self.flushed_at = time.monotonic()
+        if not pending:
+            return
+        try:
+            # periodic work the current request only happens to trigger
+            with query_budget.uncounted():
+                write_views(pending)
+        except Exception:
+            logger.exception("Writing %d post view counts failed", len(pending))
+            with self.lock:
+                self.pending.update(pending)
+
+    def clear(self):
+        with self.lock:
+            self.pending.clear()
+
+
+views = ViewCounter()
+atexit.register(views.flush)
+
+
+def compute_ranking(name):
+    queryset = PostStats.objects.order_by(RANKINGS[name], "-post_id")
+    if name == "trending":
+        queryset = queryset.filter(trend__isnull=False)
+    return list(queryset.values_list("post_id", flat=True)[: trending_setting("SIZE")])
+
+
+def ranking(name):
+    """Post ids in rank order, recomputed at most every REFRESH_SECONDS."""
+    store = cache.get_cache()
+    key = RANKING_KEY.format(name=name)
+    cached = store.get(key)
+    if cached is not None and time.time() - cached["computed_at"] < trending_setting("REFRESH_SECONDS"):
+        return cached["ids"]
+    with query_budget.uncounted():
+        ids = compute_ranking(name)
+    store.set(key, {"ids": ids, "computed_at": time.time()}, timeout=None)
+    return ids
+
+
+def ranked_posts(queryset, name):
+    """Posts from `queryset` in ranking order; deleted posts drop out."""
+    ids = ranking(name)
+    posts = queryset.in_bulk(ids)
+    return [posts[pk] for pk in ids if pk in posts]
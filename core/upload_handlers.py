@@ -0,0 +1,398 @@
+"""
+Streaming multipart upload handling for image fields.
+
+`StreamingImageUploadHandler` inspects each configured image field as its
+bytes arrive. The magic bytes and image header in the first chunk(s) give
+the format and dimensions, so unsupported files, oversized uploads and
+decompression bombs are rejected before the rest of the body is read.
+Accepted bytes go straight to S3: small files in one PUT, larger ones as an
+S3 multipart upload in PART_SIZE parts. At most one part is held in memory
+and nothing touches disk. The bytes are hashed on the way; if the same
+content is already stored (see core/blobs.py) the buffered bytes are
+dropped, or the multipart upload aborted, and the existing object is used.
+Either way the request holds a reference to the blob (see blobs.holding()),
+so it can't be deleted before the request's rows refer to it: the rows take
+it over, and the uploads of a failed request are deleted when it ends.
+
+The handler hands the serializer a `StreamedImage` carrying the stored name.
+`StreamedImageField` accepts it without re-reading or re-uploading the file.
+
+`BulkImageUploadHandler` does the same for many files in one request: the
+final write of each file runs on a bounded thread pool while the parser
+reads the next one, and a rejected file is reported per item instead of
+failing the whole request.
+"""
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.base import File
+from django.core.files.uploadhandler import FileUploadHandler
+from django.http.multipartparser import MultiPartParserError
+from rest_framework import serializers
+
+from . import blobs, uploads
+
+
+PART_SIZE = 5 * 1024 * 1024  # S3 minimum for all but the last part
+MIME_TYPES = {fmt: mime for mime, fmt in uploads.DEFAULTS["CONTENT_TYPES"].items()}
+
+
+class StreamedImage(File):
+    """An image already written to storage by the upload handler."""
+
+    error = None
+    digest = None
+
+    def __init__(self, storage, name, size, image_format, dimensions):
+        super().__init__(None, name)
+        self.storage = storage
+        self.size = size
+        self.image_format = image_format
+        self.width, self.height = dimensions
+
+
+class S3StreamWriter:
+    def __init__(self, storage, name, content_type):
+        self.storage = storage
+        self.name = name
+        self.key = storage._normalize_name(name)
+        self.client = storage.connection.meta.client
+        self.params = {
+            "Bucket": storage.bucket_name,
+            "Key": self.key,
+            "ContentType": content_type,
+            "ACL": storage.default_acl,
+        }
+        self.buffer = io.BytesIO()
+        self.upload_id = None
+        self.parts = []
+
+    def write(self, data):
+        self.buffer.write(data)
+        if self.buffer.tell() >= PART_SIZE:
+            self.flush_part()
+
+    def flush_part(self):
+        if self.upload_id is None:
+            self.upload_id = self.client.create_multipart_upload(**self.params)["UploadId"]
+        number = len(self.parts) + 1
+        response = self.client.upload_part(
+            Bucket=self.params["Bucket"],
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=number,
+            Body=self.buffer.getvalue(),
+        )
+        self.parts.append({"ETag": response["ETag"], "PartNumber": number})
+        self.buffer = io.BytesIO()
+
+    def close(self):
+        if self.upload_id is None:
+            self.client.put_object(Body=self.buffer.getvalue(), **self.params)
+        else:
+            if self.buffer.tell():
+                self.flush_part()
+            self.client.complete_multipart_upload(
+                Bucket=self.params["Bucket"],
+                Key=self.key,
+                UploadId=self.upload_id,
+                MultipartUpload={"Parts": self.parts},
+            )
+            self.upload_id = None
+        self.buffer = io.BytesIO()
+
+    def abort(self):
+        if self.upload_id is not None:
+            self.client.abort_multipart_upload(
+                Bucket=self.params["Bucket"], Key=self.key, UploadId=self.upload_id
+            )
+            self.upload_id = None
+        self.buffer = io.BytesIO()
+
+
+class StreamingImageUploadHandler(FileUploadHandler):
+    """
+    `targets` maps form field names to the model ImageField they fill, e.g.
+    {"image": ArtImage._meta.get_field("image")}. Other file fields pass
+    through to the next handler untouched.
+    """
+
+    def __init__(self, request=None, targets=None):
+        super().__init__(request)
+        self.targets = targets or {}
+        self.active = False
+        self.writer = None
+        # a reference to the blob of every upload, see blobs.claim()
+        self.held = blobs.held_references()
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        self.active = field_name in self.targets
+        self.writer = None
+        if not self.active:
+            return
+        if content_length is not None and content_length > uploads.upload_setting("MAX_BYTES"):
+            self.reject("File too large")
+        self.header = b""
+        self.image_format = None
+        self.dimensions = None
+        self.received = 0
+        self.hasher = blobs.new_hasher()
+
+    def reject(self, message):
+        if self.writer is not None:
+            self.writer.abort()
+            self.writer = None
+        self.active = False
+        raise MultiPartParserError(f"{self.field_name}: {message}")
+
+    def sniff(self, raw_data):
+        self.header += raw_data
+        try:
+            self.image_format, self.dimensions = uploads.sniff_image(self.header)
+        except uploads.InvalidImageHeader as e:
+            # may only be truncated; wait for more bytes up to the limit
+            if len(self.header) >= uploads.upload_setting("HEADER_BYTES"):
+                self.reject(str(e))
+            return
+        except uploads.UploadRejected as e:
+            self.reject(str(e))
+
+        field = self.targets[self.field_name]
+        name = field.generate_filename(None, self.file_name)
+        name = field.storage.get_available_name(name, max_length=field.max_length)
+        self.writer = S3StreamWriter(field.storage, name, MIME_TYPES[self.image_format])
+        self.writer.write(self.header)
+        self.header = b""
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.active:
+            return raw_data
+
+        self.received += len(raw_data)
+        if self.received > uploads.upload_setting("MAX_BYTES"):
+            self.reject("File too large")
+        self.hasher.update(raw_data)
+
+        try:
+            if self.writer is None:
+                self.sniff(raw_data)
+            else:
+                self.writer.write(raw_data)
+        except MultiPartParserError:
+            raise
+        except Exception:
+            self.reject("Upload to storage failed")
+        return None
+
+    def file_complete(self, file_size):
+        if not self.active:
+            return None
+        self.active = False
+        if self.writer is None:
+            self.reject("File is not a valid image")
+        digest = self.hasher.hexdigest()
+        blob = blobs.claim(digest)
+        if blob is not None:
+            self.writer.abort()
+            upload = self.streamed_image(blob.name, file_size, digest)
+            self.held.add(upload.storage, upload.name)
+            return upload
+        try:
+            self.writer.close()
+        except Exception:
+            self.reject("Upload to storage failed")
+        storage, name = self.writer.storage, self.writer.name
+        name = blobs.register(storage, [(digest, name, file_size)])[name]
+        upload = self.streamed_image(name, file_size, digest)
+        self.held.add(storage, name)
+        return upload
+
+    def streamed_image(self, name, file_size, digest):
+        upload = StreamedImage(self.writer.storage, name, file_size, self.image_format, self.dimensions)
+        upload.digest = digest
+        return upload
+
+    def upload_interrupted(self):
+        if self.active and self.writer is not None:
+            self.writer.abort()
+
+
+class RejectedImage(File):
+    """Stands in for a file BulkImageUploadHandler refused, in request.FILES order."""
+
+    def __init__(self, name, error):
+        super().__init__(None, name)
+        self.error = error
+
+
+class FileRejected(MultiPartParserError):
+    pass
+
+
+class BulkImageUploadHandler(StreamingImageUploadHandler):
+    """
+    StreamingImageUploadHandler for up to `max_files` files per request.
+    Each file is closed out (its PUT, or the multipart completion) on a pool
+    of `workers` threads; at most `workers` files wait for storage at once,
+    so memory stays bounded when storage is slower than the client. All
+    writes have finished by the time parsing returns.
+    """
+
+    def __init__(self, request=None, targets=None, workers=4, max_files=100):
+        super().__init__(request, targets)
+        self.workers = workers
+        self.max_files = max_files
+        self.files = 0
+        self.error = None
+        self.pending = []
+        # first upload of each digest, and later repeats as (upload, first)
+        self.first = {}
+        self.repeats = []
+        self.slots = threading.BoundedSemaphore(workers)
+        self.executor = None
+
+    def reject(self, message):
+        if self.writer is not None:
+            self.writer.abort()
+            self.writer = None
+        self.active = False
+        raise FileRejected(message)
+
+    def new_file(self, field_name, *args, **kwargs):
+        self.error = None
+        if field_name in self.targets:
+            self.files += 1
+        try:
+            super().new_file(field_name, *args, **kwargs)
+            if self.active and self.files > self.max_files:
+                self.reject(f"At most {self.max_files} files per request")
+        except FileRejected as e:
+            self.error = str(e)
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.error is not None:
+            return None
+        try:
+            return super().receive_data_chunk(raw_data, start)
+        except FileRejected as e:
+            self.error = str(e)
+            return None
+
+    def file_complete(self, file_size):
+        if self.error is not None:
+            return RejectedImage(self.file_name, self.error)
+        if not self.active:
+            return None
+        self.active = False
+        if self.writer is None:
+            return RejectedImage(self.file_name, "File is not a valid image")
+
+        digest = self.hasher.hexdigest()
+        first = self.first.get(digest)
+        blob = blobs.claim(digest) if first is None else None
+        if first is not None or blob is not None:
+            self.writer.abort()
+            upload = self.streamed_image(first.name if first else blob.name, file_size, digest)
+            self.writer = None
+            if first is not None:
+                # covered by the first one's reference
+                self.repeats.append((upload, first))
+            else:
+                self.held.add(upload.storage, upload.name)
+            return upload
+
+        upload = self.streamed_image(self.writer.name, file_size, digest)
+        self.first[digest] = upload
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bulk-upload")
+        self.slots.acquire()
+        future = self.executor.submit(self.store, self.writer)
+        future.add_done_callback(lambda future: self.slots.release())
+        self.pending.append((upload, future))
+        self.writer = None
+        return upload
+
+    def store(self, writer):
+        try:
+            writer.close()
+        except Exception:
+            writer.abort()
+            raise
+
+    def upload_complete(self):
+        written = {}
+        for upload, future in self.pending:
+            if future.exception() is None:
+                written.setdefault(upload.storage, []).append(upload)
+            else:
+                upload.error = "Upload to storage failed"
+        self.pending = []
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+        # one round of queries for the whole request
+        for storage, batch in written.items():
+            names = blobs.register(storage, [(upload.digest, upload.name, upload.size) for upload in batch])
+            for upload in batch:
+                upload.name = names[upload.name]
+                self.held.add(storage, upload.name)
+        for upload, first in self.repeats:
+            upload.name, upload.error = first.name, first.error
+        self.repeats = []
+
+
+class StreamedImageUploadMixin:
+    """
+    Installs StreamingImageUploadHandler ahead of Django's defaults for
+    the fields listed in `streamed_image_fields` ({form field: model field}).
+    Override get_upload_handler() to use another handler, e.g. for one action.
+    """
+
+    streamed_image_fields = {}
+
+    def get_upload_handler(self, request, targets):
+        return StreamingImageUploadHandler(request, targets)
+
+    def initial(self, request, *args, **kwargs):
+        # authenticates and checks permissions: nothing is streamed for a
+        # request that is refused
+        super().initial(request, *args, **kwargs)
+        if request.method in ("POST", "PUT", "PATCH") and self.streamed_image_fields:
+            model = self.get_serializer_class().Meta.model
+            targets = {
+                form_field: model._meta.get_field(model_field)
+                for form_field, model_field in self.streamed_image_fields.items()
+            }
+            django_request = request._request
+            self._streaming_upload_handler = self.get_upload_handler(django_request, targets)
+            django_request.upload_handlers.insert(0, self._streaming_upload_handler)
+
+    def dispatch(self, request, *args, **kwargs):
+        self._streaming_upload_handler = None
+        # rows saved by the view take over their uploads' references; the
+        # rest (a failed request, a rejected item) are released on the way out
+        with blobs.holding():
+            try:
+                return super().dispatch(request, *args, **kwargs)
+            finally:
+                # also when the view raised: DRF re-raises errors it doesn't
+                # handle before finalize_response(). Parsing may have stopped
+                # early, before the handler waited for its writes.
+                if self._streaming_upload_handler is not None:
+                    self._streaming_upload_handler.upload_complete()
+                    self._streaming_upload_handler = None
+
+
+class StreamedImageField(serializers.ImageField):
+    """
+    ImageField that accepts StreamedImage uploads as-is. They were validated
+    from their header and already stored, so the model gets the storage name.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, StreamedImage):
+            return data.name
+        return super().to_internal_value(data)
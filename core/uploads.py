@@ -0,0 +1,184 @@
+"""
+Direct-to-S3 uploads for art images.
+
+1. `presign()` returns a presigned POST for a fresh key in PublicMediaStorage,
+   limited to the size the client declared. It comes with a signed
+   `upload_token` that binds the key to the user.
+2. The client POSTs the file straight to the bucket.
+3. `inspect()` checks the stored object (HEAD for size and content type, and
+   a ranged GET of the first bytes for format and dimensions) before the view
+   creates the ArtImage row. Rejected objects are deleted, accepted ones are
+   adopted as blobs (see core/blobs.py), which also makes each key
+   confirmable once.
+
+The bytes never pass through Django. Point AWS_S3_ENDPOINT_URL at MinIO
+(see local.yml) to run the flow locally.
+"""
+import io
+import os
+import uuid
+
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.core import signing
+from django.utils.text import get_valid_filename
+from PIL import Image, UnidentifiedImageError
+
+from drf_starter.storage_backends import PublicMediaStorage
+
+
+TOKEN_SALT = "core.uploads"
+
+DEFAULTS = {
+    "MAX_BYTES": 20 * 1024 * 1024,
+    "MAX_PIXELS": 50_000_000,
+    "CONTENT_TYPES": {
+        "image/jpeg": "JPEG",
+        "image/png": "PNG",
+        "image/webp": "WEBP",
+        "image/gif": "GIF",
+    },
+    "EXPIRES": 600,
+    "HEADER_BYTES": 64 * 1024,
+    # ArtImageViewSet.bulk: files per request, and concurrent storage writes
+    "BULK_MAX_FILES": 100,
+    "BULK_WORKERS": 4,
+}
+
+EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp", "GIF": ".gif"}
+
+
+class UploadRejected(Exception):
+    pass
+
+
+class InvalidImageHeader(UploadRejected):
+    """The header did not parse; it may be corrupt or just truncated."""
+
+
+def upload_setting(name):
+    return getattr(settings, "DIRECT_UPLOADS", {}).get(name, DEFAULTS[name])
+
+
+def get_storage():
+    return PublicMediaStorage()
+
+
+def allowed_content_types():
+    return upload_setting("CONTENT_TYPES")
+
+
+def presign(user, filename, content_type, size, upload_to="art_images/"):
+    """Presigned POST for one upload of at most `size` bytes, plus the token to confirm it with."""
+    storage = get_storage()
+    extension = EXTENSIONS[allowed_content_types()[content_type]]
+    stem = get_valid_filename(os.path.splitext(os.path.basename(filename))[0])[:50] or "image"
+    name = f"{upload_to}{uuid.uuid4().hex}-{stem}{extension}"
+    key = storage._normalize_name(name)
+    expires = upload_setting("EXPIRES")
+
+    fields = {"Content-Type": content_type, "acl": storage.default_acl}
+    conditions = [
+        ["content-length-range", 1, min(size, upload_setting("MAX_BYTES"))],
+        {"Content-Type": content_type},
+        {"acl": storage.default_acl},
+    ]
+    post = storage.connection.meta.client.generate_presigned_post(
+        Bucket=storage.bucket_name,
+        Key=key,
+        Fields=fields,
+        Conditions=conditions,
+        ExpiresIn=expires,
+    )
+    token = signing.dumps({"name": name, "user": user.pk}, salt=TOKEN_SALT)
+    return {"url": post["url"], "fields": post["fields"], "upload_token": token, "expires_in": expires}
+
+
+def load_token(token, user):
+    """Storage name the token was issued for; rejects other users' and expired tokens."""
+    try:
+        payload = signing.loads(token, salt=TOKEN_SALT, max_age=upload_setting("EXPIRES") * 2)
+    except signing.BadSignature:
+        raise UploadRejected("Invalid or expired upload token")
+    if payload.get("user") != user.pk:
+        raise UploadRejected("Invalid or expired upload token")
+    return payload["name"]
+
+
+MAGIC_NUMBERS = {
+    "JPEG": (b"\xff\xd8\xff",),
+    "PNG": (b"\x89PNG\r\n\x1a\n",),
+    "GIF": (b"GIF87a", b"GIF89a"),
+}
+
+
+def sniff_format(data):
+    """Image format from the leading magic bytes, or None."""
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "WEBP"
+    for image_format, prefixes in MAGIC_NUMBERS.items():
+        if data.startswith(prefixes):
+            return image_format
+    return None
+
+
+def sniff_image(data):
+    """
+    (format, (width, height)) from the leading bytes of an image.
+
+    Only the header is parsed; nothing is decoded or allocated for the
+    pixels, so this is safe to run on decompression bombs.
+    """
+    image_format = sniff_format(data)
+    if image_format not in allowed_content_types().values():
+        raise UploadRejected("File is not a supported image")
+    try:
+        with Image.open(io.BytesIO(data), formats=[image_format]) as image:
+            size = image.size
+    except Image.DecompressionBombError:
+        raise UploadRejected("Image dimensions too large")
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError):
+        raise InvalidImageHeader("File is not a valid image")
+
+    width, height = size
+    if width * height > upload_setting("MAX_PIXELS"):
+        raise UploadRejected("Image dimensions too large")
+    return image_format, size
+
+
+def read_dimensions(client, bucket, key):
+    """Format and size from the first HEADER_BYTES of the object."""
+    header = client.get_object(
+        Bucket=bucket, Key=key, Range=f"bytes=0-{upload_setting('HEADER_BYTES') - 1}"
+    )["Body"].read()
+    return sniff_image(header)
+
+
+def inspect(name):
+    """
+    Validate the uploaded object named `name`. Returns (format, (width, height), size).
+    Raises UploadRejected and deletes the object if it fails a check.
+    """
+    storage = get_storage()
+    client = storage.connection.meta.client
+    key = storage._normalize_name(name)
+    try:
+        head = client.head_object(Bucket=storage.bucket_name, Key=key)
+    except ClientError:
+        raise UploadRejected("Upload not found")
+
+    try:
+        content_type = head.get("ContentType")
+        if content_type not in allowed_content_types():
+            raise UploadRejected("Unsupported content type")
+        if head["ContentLength"] > upload_setting("MAX_BYTES"):
+            raise UploadRejected("File too large")
+
+        image_format, (width, height) = read_dimensions(client, storage.bucket_name, key)
+        if image_format != allowed_content_types()[content_type]:
+            raise UploadRejected("File content does not match its content type")
+    except UploadRejected:
+        storage.delete(name)
+        raise
+
+    return image_format, (width, height), head["ContentLength"]
@@ -1,16 +1,22 @@
+from django.conf import settings
 from django.urls import path
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import (
      TokenBlacklistView,
  )
-from .views import AuthViewSet, BlogPostViewSet, UserViewSet, ArtImageViewSet
+from .async_views import with_async_reads
+from .views import AuthViewSet, BlogCategoryViewSet, BlogPostViewSet, UserViewSet, ArtImageViewSet, MonitoringViewSet
 
 router = DefaultRouter()
 router.register("auth", AuthViewSet, basename="auth")
 router.register("posts", BlogPostViewSet, basename="posts")
+router.register("categories", BlogCategoryViewSet, basename="categories")
 router.register("users", UserViewSet, basename="user")
 router.register("art-images", ArtImageViewSet, basename="artimage")
+router.register("monitoring", MonitoringViewSet, basename="monitoring")
 
 urlpatterns = [
      path('token/blacklist/', TokenBlacklistView.as_view(), name='token_blacklist')
-] + router.urls
\ No newline at end of file
+] + router.urls
+if settings.ASYNC_VIEWS:
+    urlpatterns = with_async_reads(urlpatterns)
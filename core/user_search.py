@@ -0,0 +1,57 @@
+"""
+Name search over users.
+
+Both paths match against User.search_name, a precomputed lowercase,
+accent-folded "first last username" column. On Postgres it carries a
+pg_trgm GIN index, so substring and fuzzy matches are index scans ranked by
+word similarity. Elsewhere (SQLite in development) it is a plain scan of
+that single column.
+"""
+from django.db import connection
+from django.db.models import Q
+
+from .utils import normalize_search_text
+
+
+AUTOCOMPLETE_LIMIT = 10
+
+
+def _normalize(query):
+    return normalize_search_text(query).strip()
+
+
+def search_users(queryset, query):
+    """Users whose name contains, or fuzzily matches, `query`; best first."""
+    term = _normalize(query)
+    if not term:
+        return queryset
+
+    if connection.vendor == "postgresql":
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        return (
+            queryset.filter(Q(search_name__contains=term) | Q(search_name__trigram_word_similar=term))
+            .annotate(similarity=TrigramWordSimilarity(term, "search_name"))
+            .order_by("-similarity", "id")
+        )
+    # id order lets the scan stop as soon as a page is filled
+    return queryset.filter(search_name__contains=term).order_by("id")
+
+
+def autocomplete_users(queryset, prefix, limit=AUTOCOMPLETE_LIMIT):
+    """Up to `limit` users with a name word starting with `prefix`."""
+    term = _normalize(prefix)
+    if not term:
+        return queryset.none()
+
+    # search_name is space-prefixed, so " term" only matches at word starts
+    queryset = queryset.filter(search_name__contains=" " + term)
+    if connection.vendor == "postgresql":
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        queryset = queryset.annotate(
+            similarity=TrigramWordSimilarity(term, "search_name")
+        ).order_by("-similarity", "username")
+    else:
+        queryset = queryset.order_by("id")
+    return queryset[:limit]
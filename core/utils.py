@@ -0,0 +1,97 @@
+import math
+import re
+import unicodedata
+from html.parser import HTMLParser
+
+
+WORDS_PER_MINUTE = 200
+EXCERPT_LENGTH = 200
+
+_whitespace_re = re.compile(r"\s+")
+# dropped together with everything inside them, from text and rendered HTML
+# alike (see core/rendering.py)
+DROPPED_TAGS = {"script", "style", "iframe", "object", "embed", "noscript", "template", "textarea", "select", "svg", "math"}
+# Block-level boundaries become spaces so adjacent paragraphs don't fuse words
+BREAK_TAGS = {"br", "p", "div", "li", "h1", "h2", "h3", "h4", "h5", "h6", "blockquote", "tr", "td", "th"}
+
+
+class _TextParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.dropping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROPPED_TAGS:
+            self.dropping += 1
+        elif tag == "br":
+            self.parts.append(" ")
+
+    def handle_endtag(self, tag):
+        if tag in DROPPED_TAGS:
+            self.dropping = max(self.dropping - 1, 0)
+        elif tag in BREAK_TAGS:
+            self.parts.append(" ")
+
+    def handle_data(self, data):
+        if not self.dropping:
+            self.parts.append(data)
+
+
+def html_to_text(value):
+    """Strip tags and entities from rich-text HTML, collapsing whitespace."""
+    parser = _TextParser()
+    parser.feed(value or "")
+    parser.close()
+    return _whitespace_re.sub(" ", "".join(parser.parts)).strip()
+
+
+def make_excerpt(text, length=EXCERPT_LENGTH):
+    """Cut plain text to `length` characters on a word boundary."""
+    if len(text) <= length:
+        return text
+    cut = text[:length].rsplit(" ", 1)[0] or text[:length]
+    return cut.rstrip(" .,;:") + "..."
+
+
+def reading_time(word_count):
+    """Estimated reading time in whole minutes (at least 1 for non-empty posts)."""
+    if not word_count:
+        return 0
+    return math.ceil(word_count / WORDS_PER_MINUTE)
+
+
+def normalize_search_text(*parts):
+    """
+    Lowercase, accent-fold and space-join `parts` for name search.
+
+    The result starts with a space so a word-prefix match is a plain
+    `contains(" " + prefix)`, which a trigram index can serve.
+    """
+    text = unicodedata.normalize("NFKD", " ".join(part for part in parts if part))
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " " + " ".join(text.casefold().split())
+
+
+class _ImageSourceParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.sources = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag != "img":
+            return
+        for name, value in attrs:
+            if name == "src" and value:
+                self.sources.append(value.strip())
+            elif name == "srcset" and value:
+                # "url 300w, url 2x": the URL is the first token of each candidate
+                self.sources.extend(part.split()[0] for part in value.split(",") if part.strip())
+
+
+def image_sources(value):
+    """URLs of every <img> (src and srcset) in rich-text HTML, entities decoded."""
+    parser = _ImageSourceParser()
+    parser.feed(value or "")
+    parser.close()
+    return parser.sources
@@ -1,38 +1,40 @@
-from django.db import transaction
+from django.db import IntegrityError, transaction
+from django.http import Http404
+from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth import get_user_model
-from django.core.mail import send_mail
-from django.utils.encoding import force_bytes, force_str
-from django.conf import settings
-from django.db.models import Q
-from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
+from django.utils.encoding import force_str
+from django.utils.http import urlsafe_base64_decode
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
 from rest_framework import viewsets, permissions, status
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from rest_framework.decorators import action
-from rest_framework_simplejwt.tokens import RefreshToken
-from drf_spectacular.utils import extend_schema
+from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
 
 
-from .models import BlogPost, ArtImage
+from . import blobs, cache, categories, db_pool, emails, hashers, images, search, slugs, trending, uploads, user_search
+from .authentication import RefreshToken
+from .conditional import ConditionalGetMixin
+from .models import BlogPost, BlogCategory, ArtImage
+from .upload_handlers import BulkImageUploadHandler, StreamedImageUploadMixin
+from .pagination import BlogPostPagination, ArtImagePagination
+from .throttling import LoginAccountThrottle, LoginIPThrottle
 from .serializers import (
+    BlogCategorySerializer,
     BlogPostListSerializer,
     BlogPostDetailSerializer,
     AuthenticationSerializer,
     UserSerializer,
+    UserSuggestionSerializer,
     ArtImageSerializer,
+    ArtImageBulkSerializer,
+    ArtImageUploadSerializer,
 )
 
 User = get_user_model()
 
 
-class BlogPostPagination(PageNumberPagination):
-    page_size = 10
-    page_size_query_param = "page_size"
-    max_page_size = 50
-
-
 class IsAdminOrReadOnly(permissions.BasePermission):
     """
     Allow only admins to create/update/delete.
@@ -73,7 +75,7 @@ class AuthViewSet(viewsets.ViewSet):
 
         return Response(response_serializer.data, status=status.HTTP_201_CREATED)
 
-    @action(detail=False, methods=["post"])
+    @action(detail=False, methods=["post"], throttle_classes=[LoginIPThrottle, LoginAccountThrottle])
     def login(self, request):
         serializer = AuthenticationSerializer.LoginSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -85,11 +87,14 @@ class AuthViewSet(viewsets.ViewSet):
             user = User.objects.get(email=email)
             print("User check", user)
         except User.DoesNotExist:
+            # as slow as a wrong password, so responses don't reveal which emails exist
+            hashers.check_dummy_password(password)
             return Response(
                 {"detail": "Invalid email or password"},
                 status=status.HTTP_401_UNAUTHORIZED,
             )
 
+        # rehashes with the preferred hasher on success, see core/hashers.py
         if not user.check_password(password):
             return Response(
                 {"detail": "Invalid email or password"},
@@ -143,25 +148,12 @@ class AuthViewSet(viewsets.ViewSet):
         serializer.is_valid(raise_exception=True)
         email = serializer.validated_data["email"]
 
-        try:
-            user = User.objects.get(email=email)
-        except User.DoesNotExist:
-            # Always return success to avoid account enumeration
-            return Response(
-                {"detail": "If an account exists, you'll get an email"},
-                status=status.HTTP_200_OK,
-            )
-
-        token = PasswordResetTokenGenerator().make_token(user)
-        uid = urlsafe_base64_encode(force_bytes(user.pk))
-        reset_link = f"{settings.FRONTEND_URL}/reset-password/{uid}/{token}"
-
-        send_mail(
-            subject="Password Reset Request",
-            message=f"Click the link to reset your password: {reset_link}",
-            from_email=settings.EMAIL_HOST_USER,
-            recipient_list=[user.email],
-            fail_silently=False,
+        # The user lookup and token happen in the email worker, so this
+        # request costs the same whether or not the account exists.
+        emails.enqueue(
+            emails.PASSWORD_RESET,
+            to=email,
+            dedupe_key=f"password-reset:{email.lower()}",
         )
 
         return Response(
@@ -193,6 +185,8 @@ class AuthViewSet(viewsets.ViewSet):
 
         user.set_password(serializer.validated_data["new_password"])
         user.save()
+        # sign out every session, including one an attacker may hold
+        user.revoke_tokens()
         return Response(
             {"detail": "Password reset successful"}, status=status.HTTP_200_OK
         )
@@ -218,18 +212,52 @@ class AuthViewSet(viewsets.ViewSet):
 
         user.set_password(new_password)
         user.save()
+        # other sessions are signed out, this one continues with new tokens
+        user.revoke_tokens()
+        refresh = RefreshToken.for_user(user)
 
         return Response(
-            {"detail": "Password changed successfully"}, status=status.HTTP_200_OK
+            {
+                "detail": "Password changed successfully",
+                "refresh": str(refresh),
+                "access": str(refresh.access_token),
+            },
+            status=status.HTTP_200_OK,
         )
 
 
 @extend_schema(tags=["Blog"])
-class BlogPostViewSet(viewsets.ModelViewSet):
-    queryset = BlogPost.objects.all().order_by("-created_at")
+@extend_schema_view(
+    list=extend_schema(
+        parameters=[
+            OpenApiParameter("search", str, description="Full-text search, results ranked by relevance"),
+            OpenApiParameter("category", int, description="Only posts in this category"),
+        ]
+    )
+)
+class BlogPostViewSet(ConditionalGetMixin, cache.CachedResponseMixin, viewsets.ModelViewSet):
+    queryset = BlogPost.objects.select_related("author", "category").order_by("-created_at", "-id")
     pagination_class = BlogPostPagination
     permission_classes = [IsAdminOrReadOnly]
     lookup_field = "slug"  # 🔑 use slug instead of ID
+    # auth + validators + count + page; rankings are refreshed and view
+    # counts flushed outside the budget (see core/trending.py). retrieve: the
+    # post, +1 to resolve a slug missing from the cache, +1 for a former slug
+    query_budget = {"list": 4, "retrieve": 3, "trending": 2, "most_read": 2}
+    cache_dependencies = ("core.blogpost",)
+    related_last_modified = ("author",)
+
+    def get_queryset(self):
+        queryset = super().get_queryset().defer("search_vector")
+        if self.action in ("list", "trending", "most_read"):
+            # excerpt/word_count/reading_time are stored, so skip the rich text
+            queryset = queryset.defer("content", "rendered_content")
+            queryset = categories.filter_posts(queryset, self.request.query_params.get("category"))
+            queryset = search.search_posts(queryset, self.request.query_params.get("search"))
+        elif self.action == "retrieve" and self.request.method in permissions.SAFE_METHODS:
+            # readers get rendered_content; the editor source is only written
+            queryset = queryset.defer("content")
+        return queryset
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -239,13 +267,82 @@ class BlogPostViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def get_object(self):
+        # once per request: the validators and the response both need it
+        if getattr(self, "_object", None) is None:
+            self._object = self.lookup_post(self.kwargs[self.lookup_field])
+        return self._object
+
+    def lookup_post(self, slug):
+        """The post `slug` belongs to or used to, found by id through core/slugs.py."""
+        queryset = self.filter_queryset(self.get_queryset())
+        post_id = slugs.resolve(slug)
+        post = queryset.filter(pk=post_id).first() if post_id is not None else None
+        if post is None and post_id is not None:
+            # cached id of a post deleted since
+            slugs.forget(slug)
+            post_id = slugs.resolve(slug)
+            post = queryset.filter(pk=post_id).first() if post_id is not None else None
+        if post is None:
+            raise Http404
+        self.check_object_permissions(self.request, post)
+        return post
+
+    def retrieve(self, request, *args, **kwargs):
+        slug = kwargs[self.lookup_field]
+        post = self.get_object()
+        if post.slug != slug:
+            location = reverse("posts-detail", kwargs={**kwargs, self.lookup_field: post.slug})
+            if request.META.get("QUERY_STRING"):
+                location += "?" + request.META["QUERY_STRING"]
+            return Response(status=status.HTTP_301_MOVED_PERMANENTLY, headers={"Location": location})
+
+        response = super().retrieve(request, *args, **kwargs)
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            trending.views.record(post.pk)
+        return response
+
+    def ranked(self, name):
+        posts = trending.ranked_posts(self.get_queryset(), name)
+        return Response(BlogPostListSerializer(posts, many=True, context=self.get_serializer_context()).data)
+
+    @extend_schema(responses=BlogPostListSerializer(many=True))
+    @action(detail=False, methods=["get"])
+    def trending(self, request):
+        """Posts read most recently, each view's weight halving every TRENDING["HALF_LIFE_HOURS"]"""
+        return self.ranked("trending")
+
+    @extend_schema(responses=BlogPostListSerializer(many=True))
+    @action(detail=False, methods=["get"], url_path="most-read")
+    def most_read(self, request):
+        """Posts with the most views of all time"""
+        return self.ranked("most_read")
+
+
+@extend_schema(tags=["Blog"])
+class BlogCategoryViewSet(cache.CachedResponseMixin, viewsets.ModelViewSet):
+    """Categories with their post counts, kept up to date by core/categories.py"""
+
+    queryset = BlogCategory.objects.order_by("name")
+    serializer_class = BlogCategorySerializer
+    permission_classes = [IsAdminOrReadOnly]
+    pagination_class = None
+    query_budget = {"list": 1, "retrieve": 1}
+    # post counts change with posts, which bump the same version
+    cache_dependencies = ("core.blogpost",)
+
 
 @extend_schema(tags=["Users"])
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(ConditionalGetMixin, StreamedImageUploadMixin, viewsets.ModelViewSet):
     queryset = User.objects.filter(is_superuser=False)
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
     parser_classes = [MultiPartParser, FormParser]
+    streamed_image_fields = {"avatar": "avatar"}
+    # me: 2, +8 when an uploaded avatar replaces another (storing its blob and
+    # releasing the old one, see core/blobs.py), +4 when image variants are
+    # generated inline (IMAGE_VARIANTS["ASYNC"] = False)
+    query_budget = {"list": 4, "retrieve": 2, "me": 14, "my_artworks": 3, "autocomplete": 2}
 
     def get_queryset(self):
         return User.objects.filter(is_superuser=False)
@@ -255,20 +352,29 @@ class UserViewSet(viewsets.ModelViewSet):
         queryset = self.get_queryset()
 
         # --- Search by name ---
-        search = request.query_params.get("q")
-        if search:
-            queryset = queryset.filter(
-                Q(first_name__icontains=search) |
-                Q(last_name__icontains=search) |
-                Q(username__icontains=search)
-            )
+        queryset = user_search.search_users(queryset, request.query_params.get("q"))
+
+        def render(request):
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                serializer = self.get_serializer(page, many=True)
+                return self.get_paginated_response(serializer.data)
 
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+            serializer = self.get_serializer(queryset, many=True)
+            return Response(serializer.data)
 
-        serializer = self.get_serializer(queryset, many=True)
+        etag, last_modified = self.get_queryset_validators(request, queryset)
+        return self.conditional_response(request, etag, last_modified, render)
+
+    @extend_schema(
+        parameters=[OpenApiParameter("q", str, description="Name prefix")],
+        responses=UserSuggestionSerializer(many=True),
+    )
+    @action(detail=False, methods=["get"])
+    def autocomplete(self, request):
+        """Suggest users whose first name, last name or username starts with `q`"""
+        users = user_search.autocomplete_users(self.get_queryset(), request.query_params.get("q"))
+        serializer = UserSuggestionSerializer(users, many=True)
         return Response(serializer.data)
 
     @action(
@@ -280,8 +386,10 @@ class UserViewSet(viewsets.ModelViewSet):
         """Get or update current user's profile"""
         user = request.user
         if request.method == "GET":
-            serializer = self.get_serializer(user)
-            return Response(serializer.data)
+            etag, last_modified = self.get_object_validators(user)
+            return self.conditional_response(
+                request, etag, last_modified, lambda request: Response(self.get_serializer(user).data)
+            )
 
         serializer = self.get_serializer(user, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
@@ -292,25 +400,238 @@ class UserViewSet(viewsets.ModelViewSet):
     def my_artworks(self, request, *args, **kwargs):
         """Get all art images uploaded by the user"""
         user = request.user
-        artworks = ArtImage.objects.filter(user=user)
-        serializer = ArtImageSerializer(artworks, many=True)
-        return Response(serializer.data)
+        artworks = ArtImage.objects.filter(user=user).select_related("user").order_by("-uploaded_at")
+        etag, last_modified = self.get_queryset_validators(request, artworks, related=("user",))
+        return self.conditional_response(
+            request, etag, last_modified, lambda request: Response(ArtImageSerializer(artworks, many=True).data)
+        )
 
 
 @extend_schema(tags=["Art Images"])
-class ArtImageViewSet(viewsets.ModelViewSet):
+class ArtImageViewSet(ConditionalGetMixin, StreamedImageUploadMixin, viewsets.ModelViewSet):
     """
     Handles CRUD operations for user-uploaded art images.
     Each user can only view and modify their own uploads.
     """
 
     serializer_class = ArtImageSerializer
-    permission_classes = [permissions.AllowAny]
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     parser_classes = [MultiPartParser, FormParser]
+    streamed_image_fields = {"image": "image"}
+    pagination_class = ArtImagePagination
+    related_last_modified = ("user",)
+    # bulk: a blob lookup per uploaded file, and one more when it finds one
+    # to reuse (see core/blobs.py)
+    query_budget = {"list": 4, "retrieve": 2, "bulk": 12 + 2 * uploads.upload_setting("BULK_MAX_FILES")}
 
     def get_queryset(self):
-        return ArtImage.objects.order_by("-uploaded_at")
+        queryset = ArtImage.objects.select_related("user").order_by("-uploaded_at", "-id")
+        if self.request.method not in permissions.SAFE_METHODS:
+            # others' images are read-only: changing one is a 404, like bulk's not_found
+            queryset = queryset.filter(user_id=self.request.user.pk)
+        return queryset
+
+    def get_upload_handler(self, request, targets):
+        if self.action == "bulk":
+            return BulkImageUploadHandler(
+                request,
+                targets,
+                workers=uploads.upload_setting("BULK_WORKERS"),
+                max_files=uploads.upload_setting("BULK_MAX_FILES"),
+            )
+        return super().get_upload_handler(request, targets)
 
     def perform_create(self, serializer):
         # Automatically associate the uploaded image with the logged-in user
         serializer.save(user=self.request.user)
+
+    @extend_schema(
+        request={
+            "multipart/form-data": ArtImageBulkSerializer.CreateSerializer,
+            "application/json": ArtImageBulkSerializer.DeleteSerializer,
+        },
+    )
+    @action(
+        detail=False,
+        methods=["post", "patch", "delete"],
+        permission_classes=[permissions.IsAuthenticated],
+        parser_classes=[MultiPartParser, JSONParser],
+    )
+    def bulk(self, request):
+        """
+        Batch operations on your own art images, with one result per item:
+        - POST (multipart): repeated `image` files, and optionally `items`,
+          a JSON list of {title, caption} in the same order
+        - PATCH: a JSON list of {id, title, caption}
+        - DELETE: {"ids": [...]}
+        """
+        if request.method == "POST":
+            return self.create_many(request)
+        if request.method == "PATCH":
+            return self.edit_many(request)
+        return self.delete_many(request)
+
+    def bulk_response(self, results, succeeded):
+        if succeeded == len(results):
+            code = status.HTTP_201_CREATED if self.request.method == "POST" else status.HTTP_200_OK
+        elif succeeded:
+            code = status.HTTP_207_MULTI_STATUS
+        else:
+            code = status.HTTP_400_BAD_REQUEST
+        return Response({"results": results}, status=code)
+
+    def create_many(self, request):
+        serializer = ArtImageBulkSerializer.CreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        files = request.FILES.getlist("image")
+        if not files:
+            return Response({"image": ["No files were submitted."]}, status=status.HTTP_400_BAD_REQUEST)
+        items = serializer.validated_data.get("items", [])
+
+        results, accepted = [], []
+        for index, upload in enumerate(files):
+            if upload.error is not None:
+                results.append({"index": index, "status": "rejected", "error": upload.error})
+                continue
+            item = items[index] if index < len(items) else {}
+            art_image = ArtImage(
+                user=request.user,
+                image=upload.name,
+                title=item.get("title"),
+                caption=item.get("caption", ""),
+            )
+            results.append({"index": index, "status": "created"})
+            accepted.append((results[-1], art_image))
+
+        with transaction.atomic():
+            ArtImage.objects.bulk_create([art_image for _, art_image in accepted])
+            # bulk_create sends no signals, so variants are scheduled and
+            # references counted here
+            for _, art_image in accepted:
+                images.schedule(art_image, "image", "variants")
+        # committed: the rows take over the uploads' references (see blobs.acquire())
+        blobs.acquire(art_image.image.name for _, art_image in accepted)
+
+        context = self.get_serializer_context()
+        for result, art_image in accepted:
+            result["data"] = ArtImageSerializer(art_image, context=context).data
+        return self.bulk_response(results, len(accepted))
+
+    def edit_many(self, request):
+        serializer = ArtImageBulkSerializer.EditSerializer(
+            data=request.data, many=True, max_length=uploads.upload_setting("BULK_MAX_FILES")
+        )
+        serializer.is_valid(raise_exception=True)
+        edits = {item["id"]: item for item in serializer.validated_data}
+
+        with transaction.atomic():
+            art_images = list(self.get_queryset().filter(user=request.user, id__in=edits))
+            now, fields = timezone.now(), {"updated_at"}
+            for art_image in art_images:
+                for name, value in edits[art_image.id].items():
+                    setattr(art_image, name, value)
+                    fields.add(name)
+                art_image.updated_at = now
+            fields.discard("id")
+            ArtImage.objects.bulk_update(art_images, sorted(fields))
+
+        found = {art_image.id: art_image for art_image in art_images}
+        context = self.get_serializer_context()
+        results = [
+            {"id": pk, "status": "updated", "data": ArtImageSerializer(found[pk], context=context).data}
+            if pk in found
+            else {"id": pk, "status": "not_found"}
+            for pk in edits
+        ]
+        return self.bulk_response(results, len(found))
+
+    def delete_many(self, request):
+        serializer = ArtImageBulkSerializer.DeleteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data["ids"]))
+
+        with transaction.atomic():
+            own = ArtImage.objects.filter(user=request.user, id__in=ids)
+            found = set(own.values_list("id", flat=True))
+            own.delete()
+
+        results = [{"id": pk, "status": "deleted" if pk in found else "not_found"} for pk in ids]
+        return self.bulk_response(results, len(found))
+
+    @extend_schema(request=ArtImageUploadSerializer.PresignSerializer)
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="upload-url",
+        permission_classes=[permissions.IsAuthenticated],
+        parser_classes=[JSONParser],
+    )
+    def upload_url(self, request):
+        """
+        Step 1 of a direct upload: get a presigned POST for the bucket.
+        Send the file there with the returned `fields`, then call confirm-upload.
+        """
+        serializer = ArtImageUploadSerializer.PresignSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = uploads.presign(
+            request.user,
+            serializer.validated_data["filename"],
+            serializer.validated_data["content_type"],
+            serializer.validated_data["size"],
+        )
+        return Response(data, status=status.HTTP_201_CREATED)
+
+    @extend_schema(request=ArtImageUploadSerializer.ConfirmSerializer, responses=ArtImageSerializer)
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="confirm-upload",
+        permission_classes=[permissions.IsAuthenticated],
+        parser_classes=[JSONParser],
+    )
+    def confirm_upload(self, request):
+        """Step 2 of a direct upload: validate the stored object and create the art image"""
+        serializer = ArtImageUploadSerializer.ConfirmSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            name = uploads.load_token(serializer.validated_data["upload_token"], request.user)
+            _, _, size = uploads.inspect(name)
+            with transaction.atomic():
+                try:
+                    # a concurrent confirm of the same key waits here, then fails
+                    blobs.adopt(name, size)
+                except IntegrityError:
+                    raise uploads.UploadRejected("Upload already confirmed")
+                art_image = ArtImage.objects.create(
+                    user=request.user,
+                    image=name,
+                    title=serializer.validated_data.get("title"),
+                    caption=serializer.validated_data.get("caption", ""),
+                )
+        except uploads.UploadRejected as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(ArtImageSerializer(art_image).data, status=status.HTTP_201_CREATED)
+
+
+@extend_schema(tags=["Monitoring"])
+class MonitoringViewSet(viewsets.ViewSet):
+    """
+    Internal counters for operators.
+    Endpoints:
+    - cache
+    - db-pool
+    """
+
+    permission_classes = [permissions.IsAdminUser]
+
+    @action(detail=False, methods=["get"])
+    def cache(self, request):
+        """Response cache hit/miss counters"""
+        return Response(cache.get_stats())
+
+    @action(detail=False, methods=["get"], url_path="db-pool")
+    def db_pool(self, request):
+        """Database connection pool counters of the worker that serves the request"""
+        return Response(db_pool.pool_stats())
@@ -1,3 +1,4 @@
+import copy
 import os
 import environ
 from datetime import timedelta
@@ -20,6 +21,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     "rest_framework",
     "rest_framework_simplejwt",
@@ -34,16 +36,52 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.db_router.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.query_budget.QueryBudgetMiddleware',
 ]
 
+# "wsgi" (gunicorn sync workers) or "asgi" (uvicorn workers), see entrypoint.prod.sh
+SERVER_MODE = env("SERVER_MODE", default="wsgi")
+# Serve anonymous reads of posts and art images from async views (core/async_views.py)
+ASYNC_VIEWS = env.bool("ASYNC_VIEWS", default=SERVER_MODE == "asgi")
+
+# Read replicas (see core/db_router.py). Settings modules that declare
+# replicas add their aliases to REPLICA_DATABASES with replica_databases().
+DATABASE_ROUTERS = ["core.db_router.ReplicaRouter"]
+REPLICA_DATABASES = []
+# reads stay on the primary this long after a client's own write
+REPLICA_STICKY_SECONDS = env.int("REPLICA_STICKY_SECONDS", default=5)
+REPLICA_PIN_COOKIE = "replica_pin"
+
+
+def replica_databases(primary, hosts):
+    """DATABASES entries for read replicas of `primary`, one per "host[:port]"."""
+    replicas = {}
+    for number, address in enumerate(hosts, start=1):
+        host, _, port = address.partition(":")
+        replicas[f"replica_{number}"] = {
+            **primary,
+            "HOST": host,
+            "PORT": port or primary.get("PORT", ""),
+            "OPTIONS": copy.deepcopy(primary.get("OPTIONS", {})),
+            "TEST": {"MIRROR": "default"},
+        }
+    return replicas
+
+
+# Per-view query budgets (see core/query_budget.py)
+QUERY_BUDGET_DEFAULT = None
+QUERY_BUDGET_RAISE = env.bool("QUERY_BUDGET_RAISE", default=False)
+
 ROOT_URLCONF = 'drf_starter.urls'
 
 TEMPLATES = [
@@ -67,6 +105,7 @@ AUTHENTICATION_BACKENDS = [
 ]
 
 WSGI_APPLICATION = 'drf_starter.wsgi.application'
+ASGI_APPLICATION = 'drf_starter.asgi.application'
 
 # DATABASES = {           
 #     'default': {
@@ -101,6 +140,32 @@ AUTH_PASSWORD_VALIDATORS = [
     }
 ]
 
+# argon2, scrypt or pbkdf2 for new passwords; hashes made by the others still
+# verify and are upgraded on the next login (see core/hashers.py)
+PASSWORD_HASHER = env("PASSWORD_HASHER", default="argon2")
+ARGON2_TIME_COST = env.int("ARGON2_TIME_COST", default=2)
+ARGON2_MEMORY_COST = env.int("ARGON2_MEMORY_COST", default=19456)  # KiB
+ARGON2_PARALLELISM = env.int("ARGON2_PARALLELISM", default=1)
+SCRYPT_WORK_FACTOR = env.int("SCRYPT_WORK_FACTOR", default=2**14)
+SCRYPT_PARALLELISM = env.int("SCRYPT_PARALLELISM", default=1)
+
+
+def password_hashers(preferred):
+    """PASSWORD_HASHERS with `preferred` first."""
+    hashers = {
+        "argon2": "core.hashers.Argon2PasswordHasher",
+        "scrypt": "core.hashers.ScryptPasswordHasher",
+        "pbkdf2": "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+    }
+    return [
+        hashers[preferred],
+        *(path for name, path in hashers.items() if name != preferred),
+        "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    ]
+
+
+PASSWORD_HASHERS = password_hashers(PASSWORD_HASHER)
+
 LANGUAGE_CODE = 'en-us'
 
 TIME_ZONE = 'UTC'
@@ -117,15 +182,84 @@ SIMPLE_JWT = {
    "ACCESS_TOKEN_LIFETIME": timedelta(days=2), 
     "REFRESH_TOKEN_LIFETIME": timedelta(days=4),
 }
+# how stale a worker's view of revoked tokens may get (see core/authentication.py)
+JWT_REVOCATION_SYNC_SECONDS = env.int("JWT_REVOCATION_SYNC_SECONDS", default=5)
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.StatelessJWTAuthentication',
         "rest_framework.authentication.BasicAuthentication",
     ),
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.LimitOffsetPagination",
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     "PAGE_SIZE": 30,
+    # token buckets, see core/throttling.py
+    "DEFAULT_THROTTLE_RATES": {
+        "login_ip": env("LOGIN_RATE_PER_IP", default="20/min"),
+        "login_account": env("LOGIN_RATE_PER_ACCOUNT", default="5/min"),
+    },
+}
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+# Anonymous GET responses of cached viewsets (see core/cache.py)
+RESPONSE_CACHE_ENABLED = env.bool("RESPONSE_CACHE_ENABLED", default=True)
+RESPONSE_CACHE_TIMEOUT = env.int("RESPONSE_CACHE_TIMEOUT", default=300)
+
+FRONTEND_URL = env("FRONTEND_URL", default="")
+
+# S3 client and transfers for media (see drf_starter/storage_backends.py)
+AWS_S3_MAX_POOL_CONNECTIONS = env.int("AWS_S3_MAX_POOL_CONNECTIONS", default=20)
+AWS_S3_MULTIPART_THRESHOLD = 16 * 1024 * 1024  # nearly every image goes up in one PUT
+AWS_S3_MULTIPART_CHUNKSIZE = 8 * 1024 * 1024
+AWS_S3_MAX_CONCURRENCY = 4
+
+# Presigned direct-to-S3 uploads (see core/uploads.py)
+DIRECT_UPLOADS = {
+    "MAX_BYTES": 20 * 1024 * 1024,  # matches nginx client_max_body_size
+    "MAX_PIXELS": 50_000_000,
+    "EXPIRES": 600,
+}
+
+# Resized copies of uploads (see core/images.py)
+IMAGE_VARIANTS = {
+    "WIDTHS": (300, 800, 1600),
+    "FORMATS": ("avif", "webp", "jpeg"),  # avif is skipped if Pillow lacks libavif
+    "ASYNC": env.bool("IMAGE_VARIANTS_ASYNC", default=True),
+    "WORKERS": env.int("IMAGE_VARIANTS_WORKERS", default=2),
+}
+
+# Outbox delivered by `manage.py send_queued_emails` (see core/emails.py)
+EMAIL_OUTBOX = {
+    "BATCH_SIZE": env.int("EMAIL_OUTBOX_BATCH_SIZE", default=50),
+    "POLL_INTERVAL": env.float("EMAIL_OUTBOX_POLL_INTERVAL", default=5),
+    "MAX_ATTEMPTS": env.int("EMAIL_OUTBOX_MAX_ATTEMPTS", default=5),
+    "RETRY_BASE_DELAY": 30,  # seconds, doubled per attempt
+    "LEASE_SECONDS": 300,
+    "DEDUPE_WINDOW": 300,  # don't resend a password reset within 5 minutes
+}
+
+# Post view counters and rankings (see core/trending.py)
+TRENDING = {
+    "FLUSH_SECONDS": env.float("VIEW_COUNT_FLUSH_SECONDS", default=10),
+    "MAX_PENDING": 10_000,  # posts with buffered views before an early flush
+    "HALF_LIFE_HOURS": env.float("TRENDING_HALF_LIFE_HOURS", default=24),
+    "REFRESH_SECONDS": env.int("TRENDING_REFRESH_SECONDS", default=60),
+    "SIZE": 50,
+}
+
+# Request metrics for Prometheus at /metrics (see core/metrics.py)
+METRICS = {
+    "ENABLED": env.bool("METRICS_ENABLED", default=True),
+    # shared by the workers of one server; empty keeps each worker's own
+    "DIR": env("METRICS_DIR", default=""),
+    "FLUSH_SECONDS": env.float("METRICS_FLUSH_SECONDS", default=5),
+    # required as a bearer token by /metrics when set
+    "TOKEN": env("METRICS_TOKEN", default=""),
 }
 
 CORS_ALLOWED_ORIGINS = env("CORS_ALLOWED_ORIGINS").split(",")
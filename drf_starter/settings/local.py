@@ -34,9 +34,28 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 CKEDITOR_UPLOAD_PATH = "uploads/"
 CKEDITOR_IMAGE_BACKEND = "pillow"
 
+EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # select_for_update() is a no-op on SQLite: take the write lock when a
+        # transaction starts, so read-then-write blocks (core/blobs.py) wait
+        # for each other instead of failing with "database is locked"
+        "OPTIONS": {"transaction_mode": "IMMEDIATE"},
+    }
+}
+
+# Postgres primary + streaming replica from local.yml
+if env("DATABASE_HOST", default=""):
+    DATABASES["default"] = {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": env("DATABASE_NAME"),
+        "USER": env("DATABASE_USER"),
+        "PASSWORD": env("DATABASE_PASSWORD"),
+        "HOST": env("DATABASE_HOST"),
+        "PORT": env("DATABASE_PORT", default="5432"),
     }
-}
\ No newline at end of file
+    DATABASES.update(replica_databases(DATABASES["default"], env.list("DATABASE_REPLICA_HOSTS", default=[])))
+    REPLICA_DATABASES = [alias for alias in DATABASES if alias != "default"]
\ No newline at end of file
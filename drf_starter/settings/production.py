@@ -24,6 +24,37 @@ DATABASES = {
     }
 }
 
+# Connection reuse, see core/db_pool.py:
+# - "pool": a psycopg 3 pool per worker process (default)
+# - "persistent": one connection per worker thread, kept for DB_CONN_MAX_AGE seconds
+# - "none": a new connection for every request
+DB_CONNECTIONS = env("DB_CONNECTIONS", default="pool")
+if DB_CONNECTIONS == "pool":
+    DATABASES["default"]["OPTIONS"]["pool"] = {
+        "min_size": env.int("DB_POOL_MIN_SIZE", default=2),
+        "max_size": env.int("DB_POOL_MAX_SIZE", default=10),
+        # seconds a request waits for a free connection before erroring
+        "timeout": env.float("DB_POOL_TIMEOUT", default=10.0),
+        "max_idle": env.float("DB_POOL_MAX_IDLE", default=300.0),
+        "max_lifetime": env.float("DB_POOL_MAX_LIFETIME", default=1800.0),
+    }
+elif DB_CONNECTIONS == "persistent":
+    DATABASES["default"]["CONN_MAX_AGE"] = env.int("DB_CONN_MAX_AGE", default=60)
+# with a pool this checks each connection on checkout and replaces broken ones
+DATABASES["default"]["CONN_HEALTH_CHECKS"] = DB_CONNECTIONS != "none"
+
+# Read replicas, e.g. DATABASE_REPLICA_HOSTS=replica1,replica2:5433
+DATABASES.update(replica_databases(DATABASES["default"], env.list("DATABASE_REPLICA_HOSTS", default=[])))
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != "default"]
+
+# Cache
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": env("REDIS_URL", default="redis://redis:6379/0"),
+    }
+}
+
 # CORS
 CORS_ALLOWED_ORIGINS = env("CORS_ALLOWED_ORIGINS").split(",")
 CSRF_TRUSTED_ORIGINS = env("CSRF_TRUSTED_ORIGINS").split(",")
@@ -75,4 +106,5 @@ EMAIL_PORT = 587
 EMAIL_HOST_USER = env("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = env("EMAIL_PASSWORD")
 EMAIL_USE_TLS = True
+EMAIL_TIMEOUT = 10
 DEFAULT_FROM_EMAIL = env("DEFAULT_FROM_EMAIL")
\ No newline at end of file
@@ -1,4 +1,142 @@
+import hashlib
+import os
+import threading
+import uuid
+
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from django.conf import settings
+from django.core.files.base import File
+from django.core.files.utils import validate_file_name
 from storages.backends.s3boto3 import S3Boto3Storage
+from storages.utils import clean_name
+
+
+# one client per process and account/endpoint, see PooledS3Storage.connection
+_clients = {}
+_clients_lock = threading.Lock()
+
+DELETE_BATCH = 1000  # S3 DeleteObjects limit
+
+
+class PooledS3Storage(S3Boto3Storage):
+    """
+    S3Boto3Storage tuned for many small image writes:
+
+    - every instance and thread shares one botocore client per process, with
+      a pool of AWS_S3_MAX_POOL_CONNECTIONS connections, instead of building
+      a session and client per instance per thread
+    - files up to AWS_S3_MULTIPART_THRESHOLD go up in a single PutObject;
+      larger ones in AWS_S3_MULTIPART_CHUNKSIZE parts, AWS_S3_MAX_CONCURRENCY
+      at a time
+    - names are made unique by construction, so saving costs no existence
+      check: save() appends a hash of the content, get_available_name() (for
+      callers that pick a name before the bytes exist) a random suffix
+    - delete_many() removes up to 1000 objects per request
+    """
+
+    def get_default_settings(self):
+        defaults = super().get_default_settings()
+        threshold = getattr(settings, "AWS_S3_MULTIPART_THRESHOLD", 16 * 1024 * 1024)
+        defaults["transfer_config"] = TransferConfig(
+            multipart_threshold=threshold,
+            multipart_chunksize=getattr(settings, "AWS_S3_MULTIPART_CHUNKSIZE", 8 * 1024 * 1024),
+            max_concurrency=getattr(settings, "AWS_S3_MAX_CONCURRENCY", 4),
+        )
+        defaults["max_pool_connections"] = getattr(settings, "AWS_S3_MAX_POOL_CONNECTIONS", 20)
+        return defaults
+
+    def client_key(self):
+        return (
+            os.getpid(),
+            self.endpoint_url,
+            self.region_name,
+            self.access_key,
+            self.session_profile,
+            self.use_ssl,
+            self.verify,
+            self.addressing_style,
+            self.signature_version,
+        )
+
+    def shared_client(self):
+        key = self.client_key()
+        with _clients_lock:
+            if key not in _clients:
+                config = self.client_config.merge(Config(max_pool_connections=self.max_pool_connections))
+                resource = self._create_session().resource(
+                    "s3",
+                    region_name=self.region_name,
+                    use_ssl=self.use_ssl,
+                    endpoint_url=self.endpoint_url,
+                    config=config,
+                    verify=self.verify,
+                )
+                _clients[key] = (type(resource), resource.meta.client)
+            return _clients[key]
+
+    @property
+    def connection(self):
+        # boto3 resources are not thread-safe, clients are: each thread gets
+        # its own resource wrapping the shared client
+        connection = getattr(self._connections, "connection", None)
+        if connection is None:
+            resource_class, client = self.shared_client()
+            connection = self._connections.connection = resource_class(client=client)
+        return connection
+
+    def unique_name(self, name, suffix, max_length=None):
+        directory, filename = os.path.split(clean_name(name))
+        stem, extension = os.path.splitext(filename)
+        if max_length is not None:
+            keep = max_length - len(directory) - len(suffix) - len(extension) - 2
+            stem = stem[:max(keep, 0)]
+        return os.path.join(directory, f"{stem}.{suffix}{extension}")
+
+    def get_available_name(self, name, max_length=None):
+        return self.unique_name(name, uuid.uuid4().hex[:16], max_length)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        validate_file_name(name, allow_relative_path=True)
+        name = self.unique_name(name, digest.hexdigest()[:16], max_length)
+        validate_file_name(name, allow_relative_path=True)
+        name = self._save(name, content)
+        validate_file_name(name, allow_relative_path=True)
+        return name
+
+    def _save(self, name, content):
+        if content.size > self.transfer_config.multipart_threshold:
+            return super()._save(name, content)
+        # one PutObject, without a transfer manager and its thread pool
+        cleaned_name = clean_name(name)
+        key = self._normalize_name(cleaned_name)
+        params = self._get_write_parameters(key, content)
+        content.seek(0)
+        self.connection.meta.client.put_object(
+            Bucket=self.bucket_name, Key=key, Body=content.read(), **params
+        )
+        return cleaned_name
+
+    def delete_many(self, names):
+        """Delete `names` in DeleteObjects batches; missing objects are not an error."""
+        keys = [self._normalize_name(clean_name(name)) for name in names if name]
+        client = self.connection.meta.client
+        for start in range(0, len(keys), DELETE_BATCH):
+            batch = keys[start:start + DELETE_BATCH]
+            response = client.delete_objects(
+                Bucket=self.bucket_name,
+                Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True},
+            )
+            errors = response.get("Errors", [])
+            if errors:
+                raise OSError(f"Could not delete {len(errors)} objects, e.g. {errors[0].get('Key')}")
 
 
 class StaticStorage(S3Boto3Storage):
@@ -7,7 +145,7 @@ class StaticStorage(S3Boto3Storage):
     file_overwrite = True
 
 
-class PublicMediaStorage(S3Boto3Storage):
+class PublicMediaStorage(PooledS3Storage):
     location = "media"
     default_acl = "public-read"
     file_overwrite = False
@@ -17,7 +155,7 @@ class PublicMediaStorage(S3Boto3Storage):
         return False
 
 
-class PrivateMediaStorage(S3Boto3Storage):
+class PrivateMediaStorage(PooledS3Storage):
     location = "private"
     default_acl = "private"
     file_overwrite = False
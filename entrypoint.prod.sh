@@ -7,9 +7,26 @@ python manage.py collectstatic --noinput
 echo "👉 Applying migrations..."
 python manage.py migrate --noinput
 
+# Each worker writes its metrics here; start from zero (see core/metrics.py)
+export METRICS_DIR="${METRICS_DIR:-/tmp/metrics}"
+rm -rf "$METRICS_DIR"
+mkdir -p "$METRICS_DIR"
+
+# SERVER_MODE=asgi runs uvicorn workers under gunicorn; the default stays
+# on sync workers. WEB_WORKERS sets the process count for either mode.
+if [ "${SERVER_MODE:-wsgi}" = "asgi" ]; then
+    echo "👉 Starting Gunicorn (ASGI, uvicorn workers)..."
+    exec gunicorn drf_starter.asgi:application \
+        --worker-class uvicorn_worker.UvicornWorker \
+        --bind 0.0.0.0:8000 \
+        --workers "${WEB_WORKERS:-3}" \
+        --access-logfile - \
+        --error-logfile -
+fi
+
 echo "👉 Starting Gunicorn..."
 exec gunicorn drf_starter.wsgi:application \
     --bind 0.0.0.0:8000 \
-    --workers 3 \
+    --workers "${WEB_WORKERS:-3}" \
     --access-logfile - \
     --error-logfile -
@@ -0,0 +1,10 @@
+#!/bin/sh
+# Runs once when the local.yml primary initialises its data directory:
+# creates the role the replica streams WAL with and lets it connect.
+set -e
+
+psql -v ON_ERROR_STOP=1 --username "$POSTGRES_USER" --dbname "$POSTGRES_DB" <<-EOSQL
+    CREATE ROLE replicator WITH REPLICATION LOGIN PASSWORD '$REPLICATION_PASSWORD';
+EOSQL
+
+echo "host replication replicator all scram-sha-256" >> "$PGDATA/pg_hba.conf"
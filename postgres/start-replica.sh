@@ -0,0 +1,16 @@
+#!/bin/sh
+# Starts a hot standby of the local.yml primary, cloning it on first boot.
+set -e
+
+if [ ! -s "$PGDATA/PG_VERSION" ]; then
+    until PGPASSWORD="$REPLICATION_PASSWORD" pg_basebackup \
+        --host=db --username=replicator --pgdata="$PGDATA" \
+        --wal-method=stream --write-recovery-conf --checkpoint=fast; do
+        echo "Waiting for the primary..."
+        rm -rf "${PGDATA:?}"/*
+        sleep 2
+    done
+    chmod 700 "$PGDATA"
+fi
+
+exec postgres -D "$PGDATA" -c hot_standby=on